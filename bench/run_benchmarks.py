@@ -0,0 +1,151 @@
+import argparse
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from bench.stub_compressonator import make_stub_cli
+from src.bcn import bcn, bcn_batch
+from src.dds import BLOCK_DTYPES, write_dds
+from src.extract_endpoints import OUTPUT_FORMATS, extract_endpoints_to_json, parse_dds_bc1_endpoints
+
+DEFAULT_SIZES = (256, 1024, 4096)
+
+
+def synth_dds(path: Path, size: int, fmt: str = "BC1", seed: int = 0) -> Path:
+    """Writes a size x size DDS of random BC1/BC4 blocks."""
+    num_blocks = ((size + 3) // 4) ** 2
+    rng = np.random.default_rng(seed)
+    raw = rng.integers(0, 256, size=num_blocks * 8, dtype=np.uint8)
+    write_dds(path, raw.view(BLOCK_DTYPES[fmt]), size, size, fmt)
+    return path
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best wall time over repeat runs, plus the traced peak allocation of one run."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_mb": peak / (1024 * 1024)}
+
+
+def quiet(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Calls fn with stdout discarded (the extractor prints one line per output)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def run(sizes: List[int], repeat: int, bcn_runs: int, work_dir: Path) -> List[Dict[str, Any]]:
+    results = []
+
+    def record(name, size, num_blocks, nbytes, stats):
+        row = {
+            "bench": name,
+            "size": size,
+            "blocks_per_s": num_blocks / stats["seconds"],
+            "mb_per_s": nbytes / stats["seconds"] / (1024 * 1024),
+            **stats,
+        }
+        results.append(row)
+        print(
+            f"{name:<26} {size:>6} {row['seconds'] * 1000:>10.1f} ms {row['blocks_per_s'] / 1e6:>9.2f} Mblk/s "
+            f"{row['mb_per_s']:>9.1f} MB/s {row['peak_mb']:>9.1f} MB peak"
+        )
+
+    print(f"{'bench':<26} {'size':>6} {'time':>13} {'blocks/s':>16} {'MB/s':>14} {'peak memory':>17}")
+    for size in sizes:
+        num_blocks = ((size + 3) // 4) ** 2
+        out = work_dir / "out"
+        for dds_fmt in ("BC1", "BC4"):
+            dds = synth_dds(work_dir / f"synth_{size}_{dds_fmt.lower()}.dds", size, dds_fmt)
+            nbytes = dds.stat().st_size
+            if dds_fmt == "BC1":
+                record("parse_dds_bc1_endpoints", size, num_blocks, nbytes,
+                       measure(lambda: parse_dds_bc1_endpoints(dds), repeat))
+            for fmt in OUTPUT_FORMATS:
+                record(f"extract {dds_fmt} -> {fmt}", size, num_blocks, nbytes, measure(
+                    lambda: quiet(extract_endpoints_to_json, str(dds), str(out), output_format=fmt), repeat))
+            dds.unlink()
+
+    # Process spawn + stub encode; throughput is for the 256x256 DDS the stub writes
+    stub = make_stub_cli(work_dir)
+    src = work_dir / "input.png"
+    src.write_bytes(b"\0" * 1024)
+
+    def encode():
+        for i in range(bcn_runs):
+            job = bcn(src, work_dir / f"stub_{i}.dds", format="BC1", quality=0.5)
+            job.cli_path = stub
+            if job.run().returncode != 0:
+                raise RuntimeError("stub compressonator failed")
+
+    stats = measure(encode, 1)
+    stats["seconds"] /= bcn_runs
+    record("bcn.run (stub cli)", 256, 64 * 64, (work_dir / "stub_0.dds").stat().st_size, stats)
+
+    # The same encodes sharing one stub process (folder mode)
+    def encode_grouped():
+        jobs = [bcn(src, work_dir / f"stub_{i}.dds", format="BC1", quality=0.5) for i in range(bcn_runs)]
+        for job in jobs:
+            job.cli_path = stub
+        results = bcn_batch(jobs, max_workers=1, files_per_process=bcn_runs, max_pixels=None)
+        if any(r["returncode"] != 0 for r in results):
+            raise RuntimeError("stub compressonator failed")
+
+    stats = measure(encode_grouped, 1)
+    stats["seconds"] /= bcn_runs
+    record("bcn_batch grouped (stub)", 256, 64 * 64, (work_dir / "stub_0.dds").stat().st_size, stats)
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path, tolerance: float) -> List[str]:
+    """Lists benchmarks that got slower than the baseline by more than tolerance."""
+    baseline = {(r["bench"], r["size"]): r for r in json.loads(baseline_path.read_text())}
+    regressions = []
+    for r in results:
+        base = baseline.get((r["bench"], r["size"]))
+        if base and r["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{r['bench']} @ {r['size']}: {base['seconds'] * 1000:.1f} ms -> {r['seconds'] * 1000:.1f} ms"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the DDS parse / extract / encode paths.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                        help="texture edge sizes to synthesize (e.g. 256 1024 4096 16384)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (best time is kept)")
+    parser.add_argument("--bcn-runs", type=int, default=10, help="bcn.run invocations against the stub CLI")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ntbc_bench_") as tmp:
+        results = run(args.sizes, args.repeat, args.bcn_runs, Path(tmp))
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"Results written to: {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, Path(args.baseline), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
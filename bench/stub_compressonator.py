@@ -0,0 +1,99 @@
+"""
+Stand-in for compressonatorcli used by the benchmarks (and handy for local testing).
+
+Accepts the same arguments bcn passes (-fd, -Quality, -EncodeWith, -nomipmap,
+input, output) and writes a valid single-level DDS of zero blocks without
+reading the input. When input is a folder, every file in it is converted to
+output/<stem>.<ext>, where ext comes from -fx (default DDS), like the real
+CLI's folder mode. Behaviour is tuned through environment variables:
+
+    NTBC_STUB_SIZE     texture edge in pixels written to the output (default: the input
+                       image's size when Pillow can read it, else 256)
+    NTBC_STUB_DELAY    seconds to sleep per image, to fake encode time (default 0)
+    NTBC_STUB_STARTUP  seconds to sleep once per process, to fake startup / GPU init (default 0)
+    NTBC_STUB_FAIL     fail (exit code 1) for inputs whose name contains this text;
+                       in folder mode the other files are still written
+
+Per-backend latency, chosen by whether -EncodeWith GPU was passed:
+
+    NTBC_STUB_GPU_STARTUP / NTBC_STUB_CPU_STARTUP  extra seconds once per process
+    NTBC_STUB_GPU_DELAY / NTBC_STUB_CPU_DELAY      extra seconds per megapixel of output
+    NTBC_STUB_GPU_FAIL                             like NTBC_STUB_FAIL, for GPU encodes only
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.dds import dds_header
+
+
+def make_stub_cli(folder) -> Path:
+    """Writes a launcher for this stub that bcn can use as cli_path."""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    script = Path(__file__).resolve()
+    if os.name == "nt":
+        launcher = folder / "compressonatorcli_stub.cmd"
+        launcher.write_text(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        launcher = folder / "compressonatorcli_stub"
+        launcher.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        launcher.chmod(0o755)
+    return launcher
+
+
+def input_size(src: Path):
+    if "NTBC_STUB_SIZE" in os.environ:
+        size = int(os.environ["NTBC_STUB_SIZE"])
+        return size, size
+    try:
+        from PIL import Image
+
+        with Image.open(src) as img:
+            return img.size
+    except Exception:
+        return 256, 256
+
+
+def convert(src: Path, dst: Path, fmt: str, device: str) -> bool:
+    for key in ("NTBC_STUB_FAIL", f"NTBC_STUB_{device}_FAIL"):
+        fail = os.environ.get(key)
+        if fail and fail in src.name:
+            print(f"stub: forced {device} failure for {src.name}", file=sys.stderr)
+            return False
+
+    width, height = input_size(src)
+    time.sleep(float(os.environ.get("NTBC_STUB_DELAY", "0"))
+               + float(os.environ.get(f"NTBC_STUB_{device}_DELAY", "0")) * width * height / 1e6)
+
+    num_blocks = ((width + 3) // 4) * ((height + 3) // 4)
+    with open(dst, "wb") as f:
+        f.write(dds_header(width, height, fmt))
+        f.write(bytes(num_blocks * 8))
+    print(f"stub: {src} -> {dst} ({fmt})")
+    return True
+
+
+def main(argv) -> int:
+    if len(argv) < 2:
+        print("Usage: stub_compressonator.py [options] <input> <output>", file=sys.stderr)
+        return 2
+    src, dst = Path(argv[-2]), Path(argv[-1])
+    fmt = argv[argv.index("-fd") + 1] if "-fd" in argv else "BC1"
+
+    device = "GPU" if "-EncodeWith" in argv and argv[argv.index("-EncodeWith") + 1] == "GPU" else "CPU"
+    time.sleep(float(os.environ.get("NTBC_STUB_STARTUP", "0")) + float(os.environ.get(f"NTBC_STUB_{device}_STARTUP", "0")))
+
+    if not src.is_dir():
+        return 0 if convert(src, dst, fmt, device) else 1
+
+    ext = (argv[argv.index("-fx") + 1] if "-fx" in argv else "DDS").lower()
+    dst.mkdir(parents=True, exist_ok=True)
+    ok = [convert(f, dst / f"{f.stem}.{ext}", fmt, device) for f in sorted(src.iterdir()) if f.is_file()]
+    return 0 if all(ok) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
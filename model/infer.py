@@ -0,0 +1,181 @@
+import importlib
+import sys
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.dds import BC1_BLOCK_DTYPE, write_dds
+from src.encode import bc1_select, image_to_blocks, load_image, pack_selectors
+from src.extract_endpoints import load_endpoints
+from src.timing import stage
+
+# Blocks per model call. Coordinates, predictions and the selector search
+# temporaries of one batch stay around 100 MB.
+DEFAULT_BATCH_SIZE = 1 << 16
+
+# A model maps (B, 4) float32 [s, t, bx, by] rows (the loader's inputs) to
+# (B, 6) ep_q01 predictions, or (B, 7) with the c0_gt_c1 probability last.
+Model = Callable[[np.ndarray], np.ndarray]
+
+
+def block_coords(start: int, stop: int, blocks_x: int, blocks_y: int) -> np.ndarray:
+    """
+    Model inputs for row-major blocks start..stop of a blocks_x x blocks_y
+    grid, normalized the way endpoints_to_dataset_arrays builds st and bxby.
+    """
+    idx = np.arange(start, stop, dtype=np.int64)
+    bx, by = idx % blocks_x, idx // blocks_x
+    x = np.empty((len(idx), 4), dtype=np.float32)
+    x[:, 0] = bx / (blocks_x - 1) if blocks_x > 1 else 0.0
+    x[:, 1] = by / (blocks_y - 1) if blocks_y > 1 else 0.0
+    x[:, 2], x[:, 3] = bx, by
+    return x
+
+
+def q01_to_rgb565(q: np.ndarray) -> np.ndarray:
+    """Inverse of rgb565_to_q01_array: (..., 3) floats in 0-1 -> (...) uint16, rounded and clamped."""
+    c = np.rint(np.clip(q, 0.0, 1.0) * np.array([31.0, 63.0, 31.0], dtype=np.float32)).astype(np.uint16)
+    return (c[..., 0] << 11) | (c[..., 1] << 5) | c[..., 2]
+
+
+def predictions_to_endpoints(pred: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (B, 6|7) model outputs -> (c0, c1) RGB565 endpoints. With a seventh
+    column the endpoints are ordered to match its c0_gt_c1 prediction (c0 > c1
+    for the 4-color mode, c0 <= c1 for 3 colors); without one every block
+    uses the 4-color mode.
+    """
+    pred = np.asarray(pred)
+    if pred.ndim != 2 or pred.shape[1] not in (6, 7):
+        raise ValueError(f"model must return (B, 6) or (B, 7) predictions, got shape {pred.shape}")
+    eps = q01_to_rgb565(pred[:, :6].reshape(-1, 2, 3))
+    hi, lo = np.maximum(eps[:, 0], eps[:, 1]), np.minimum(eps[:, 0], eps[:, 1])
+    if pred.shape[1] == 6:
+        return hi, lo
+    four = pred[:, 6] >= 0.5
+    return np.where(four, hi, lo), np.where(four, lo, hi)
+
+
+def encode_with_endpoints(px: np.ndarray, c0: np.ndarray, c1: np.ndarray) -> np.ndarray:
+    """
+    BC1 blocks for (N, 16, 3|4) source texels with fixed endpoints: every
+    texel takes its nearest palette color. In 3-color blocks texels with
+    alpha below 128 take the transparent entry.
+    """
+    sel, _ = bc1_select(px[:, :, :3], c0, c1)
+    if px.shape[2] == 4:
+        clear = (px[:, :, 3] < 128) & (c0 <= c1)[:, None]
+        sel[clear] = 3
+    out = np.empty(len(px), dtype=BC1_BLOCK_DTYPE)
+    out["c0"], out["c1"] = c0, c1
+    out["indices"] = pack_selectors(sel, 2, np.uint32)
+    return out
+
+
+def reconstruct_blocks(
+    model: Model,
+    img: np.ndarray,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Rebuilds an (H, W, 3|4) uint8 image as row-major BC1 blocks: the model is
+    evaluated over every block coordinate in batches of batch_size, its
+    endpoints are quantized to RGB565 and the selectors are fitted to img.
+    """
+    h, w = img.shape[:2]
+    blocks_x, blocks_y = (w + 3) // 4, (h + 3) // 4
+    texels = image_to_blocks(img)
+    out = np.empty(blocks_x * blocks_y, dtype=BC1_BLOCK_DTYPE)
+    for start in range(0, len(out), batch_size):
+        stop = min(start + batch_size, len(out))
+        with stage("infer", "model", blocks=stop - start):
+            pred = model(block_coords(start, stop, blocks_x, blocks_y))
+        with stage("infer", "selectors", blocks=stop - start):
+            c0, c1 = predictions_to_endpoints(pred)
+            out[start:stop] = encode_with_endpoints(texels[start:stop], c0, c1)
+    return out
+
+
+def reconstruct_dds(
+    model: Model,
+    source_image,
+    output_dds,
+    size: Optional[Tuple[int, int]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> None:
+    """
+    Writes a single-level BC1 DDS of source_image with model-predicted
+    endpoints. size=(width, height) reconstructs at another resolution; the
+    source is resampled to it for the selector fit.
+    """
+    with stage("infer", "load", file=Path(source_image).name):
+        img = load_image(source_image)
+        if size is not None and (img.shape[1], img.shape[0]) != tuple(size):
+            from PIL import Image
+
+            img = np.asarray(Image.fromarray(img).resize(tuple(size), Image.LANCZOS))
+    h, w = img.shape[:2]
+    blocks = reconstruct_blocks(model, img, batch_size)
+    with stage("infer", "write", file=Path(output_dds).name, blocks=len(blocks)):
+        write_dds(output_dds, blocks, w, h, "BC1")
+
+
+class DatasetModel:
+    """
+    Stand-in model that looks up the ep_q01 and c0_gt_c1 columns of an
+    extracted BC1 dataset by (bx, by). Reconstructing the dataset's own
+    texture with it gives the pipeline's quality ceiling for perfect
+    predictions; blocks the dataset lacks get black endpoints.
+    """
+
+    def __init__(self, path):
+        d = load_endpoints(path)
+        if "ep_q01" not in d or d["ep_q01"].shape[1:] != (6,):
+            raise ValueError(f"{path}: not a BC1 endpoint dataset")
+        bxby = d["bxby"].astype(np.int64)
+        self.blocks_x, self.blocks_y = int(bxby[:, 0].max()) + 1, int(bxby[:, 1].max()) + 1
+        self.table = np.zeros((self.blocks_y, self.blocks_x, 7), dtype=np.float32)
+        self.table[bxby[:, 1], bxby[:, 0], :6] = d["ep_q01"]
+        self.table[bxby[:, 1], bxby[:, 0], 6] = d["c0_gt_c1"] if "c0_gt_c1" in d else 1.0
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        bx = np.clip(x[:, 2].astype(np.int64), 0, self.blocks_x - 1)
+        by = np.clip(x[:, 3].astype(np.int64), 0, self.blocks_y - 1)
+        return self.table[by, bx]
+
+
+def load_model(spec: str) -> Model:
+    """
+    Resolves a model from "package.module:attribute" (a callable, or a
+    zero-argument factory when the attribute name ends in "()") or from the
+    path of an endpoint dataset (a DatasetModel).
+    """
+    if Path(spec).suffix in (".npz", ".json") and Path(spec).exists():
+        return DatasetModel(spec)
+    module, sep, attr = spec.partition(":")
+    if not sep:
+        raise ValueError(f"model must be module:attribute or an endpoint dataset path, got {spec!r}")
+    factory = attr.endswith("()")
+    obj = getattr(importlib.import_module(module), attr[:-2] if factory else attr)
+    return obj() if factory else obj
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Reconstruct a BC1 DDS from a trained endpoint model.")
+    parser.add_argument("model", help="module:callable, or an endpoint dataset (.npz/.json) to replay")
+    parser.add_argument("source", help="source image the selectors are fitted to")
+    parser.add_argument("output", help="output .dds file")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("W", "H"), default=None, help="target size (default: source size)")
+    parser.add_argument("-b", "--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    t0 = time.perf_counter()
+    reconstruct_dds(model, args.source, args.output, args.size, args.batch_size)
+    print(f"Reconstructed to: {args.output} ({time.perf_counter() - t0:.2f} s)")
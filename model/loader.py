@@ -0,0 +1,202 @@
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.extract_endpoints import load_endpoints
+
+DEFAULT_INPUTS = ("st", "bxby")
+DEFAULT_TARGET = "ep_q01"
+
+# Rows per shuffle chunk. Batches are drawn from a window of randomly chosen
+# chunks, so the index buffer stays SHUFFLE_WINDOW * SHUFFLE_CHUNK rows no
+# matter how large the corpus is.
+SHUFFLE_CHUNK = 1 << 16
+SHUFFLE_WINDOW = 16
+
+
+def find_datasets(source: str) -> List[Path]:
+    """Resolves an .npz dataset, a folder of them (recursive) or a glob pattern to a sorted list."""
+    path = Path(source)
+    if path.is_file():
+        return [path]
+    if path.is_dir():
+        return sorted(path.rglob("*.npz"))
+    anchor = Path(path.anchor) if path.is_absolute() else Path(".")
+    pattern = str(path.relative_to(path.anchor)) if path.is_absolute() else source
+    return sorted(p for p in anchor.glob(pattern) if p.is_file())
+
+
+class EndpointCorpus:
+    """
+    Row-concatenated, memory-mapped view over many endpoint datasets (.npz
+    files written with output_format="npz"). Nothing is read until rows are
+    gathered, and only the gathered rows are copied into RAM.
+    """
+
+    def __init__(self, paths: Iterable, inputs: Sequence[str] = DEFAULT_INPUTS, target: str = DEFAULT_TARGET):
+        self.paths = [Path(p) for p in paths]
+        self.inputs = tuple(inputs)
+        self.target = target
+        self.columns: List[Dict[str, np.ndarray]] = []
+        self.sources: List[Optional[Dict[str, Any]]] = []
+
+        for p in self.paths:
+            if p.suffix != ".npz":
+                raise ValueError(f"{p}: only .npz datasets can be memory-mapped; extract with output format npz")
+            d = load_endpoints(p, mmap=True)
+            missing = [k for k in self.inputs + (target,) if k not in d]
+            if missing:
+                raise ValueError(f"{p}: missing columns {missing}")
+            self.sources.append(d.pop("meta"))
+            self.columns.append({k: d[k] for k in self.inputs + (target,)})
+
+        sizes = [len(c[target]) for c in self.columns]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        self.input_width = sum(self._width(k) for k in self.inputs)
+        self.target_width = self._width(target)
+
+    def _width(self, name: str) -> int:
+        for cols in self.columns:
+            return int(np.prod(cols[name].shape[1:], dtype=np.int64))
+        return 0
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def gather(self, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows idx (global, sorted ascending for best locality) as (x, y):
+        x is (B, input_width) float32 with the input columns side by side,
+        y is (B, target_width) float32.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        x = np.empty((len(idx), self.input_width), dtype=np.float32)
+        y = np.empty((len(idx), self.target_width), dtype=np.float32)
+        # Split the batch at file boundaries; each piece is one fancy-index per column
+        bounds = np.searchsorted(idx, self.offsets)
+        for f in np.flatnonzero(bounds[1:] > bounds[:-1]):
+            lo, hi = bounds[f], bounds[f + 1]
+            local = idx[lo:hi] - self.offsets[f]
+            cols = self.columns[f]
+            c = 0
+            for k in self.inputs:
+                part = cols[k][local].reshape(hi - lo, -1)
+                x[lo:hi, c : c + part.shape[1]] = part
+                c += part.shape[1]
+            y[lo:hi] = cols[self.target][local].reshape(hi - lo, -1)
+        return x, y
+
+
+def iter_batch_indices(
+    n: int,
+    batch_size: int,
+    shuffle: bool = True,
+    rng: Optional[np.random.Generator] = None,
+    drop_last: bool = False,
+    chunk_rows: int = SHUFFLE_CHUNK,
+    window: int = SHUFFLE_WINDOW,
+) -> Iterator[np.ndarray]:
+    """
+    Yields sorted int64 row indices, batch_size at a time, covering 0..n-1
+    once. Shuffling permutes chunks of chunk_rows and then rows within a
+    window of chunks, so memory stays bounded while every batch still mixes
+    rows from window different places in the corpus.
+    """
+    if not shuffle:
+        for start in range(0, n, batch_size):
+            if drop_last and start + batch_size > n:
+                return
+            yield np.arange(start, min(start + batch_size, n), dtype=np.int64)
+        return
+
+    rng = rng or np.random.default_rng()
+    order = rng.permutation(-(-n // chunk_rows))
+    carry = np.empty(0, dtype=np.int64)
+    for w in range(0, len(order), window):
+        parts = [carry] + [
+            np.arange(c * chunk_rows, min((c + 1) * chunk_rows, n), dtype=np.int64) for c in order[w : w + window]
+        ]
+        pool = np.concatenate(parts)
+        rng.shuffle(pool)
+        full = len(pool) // batch_size * batch_size
+        for start in range(0, full, batch_size):
+            yield np.sort(pool[start : start + batch_size])
+        carry = pool[full:]
+    if len(carry) and not drop_last:
+        yield np.sort(carry)
+
+
+class BatchLoader:
+    """
+    Iterates shuffled (x, y) mini-batches of an EndpointCorpus. Gathers run
+    on num_workers background threads (NumPy releases the GIL while copying),
+    keeping up to prefetch batches ready ahead of the training loop. Each
+    pass over the loader is one epoch with a fresh shuffle.
+    """
+
+    def __init__(
+        self,
+        corpus: EndpointCorpus,
+        batch_size: int = 4096,
+        shuffle: bool = True,
+        seed: Optional[int] = None,
+        drop_last: bool = False,
+        num_workers: int = 2,
+        prefetch: int = 8,
+    ):
+        self.corpus = corpus
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.num_workers = max(1, num_workers)
+        self.prefetch = max(1, prefetch)
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        n = len(self.corpus)
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        batches = iter_batch_indices(len(self.corpus), self.batch_size, self.shuffle, self.rng, self.drop_last)
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            pending = deque()
+            for idx in batches:
+                pending.append(pool.submit(self.corpus.gather, idx))
+                if len(pending) >= self.prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def open_loader(source: str, batch_size: int = 4096, **kwargs) -> BatchLoader:
+    """EndpointCorpus over every dataset matched by source, wrapped in a BatchLoader."""
+    paths = find_datasets(source)
+    if not paths:
+        raise FileNotFoundError(f"No .npz datasets found: {source}")
+    return BatchLoader(EndpointCorpus(paths), batch_size, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Measure loader throughput over a folder of .npz endpoint datasets.")
+    parser.add_argument("source", help=".npz dataset, folder or glob")
+    parser.add_argument("-b", "--batch-size", type=int, default=4096)
+    parser.add_argument("-j", "--workers", type=int, default=2)
+    parser.add_argument("--epochs", type=int, default=1)
+    args = parser.parse_args()
+
+    loader = open_loader(args.source, args.batch_size, num_workers=args.workers)
+    print(f"{len(loader.corpus.paths)} files, {len(loader.corpus)} rows, {len(loader)} batches/epoch")
+    for epoch in range(args.epochs):
+        t0 = time.perf_counter()
+        rows = sum(len(x) for x, _ in loader)
+        dt = time.perf_counter() - t0
+        print(f"epoch {epoch}: {rows / dt / 1e6:.2f} M rows/s ({dt:.2f} s)")
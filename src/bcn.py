@@ -1,16 +1,25 @@
+import os
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-def get_compressonator_path() -> Path:
+from src.encode_cache import EncodeCache
+from src.timing import file_size, stage
+
+def read_env_value(key: str) -> Optional[str]:
     env_path = Path(__file__).parent.parent / ".env"
-    default_path = Path("C:\\Compressonator_4.5.52\\bin\\CLI\\compressonatorcli.exe")
     
     if env_path.exists():
         try:
             with open(env_path, "r") as f:
                 for line in f:
                     line = line.strip()
-                    if line.startswith("COMPRESSONATOR_PATH="):
+                    if line.startswith(f"{key}="):
                         # Extract value after =
                         value = line.split("=", 1)[1].strip()
                         # Remove quotes if present
@@ -19,11 +28,48 @@ def get_compressonator_path() -> Path:
                             value = value[1:-1]
                         
                         if value:
-                            return Path(value)
+                            return value
         except Exception:
             pass
             
-    return default_path
+    return None
+
+def get_compressonator_path() -> Path:
+    default_path = Path("C:\\Compressonator_4.5.52\\bin\\CLI\\compressonatorcli.exe")
+    value = read_env_value("COMPRESSONATOR_PATH")
+    return Path(value) if value else default_path
+
+def get_encode_cache() -> Optional[EncodeCache]:
+    """
+    Returns the encode cache configured by NTBC_CACHE_DIR (and optionally
+    NTBC_CACHE_MAX_MB) in .env, or None when caching isn't configured.
+    """
+    root = read_env_value("NTBC_CACHE_DIR")
+    if not root:
+        return None
+    max_mb = read_env_value("NTBC_CACHE_MAX_MB")
+    if max_mb:
+        return EncodeCache(root, max_bytes=int(float(max_mb) * 1024 * 1024))
+    return EncodeCache(root)
+
+
+def get_metrics_log() -> Optional[str]:
+    """JSONL file that stage timing records are appended to (NTBC_METRICS_LOG in .env), or None."""
+    return read_env_value("NTBC_METRICS_LOG")
+
+
+class EncodeCancelled(Exception):
+    """Raised by bcn.run when its cancel event is set while the encode is running."""
+
+
+BACKENDS = ("compressonator", "numpy")
+
+# Inputs up to this many pixels are grouped into shared compressonatorcli
+# processes by iter_bcn_batch(files_per_process=...): for them process startup
+# and GPU init take longer than the encode itself.
+GROUP_MAX_PIXELS = 256 * 256
+DEFAULT_FILES_PER_PROCESS = 32
+
 
 class bcn:
 
@@ -34,20 +80,37 @@ class bcn:
         output_image,
         format="BC1",
         quality=0.75,
-        use_gpu=True
+        use_gpu=True,
+        cache: Optional[EncodeCache] = None,
+        backend="compressonator",
+        tile_size: Optional[int] = None,
+        tile_workers: Optional[int] = None
     ):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        self.backend = backend
         self.cli_path = get_compressonator_path()
         self.input_image = Path(input_image)
         self.output_image = Path(output_image)
         self.format = format
         self.quality = quality
         self.use_gpu = use_gpu
+        self.cache = cache
+        self.cache_hit = False
+        # .dds outputs of images larger than this (pixels per side) are encoded as parallel tiles
+        self.tile_size = tile_size
+        # tiles encoded at once (default: CPU count); the scheduler caps it at the one slot it granted
+        self.tile_workers = tile_workers
 
-    #the subprocess function that runs the command
-    def run(self):
+    #builds the compressonatorcli argument list (a descriptive one for the numpy backend)
+    def build_command(self):
         if not (0.05 <= self.quality <= 1.0):
             raise ValueError("quality must be between 0.05 and 1.0")
 
+        if self.backend == "numpy":
+            return ["numpy", "-fd", self.format, "-Quality", str(self.quality),
+                    str(self.input_image), str(self.output_image)]
+
         cmd = [
             str(self.cli_path),
             "-fd", self.format,
@@ -63,11 +126,353 @@ class bcn:
             str(self.output_image),
         ]
 
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
+        return cmd
+
+    #compressonatorcli arguments that convert every image in input_folder into output_folder with this job's settings
+    def build_folder_command(self, input_folder, output_folder):
+        cmd = self.build_command()
+        # Same options as a single-file run, with -fx naming the output type for folder mode
+        return cmd[:-2] + ["-fx", self.output_image.suffix.lstrip(".").upper(), str(input_folder), str(output_folder)]
+
+    #file whose content identifies the encoder (for numpy the encoder source stands in for the executable)
+    def encoder_path(self) -> Path:
+        if self.backend == "numpy":
+            return Path(__file__).parent / "encode.py"
+        return self.cli_path
 
+    #key of this encode in the content-addressed cache
+    def cache_key(self) -> str:
+        params = {"format": self.format, "quality": float(self.quality), "use_gpu": bool(self.use_gpu),
+                  "backend": self.backend}
+        return self.cache.key(self.input_image, self.output_image.suffix, params, self.encoder_path())
+
+    #the subprocess function that runs the command, served from the cache when possible
+    def run(self, cancel_event: Optional[threading.Event] = None):
+        with stage("bcn", "total", file=self.input_image.name) as info:
+            result = self._run(cancel_event)
+            info["bytes_in"] = file_size(self.input_image)
+            info["bytes_out"] = file_size(self.output_image) if result.returncode == 0 else 0
+            info["cache_hit"] = self.cache_hit
         return result
+
+    def _run(self, cancel_event: Optional[threading.Event]):
+        cmd = self.build_command()
+        self.cache_hit = False
+
+        key = self._cache_lookup()
+        if self.cache_hit:
+            return subprocess.CompletedProcess(cmd, 0, "cache hit\n", "")
+
+        if self.tile_count() > 1:
+            result = self._encode_tiled(cmd, cancel_event)
+        elif self.backend == "numpy":
+            result = self._encode_in_process(cmd, cancel_event)
+        else:
+            result = self._spawn(cmd, cancel_event)
+
+        self._cache_store(key, result)
+        return result
+
+    #copies a cached encode to output_image when there is one; returns the cache key (None without a cache)
+    #on a miss an output_image still linked to an older entry is unlinked so the encode can't write into it
+    def _cache_lookup(self) -> Optional[str]:
+        if self.cache is None:
+            return None
+        with stage("bcn", "cache_lookup", file=self.input_image.name) as info:
+            key = self.cache_key()
+            self.cache_hit = info["hit"] = bool(self.cache.get(key, self.output_image.suffix, self.output_image))
+        if not self.cache_hit:
+            self.cache.unshare(self.output_image)
+        return key
+
+    def _cache_store(self, key: Optional[str], result: subprocess.CompletedProcess) -> None:
+        if key is not None and result.returncode == 0 and self.output_image.exists():
+            with stage("bcn", "cache_store", file=self.input_image.name, bytes_out=file_size(self.output_image)):
+                self.cache.put(key, self.output_image.suffix, self.output_image)
+
+    #number of tiles this encode is split into (see src/tiled_encode.py), 1 when it isn't tiled
+    def tile_count(self) -> int:
+        if not self.tile_size or self.output_image.suffix.lower() != ".dds":
+            return 1
+        from src.tiled_encode import needs_tiling, tile_grid
+
+        size = image_size(self.input_image)
+        if size is None or not needs_tiling(size[0], size[1], self.tile_size):
+            return 1
+        return len(tile_grid(size[0], size[1], self.tile_size))
+
+    def _encode_tiled(self, cmd, cancel_event: Optional[threading.Event]):
+        from src.tiled_encode import encode_tiled
+
+        try:
+            encode_tiled(self, self.tile_size, self.tile_workers, cancel_event=cancel_event)
+        except EncodeCancelled:
+            raise
+        except Exception as e:
+            return subprocess.CompletedProcess(cmd, 1, "", str(e))
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    def _encode_in_process(self, cmd, cancel_event: Optional[threading.Event]):
+        from src.encode import encode_file
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise EncodeCancelled(str(self.input_image))
+        try:
+            with stage("bcn", "encode", file=self.input_image.name):
+                encode_file(self.input_image, self.output_image, self.format, self.quality)
+        except Exception as e:
+            return subprocess.CompletedProcess(cmd, 1, "", str(e))
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    def _spawn(self, cmd, cancel_event: Optional[threading.Event]):
+        if cancel_event is not None and cancel_event.is_set():
+            raise EncodeCancelled(str(self.input_image))
+
+        # Process creation and the encode itself are timed as separate stages
+        with stage("bcn", "spawn", file=self.input_image.name):
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+
+        with stage("bcn", "encode", file=self.input_image.name):
+            stdout, stderr = _communicate(proc, cancel_event, str(self.input_image))
+
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+def _communicate(proc: subprocess.Popen, cancel_event: Optional[threading.Event], label: str):
+    """Waits for proc and returns (stdout, stderr); kills it and raises EncodeCancelled on cancel."""
+    if cancel_event is None:
+        return proc.communicate()
+    # Poll so a cancel request can kill the process mid-encode
+    while True:
+        try:
+            return proc.communicate(timeout=0.1)
+        except subprocess.TimeoutExpired:
+            if cancel_event.is_set():
+                proc.kill()
+                proc.communicate()
+                raise EncodeCancelled(label)
+
+
+def _new_item(index: int, job: bcn) -> Dict[str, Any]:
+    return {"index": index, "job": job, "result": None, "returncode": None, "error": None, "cancelled": False}
+
+
+def _run_job(index: int, job: bcn, cancel_event: Optional[threading.Event]) -> Dict[str, Any]:
+    item = _new_item(index, job)
+    start = time.perf_counter()
+    try:
+        result = job.run(cancel_event=cancel_event)
+        item["result"] = result
+        item["returncode"] = result.returncode
+    except EncodeCancelled:
+        item["cancelled"] = True
+        item["error"] = "cancelled"
+    except Exception as e:
+        item["error"] = str(e)
+    item["seconds"] = time.perf_counter() - start
+    return item
+
+
+def _run_group(indices: List[int], jobs: List[bcn], cancel_event: Optional[threading.Event]) -> List[Dict[str, Any]]:
+    """
+    Encodes several jobs with identical settings in one compressonatorcli
+    process (folder mode): the inputs are hard-linked (or copied) into a
+    staging folder as "{n}-{name}", converted into a second staging folder,
+    and each output is moved to its job's output_image. Cache hits are served
+    first; any job whose output is missing afterwards is re-run on its own, so
+    a bad input only fails itself. Returns one result dict per index.
+    """
+    items = []
+    single = []  # left to _run_job, which reports their errors
+    keys = {}
+    for i in indices:
+        job = jobs[i]
+        job.cache_hit = False
+        try:
+            cmd = job.build_command()
+            keys[i] = job._cache_lookup()
+        except Exception:
+            single.append(i)
+            continue
+        if job.cache_hit:
+            item = _new_item(i, job)
+            item["result"] = subprocess.CompletedProcess(cmd, 0, "cache hit\n", "")
+            item["returncode"] = 0
+            item["seconds"] = 0.0
+            items.append(item)
+
+    batch = [i for i in indices if i in keys and not jobs[i].cache_hit]
+    if len(batch) < 2:
+        return items + [_run_job(i, jobs[i], cancel_event) for i in sorted(single + batch)]
+
+    first = jobs[batch[0]]
+    first.output_image.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".ntbc_batch_", dir=first.output_image.parent))
+    in_dir, out_dir = staging / "in", staging / "out"
+    in_dir.mkdir()
+    out_dir.mkdir()
+    done = []
+    try:
+        staged = {}
+        for n, i in enumerate(batch):
+            src = jobs[i].input_image
+            link = in_dir / f"{n}-{src.name}"
+            try:
+                try:
+                    os.link(src, link)
+                except OSError:
+                    shutil.copyfile(src, link)
+            except OSError:
+                continue
+            staged[i] = f"{n}-{src.stem}{jobs[i].output_image.suffix}".lower()
+
+        start = time.perf_counter()
+        cmd = first.build_folder_command(in_dir, out_dir)
+        bytes_in = sum(file_size(jobs[i].input_image) for i in staged)
+        with stage("bcn", "batch", files=len(staged), bytes_in=bytes_in) as info:
+            try:
+                with stage("bcn", "spawn", files=len(staged)):
+                    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                with stage("bcn", "encode", files=len(staged)):
+                    stdout, stderr = _communicate(proc, cancel_event, f"{len(staged)} files")
+            except EncodeCancelled:
+                for i in batch:
+                    item = _new_item(i, jobs[i])
+                    item["cancelled"] = True
+                    item["error"] = "cancelled"
+                    item["seconds"] = time.perf_counter() - start
+                    items.append(item)
+                return items + [_run_job(i, jobs[i], cancel_event) for i in single]
+            except OSError:
+                stdout = stderr = ""
+
+            produced = {p.name.lower(): p for p in out_dir.iterdir()}
+            for i, name in staged.items():
+                if name in produced and produced[name].stat().st_size > 0:
+                    shutil.move(str(produced[name]), str(jobs[i].output_image))
+                    done.append(i)
+            info["bytes_out"] = sum(file_size(jobs[i].output_image) for i in done)
+        seconds = (time.perf_counter() - start) / max(len(staged), 1)
+
+        for i in done:
+            item = _new_item(i, jobs[i])
+            item["result"] = subprocess.CompletedProcess(cmd, 0, stdout, stderr)
+            item["returncode"] = 0
+            item["seconds"] = seconds
+            try:
+                jobs[i]._cache_store(keys[i], item["result"])
+            except OSError:
+                pass
+            items.append(item)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    # One process per remaining file, to find out which input failed and why
+    rest = sorted(single + [i for i in batch if i not in set(done)])
+    return items + [_run_job(i, jobs[i], cancel_event) for i in rest]
+
+
+def _group_key(job: bcn):
+    return (str(job.cli_path), job.format, job.quality, job.use_gpu, job.output_image.suffix.lower())
+
+
+def image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """(width, height) from the image header, or None when it can't be read."""
+    try:
+        from PIL import Image
+
+        with Image.open(path) as img:
+            return img.width, img.height
+    except Exception:
+        return None
+
+
+def plan_units(
+    jobs: List[bcn],
+    files_per_process: int,
+    max_workers: int,
+    max_pixels: Optional[int] = GROUP_MAX_PIXELS,
+) -> List[List[int]]:
+    """
+    Splits job indices into units of work for iter_bcn_batch: a single index
+    runs through bcn.run, a longer list shares one compressonatorcli process.
+    Only compressonator jobs with the same settings and at most max_pixels
+    input pixels (any size when None) are grouped, at most files_per_process
+    per group and small enough that all max_workers threads get a group.
+    """
+    units = []
+    groups: Dict[tuple, List[int]] = {}
+    for i, job in enumerate(jobs):
+        groupable = files_per_process > 1 and job.backend == "compressonator"
+        if groupable and max_pixels is not None:
+            size = image_size(job.input_image)
+            groupable = size is not None and size[0] * size[1] <= max_pixels
+        if groupable:
+            groups.setdefault(_group_key(job), []).append(i)
+        else:
+            units.append([i])
+    for indices in groups.values():
+        size = max(1, min(files_per_process, -(-len(indices) // max_workers)))
+        units += [indices[k : k + size] for k in range(0, len(indices), size)]
+    units.sort(key=lambda u: u[0])
+    return units
+
+
+def run_unit(unit: List[int], jobs: List[bcn], cancel_event: Optional[threading.Event]) -> List[Dict[str, Any]]:
+    """
+    Runs one plan_units unit (a single job or a shared-process group) and
+    returns its result dicts. jobs is anything indexed by the unit's indices.
+    """
+    if len(unit) == 1:
+        return [_run_job(unit[0], jobs[unit[0]], cancel_event)]
+    return _run_group(unit, jobs, cancel_event)
+
+
+def iter_bcn_batch(
+    jobs: Iterable[bcn],
+    max_workers: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+    files_per_process: int = 1,
+    max_pixels: Optional[int] = GROUP_MAX_PIXELS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Runs bcn jobs concurrently on a bounded thread pool and yields one result
+    dict per job as it finishes: index, job, result (CompletedProcess or None),
+    returncode, error (exception message or None), cancelled and seconds.
+    Each worker just waits on its own compressonatorcli process, so threads are enough.
+    Setting cancel_event kills running encodes and skips the queued ones.
+
+    With files_per_process > 1, small compressonator inputs (see plan_units)
+    are encoded up to files_per_process per process, which saves the CLI's
+    startup and GPU init on every file; their seconds is the process's time
+    divided by the files it encoded.
+    """
+    jobs = list(jobs)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(jobs) or 1))
+    units = plan_units(jobs, files_per_process, max_workers, max_pixels)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_unit, u, jobs, cancel_event) for u in units]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def bcn_batch(
+    jobs: Iterable[bcn],
+    max_workers: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+    files_per_process: int = 1,
+    max_pixels: Optional[int] = GROUP_MAX_PIXELS,
+) -> List[Dict[str, Any]]:
+    """Runs all jobs via iter_bcn_batch and returns their results in input order."""
+    results = list(iter_bcn_batch(jobs, max_workers=max_workers, cancel_event=cancel_event,
+                                  files_per_process=files_per_process, max_pixels=max_pixels))
+    results.sort(key=lambda r: r["index"])
+    return results
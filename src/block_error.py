@@ -0,0 +1,153 @@
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.ktx import open_texture
+from src.decode import decode_bc1_blocks, decode_bc4_blocks
+from src.encode import CHUNK_BLOCKS, image_to_blocks, load_image
+
+SAMPLE_MODES = ("top_k", "proportional")
+
+# Anchor colors of the heatmap ramp (dark purple -> red -> pale yellow),
+# interpolated to a 256-entry lookup table.
+_HEAT_ANCHORS = np.array(
+    [[0, 0, 4], [80, 18, 123], [182, 54, 121], [251, 136, 97], [252, 253, 191]], dtype=np.float64
+)
+_HEAT_LUT = np.stack(
+    [np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(_HEAT_ANCHORS)), _HEAT_ANCHORS[:, c]) for c in range(3)],
+    axis=1,
+).round().astype(np.uint8)
+
+
+def _texel_mask(blocks_x: int, blocks_y: int, width: int, height: int, start: int, stop: int) -> np.ndarray:
+    """(N, 16) True where a texel of blocks start..stop lies inside the width x height image."""
+    idx = np.arange(start, stop, dtype=np.int64)
+    i = np.arange(16)
+    x = (idx % blocks_x)[:, None] * 4 + i % 4
+    y = (idx // blocks_x)[:, None] * 4 + i // 4
+    return (x < width) & (y < height)
+
+
+def block_errors(img: np.ndarray, blocks: np.ndarray, fmt: str, width: int, height: int) -> np.ndarray:
+    """
+    Mean squared error of every block against the source image, as a
+    (blocks_y, blocks_x) float32 map in the layout of DDSFile.level_grid.
+    BC1 is compared on RGB, BC4 on the red channel (the one it encodes);
+    texels past the image edge are ignored.
+    """
+    if img.shape[:2] != (height, width):
+        raise ValueError(f"source is {img.shape[1]}x{img.shape[0]}, texture is {width}x{height}")
+    if img.ndim == 2:
+        img = img[:, :, None]
+    texels = image_to_blocks(img[:, :, :3] if fmt == "BC1" else img[:, :, :1])
+    decode = decode_bc1_blocks if fmt == "BC1" else decode_bc4_blocks
+    blocks_x, blocks_y = (width + 3) // 4, (height + 3) // 4
+
+    err = np.empty(len(texels), dtype=np.float32)
+    for start in range(0, len(err), CHUNK_BLOCKS):
+        stop = min(start + CHUNK_BLOCKS, len(err))
+        src = texels[start:stop].astype(np.int32)
+        diff = decode(blocks[start:stop])[:, :, : src.shape[2]].astype(np.int32) - src
+        sq = np.einsum("nkc,nkc->nk", diff, diff)
+        mask = _texel_mask(blocks_x, blocks_y, width, height, start, stop)
+        err[start:stop] = (sq * mask).sum(axis=1) / (mask.sum(axis=1) * src.shape[2])
+    return err.reshape(blocks_y, blocks_x)
+
+
+def dds_block_errors(dds_path, source_image, mip: int = 0, array_index: int = 0) -> np.ndarray:
+    """block_errors of one level of a DDS file against the image it was encoded from."""
+    img = load_image(source_image)
+    with open_texture(dds_path) as dds:
+        lvl = dds.level(mip, array_index)
+        return block_errors(img, dds.level_blocks(mip, array_index), dds.format, lvl.width, lvl.height)
+
+
+def heatmap(errors: np.ndarray, vmax: Optional[float] = None, scale: int = 1) -> np.ndarray:
+    """
+    (H, W) error map -> (H * scale, W * scale, 3) uint8 heatmap. Errors are
+    shown on a square-root scale up to vmax (default: the largest error).
+    """
+    errors = np.asarray(errors, dtype=np.float64)
+    vmax = float(errors.max()) if vmax is None else float(vmax)
+    t = np.sqrt(np.clip(errors / vmax, 0.0, 1.0)) if vmax > 0 else np.zeros_like(errors)
+    img = _HEAT_LUT[np.rint(t * 255).astype(np.uint8)]
+    if scale > 1:
+        img = img.repeat(scale, axis=0).repeat(scale, axis=1)
+    return img
+
+
+def save_heatmap(errors: np.ndarray, path, vmax: Optional[float] = None, scale: int = 1) -> None:
+    """Writes heatmap(errors) as an image file. Needs Pillow."""
+    from PIL import Image
+
+    Image.fromarray(heatmap(errors, vmax, scale)).save(path)
+
+
+def resolve_count(count: float, total: int) -> int:
+    """A block count: count itself when >= 1, else that fraction of total."""
+    if count <= 0:
+        raise ValueError(f"sample count must be positive, got {count}")
+    n = int(count) if count >= 1 else int(round(count * total))
+    return min(max(n, 1), total)
+
+
+def select_blocks(
+    errors: np.ndarray,
+    count: float,
+    mode: str = "top_k",
+    seed: Optional[int] = None,
+    candidates: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Picks count blocks (or that fraction of them, for count < 1) from a
+    block error map and returns their row-major indices, ascending.
+    "top_k" keeps the blocks with the largest error; "proportional" samples
+    without replacement with probability proportional to error, so
+    zero-error blocks only come up once all others are taken. candidates is
+    an optional boolean mask over the blocks to choose from.
+    """
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f"mode must be one of {SAMPLE_MODES}, got {mode!r}")
+    errors = np.asarray(errors, dtype=np.float64).ravel()
+    pool = np.arange(len(errors)) if candidates is None else np.flatnonzero(np.asarray(candidates).ravel())
+    if len(pool) == 0:
+        return pool
+    k = resolve_count(count, len(pool))
+    e = errors[pool]
+    if mode == "top_k":
+        key = e
+    else:
+        # Efraimidis-Spirakis: the k largest log(u) / w are a weighted sample without replacement
+        rng = np.random.default_rng(seed)
+        with np.errstate(divide="ignore"):
+            key = np.log(rng.random(len(e))) / e
+    if k < len(pool):
+        pool = pool[np.argpartition(key, len(key) - k)[-k:]]
+    return np.sort(pool)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Per-block compression error of a DDS against its source image.")
+    parser.add_argument("dds", help="BC1/BC4 DDS file")
+    parser.add_argument("source", help="image the DDS was encoded from")
+    parser.add_argument("--map", help="write the (blocks_y, blocks_x) float32 error map to this .npy file")
+    parser.add_argument("--heatmap", help="write a heatmap image (e.g. .png)")
+    parser.add_argument("--scale", type=int, default=1, help="heatmap pixels per block")
+    parser.add_argument("--vmax", type=float, default=None, help="error shown at full heat (default: max error)")
+    parser.add_argument("--mip", type=int, default=0)
+    args = parser.parse_args()
+
+    errors = dds_block_errors(args.dds, args.source, args.mip)
+    print(f"{errors.shape[1]}x{errors.shape[0]} blocks, mean MSE {errors.mean():.2f}, max {errors.max():.2f}")
+    if args.map:
+        np.save(args.map, errors)
+        print(f"Error map written to: {args.map}")
+    if args.heatmap:
+        save_heatmap(errors, args.heatmap, args.vmax, args.scale)
+        print(f"Heatmap written to: {args.heatmap}")
@@ -0,0 +1,386 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.bcn import BACKENDS, DEFAULT_FILES_PER_PROCESS, bcn, get_encode_cache
+from src.scheduler import DEFAULT_GPU_SLOTS, iter_bcn_scheduled
+from src.tiled_encode import DEFAULT_TILE_SIZE
+from src.encode_cache import executable_identity, file_digest
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tga"}
+
+MANIFEST_NAME = "ntbc_manifest.json"
+MANIFEST_VERSION = 1
+
+# The manifest is rewritten after this many finished encodes, so an
+# interrupted build keeps most of its progress.
+SAVE_EVERY = 200
+
+
+def scan_sources(root: Path) -> Dict[str, Tuple[int, int]]:
+    """
+    Recursively lists the images under root as {relative posix path: (size,
+    mtime_ns)}. Uses os.scandir so the stat data mostly comes with the
+    directory listing instead of one extra syscall per file.
+    """
+    found: Dict[str, Tuple[int, int]] = {}
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                rel = Path(entry.path).relative_to(root).as_posix()
+                found[rel] = (st.st_size, st.st_mtime_ns)
+    return found
+
+
+def output_name(rel: str, format: str, quality: float, file_type: str) -> str:
+    """Same naming as the converter window: [stem]-[format]-[quality].[type], in the source's subfolder."""
+    rel = Path(rel)
+    return (rel.parent / f"{rel.stem}-{format}-{quality:.2f}.{file_type}").as_posix()
+
+
+class BuildManifest:
+    """
+    Record of what an output folder was built from: per source image its size,
+    mtime, content digest and output path, plus the encode parameters and
+    encoder identity for the whole folder. Stored as JSON next to the outputs.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.params: Dict[str, Any] = {}
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get("version") == MANIFEST_VERSION:
+                self.params = data["params"]
+                self.entries = data["entries"]
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"version": MANIFEST_VERSION, "params": self.params, "entries": dict(self.entries)}
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(data, indent=1, sort_keys=True))
+        os.replace(tmp, self.path)
+
+    def record(self, rel: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.entries[rel] = entry
+
+    def forget(self, rel: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.entries.pop(rel, None)
+
+
+def plan_build(
+    source_root: Path,
+    output_root: Path,
+    manifest: BuildManifest,
+    params: Dict[str, Any],
+    scan: Dict[str, Tuple[int, int]],
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """
+    Compares a scan with the manifest, whose entries must all be of existing
+    sources (call remove_entries first). Returns (work, conflicts): work items
+    for new or changed images ({rel, size, mtime_ns, digest, output}) and
+    {file, error} for images whose output name is already taken by another
+    source (e.g. a.png and a.bmp); the manifest's owner, else the first in
+    sorted order, keeps the name. A changed parameter set rebuilds
+    everything; otherwise only files whose size or mtime moved are hashed,
+    and a file whose content is unchanged (e.g. touched) just gets its
+    manifest entry refreshed.
+    """
+    if manifest.params != params:
+        manifest.params = params
+        manifest.entries.clear()
+
+    owners = {entry["output"]: rel for rel, entry in manifest.entries.items()}
+    work, conflicts = [], []
+    for rel, (size, mtime_ns) in sorted(scan.items()):
+        out = output_name(rel, params["format"], params["quality"], params["file_type"])
+        owner = owners.setdefault(out, rel)
+        if owner != rel:
+            conflicts.append({"file": rel, "error": f"output {out} is already written from {owner}"})
+            continue
+        entry = manifest.entries.get(rel)
+        if entry is not None and not (output_root / entry["output"]).exists():
+            entry = None
+        if entry is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+            continue
+
+        try:
+            digest = file_digest(source_root / rel)
+        except OSError:
+            # Vanished or still locked by the writer; picked up next time
+            continue
+        if entry is not None and entry["digest"] == digest:
+            manifest.record(rel, {**entry, "size": size, "mtime_ns": mtime_ns})
+            continue
+        work.append({"rel": rel, "size": size, "mtime_ns": mtime_ns, "digest": digest, "output": out})
+    return work, conflicts
+
+
+def build_params(format: str, quality: float, file_type: str, backend: str, use_gpu: bool) -> Dict[str, Any]:
+    """Encode parameters plus the encoder identity; any change invalidates the whole manifest."""
+    probe = bcn("probe", f"probe.{file_type}", format=format, quality=quality, use_gpu=use_gpu, backend=backend)
+    probe.build_command()  # validates quality
+    if backend == "numpy" and file_type != "dds":
+        raise ValueError("The numpy encoder only writes dds files.")
+    return {
+        "format": format,
+        "quality": float(quality),
+        "file_type": file_type,
+        "backend": backend,
+        "use_gpu": bool(use_gpu),
+        "encoder": executable_identity(probe.encoder_path()),
+    }
+
+
+def run_build(
+    source_root: Path,
+    output_root: Path,
+    manifest: BuildManifest,
+    work: List[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+    files_per_process: int = DEFAULT_FILES_PER_PROCESS,
+    tile_size: Optional[int] = DEFAULT_TILE_SIZE,
+    gpu_slots: int = DEFAULT_GPU_SLOTS,
+) -> Dict[str, Any]:
+    """
+    Encodes the planned work items in parallel and records each success in
+    the manifest. Small images share compressonatorcli processes, up to
+    files_per_process each (see iter_bcn_batch); .dds outputs of images
+    larger than tile_size are encoded as parallel tiles. With use_gpu,
+    gpu_slots GPU encodes run beside max_workers CPU encodes and jobs are
+    routed between them by iter_bcn_scheduled. Returns
+    {"encoded": [...], "errors": [{"file", "error"}], "cancelled": n}.
+    """
+    params = manifest.params
+    cache = get_encode_cache()
+    jobs = []
+    for item in work:
+        out = output_root / item["output"]
+        out.parent.mkdir(parents=True, exist_ok=True)
+        jobs.append(bcn(
+            source_root / item["rel"], out, format=params["format"], quality=params["quality"],
+            use_gpu=params["use_gpu"], cache=cache, backend=params["backend"], tile_size=tile_size,
+        ))
+
+    report: Dict[str, Any] = {"encoded": [], "errors": [], "cancelled": 0}
+    for n, result in enumerate(iter_bcn_scheduled(
+        jobs, gpu_slots, max_workers, cancel_event, files_per_process
+    ), 1):
+        item = work[result["index"]]
+        if result["cancelled"]:
+            report["cancelled"] += 1
+        elif result["error"] is not None or result["returncode"] != 0:
+            error = result["error"] or result["result"].stderr.strip() or f"exit code {result['returncode']}"
+            report["errors"].append({"file": item["rel"], "error": error})
+        else:
+            manifest.record(item["rel"], {k: item[k] for k in ("size", "mtime_ns", "digest", "output")})
+            report["encoded"].append(item["rel"])
+        if n % SAVE_EVERY == 0:
+            manifest.save()
+    manifest.save()
+    report["errors"].sort(key=lambda e: e["file"])
+    return report
+
+
+def remove_entries(output_root: Path, manifest: BuildManifest, removed: List[str], prune: bool) -> None:
+    """Drops manifest entries of deleted sources, deleting their outputs too when prune is set."""
+    for rel in removed:
+        entry = manifest.forget(rel)
+        if prune and entry is not None:
+            (output_root / entry["output"]).unlink(missing_ok=True)
+    if removed:
+        manifest.save()
+
+
+def build(
+    source: str,
+    output_folder: str,
+    format: str = "BC1",
+    quality: float = 0.75,
+    file_type: str = "dds",
+    backend: str = "compressonator",
+    use_gpu: bool = True,
+    max_workers: Optional[int] = None,
+    prune: bool = False,
+    files_per_process: int = DEFAULT_FILES_PER_PROCESS,
+    tile_size: Optional[int] = DEFAULT_TILE_SIZE,
+    gpu_slots: int = DEFAULT_GPU_SLOTS,
+) -> Dict[str, Any]:
+    """
+    Incrementally converts every image under source into output_folder:
+    only images added or changed since the last build (per the manifest in
+    output_folder) are encoded. Returns the run_build report plus "skipped"
+    and "removed".
+    """
+    source_root = Path(source).resolve()
+    output_root = Path(output_folder).resolve()
+    if not source_root.is_dir():
+        raise NotADirectoryError(f"Source folder not found: {source_root}")
+    output_root.mkdir(parents=True, exist_ok=True)
+
+    manifest = BuildManifest(output_root / MANIFEST_NAME)
+    params = build_params(format, quality, file_type, backend, use_gpu)
+    scan = scan_sources(source_root)
+    removed = sorted(set(manifest.entries) - set(scan))
+    remove_entries(output_root, manifest, removed, prune)
+    work, conflicts = plan_build(source_root, output_root, manifest, params, scan)
+
+    report = run_build(source_root, output_root, manifest, work, max_workers, None, files_per_process, tile_size,
+                       gpu_slots)
+    report["errors"] = sorted(report["errors"] + conflicts, key=lambda e: e["file"])
+    report["skipped"] = len(scan) - len(work) - len(conflicts)
+    report["removed"] = removed
+    return report
+
+
+def watch(
+    source: str,
+    output_folder: str,
+    format: str = "BC1",
+    quality: float = 0.75,
+    file_type: str = "dds",
+    backend: str = "compressonator",
+    use_gpu: bool = True,
+    max_workers: Optional[int] = None,
+    prune: bool = False,
+    files_per_process: int = DEFAULT_FILES_PER_PROCESS,
+    tile_size: Optional[int] = DEFAULT_TILE_SIZE,
+    gpu_slots: int = DEFAULT_GPU_SLOTS,
+    interval: float = 2.0,
+    stop_event: Optional[threading.Event] = None,
+    on_report=None,
+) -> None:
+    """
+    Builds once, then polls source every interval seconds and encodes images
+    as they land. A new or changed file is only picked up once its size and
+    mtime are the same on two consecutive polls, so half-written files are
+    not encoded. Files that fail are retried only after they change again.
+    Runs until stop_event is set (or KeyboardInterrupt).
+    """
+    source_root = Path(source).resolve()
+    output_root = Path(output_folder).resolve()
+    stop_event = stop_event or threading.Event()
+
+    report = build(source, output_folder, format, quality, file_type, backend, use_gpu, max_workers, prune,
+                   files_per_process, tile_size, gpu_slots)
+    if on_report:
+        on_report(report)
+
+    manifest = BuildManifest(output_root / MANIFEST_NAME)
+    params = manifest.params
+    pending: Dict[str, Tuple[int, int]] = {}
+    failed = {e["file"]: scan_stat for e in report["errors"]
+              if (scan_stat := _stat(source_root / e["file"])) is not None}
+    while not stop_event.wait(interval):
+        scan = scan_sources(source_root)
+        changed = {
+            rel: stat for rel, stat in scan.items()
+            if ((e := manifest.entries.get(rel)) is None or (e["size"], e["mtime_ns"]) != stat)
+            and failed.get(rel) != stat
+        }
+        stable = {rel: stat for rel, stat in changed.items() if pending.get(rel) == stat}
+        pending = {rel: stat for rel, stat in changed.items() if rel not in stable}
+
+        removed = sorted(set(manifest.entries) - set(scan))
+        remove_entries(output_root, manifest, removed, prune)
+        if not stable:
+            if removed and on_report:
+                on_report({"encoded": [], "errors": [], "cancelled": 0, "skipped": 0, "removed": removed})
+            continue
+
+        work, conflicts = plan_build(source_root, output_root, manifest, params, stable)
+        report = run_build(source_root, output_root, manifest, work, max_workers, None, files_per_process, tile_size,
+                           gpu_slots)
+        report["errors"] = sorted(report["errors"] + conflicts, key=lambda e: e["file"])
+        failed.update((e["file"], stable[e["file"]]) for e in report["errors"])
+        report["skipped"] = len(stable) - len(work) - len(conflicts)
+        report["removed"] = removed
+        if on_report:
+            on_report(report)
+
+
+def _stat(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"Encoded {len(report['encoded'])}, up to date {report['skipped']}, "
+        f"failed {len(report['errors'])}, removed {len(report['removed'])}."
+    ]
+    for err in report["errors"]:
+        lines.append(f"  {err['file']}: {err['error']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incrementally convert a folder of images, re-encoding only what changed.")
+    parser.add_argument("source", help="folder of images (searched recursively)")
+    parser.add_argument("-o", "--output", required=True, help="output folder; holds the build manifest")
+    parser.add_argument("-f", "--format", default="BC1", choices=["BC1", "BC4"])
+    parser.add_argument("-q", "--quality", type=float, default=0.75)
+    parser.add_argument("-t", "--type", default="dds", choices=["dds", "ktx", "ktx2"], help="output file type")
+    parser.add_argument("--backend", choices=BACKENDS, default="compressonator")
+    parser.add_argument("--cpu", action="store_true", help="encode with the CPU instead of the GPU")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="parallel CPU encodes (default: CPU count)")
+    parser.add_argument("--gpu-slots", type=int, default=DEFAULT_GPU_SLOTS,
+                        help="concurrent GPU encodes run beside the CPU ones (ignored with --cpu)")
+    parser.add_argument("--files-per-process", type=int, default=DEFAULT_FILES_PER_PROCESS,
+                        help="small images encoded per compressonatorcli process (1 = one process per image)")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE,
+                        help="encode .dds outputs of larger images as parallel tiles of this edge (0 = off)")
+    parser.add_argument("--prune", action="store_true", help="delete outputs whose source image was deleted")
+    parser.add_argument("--watch", action="store_true", help="keep running and encode changes as they land")
+    parser.add_argument("--interval", type=float, default=2.0, help="watch mode poll interval in seconds")
+    args = parser.parse_args()
+
+    common = dict(
+        format=args.format, quality=args.quality, file_type=args.type, backend=args.backend,
+        use_gpu=not args.cpu, max_workers=args.workers, prune=args.prune,
+        files_per_process=args.files_per_process, tile_size=args.tile_size or None,
+        gpu_slots=args.gpu_slots,
+    )
+    if args.watch:
+        def show(report):
+            if report["encoded"] or report["errors"] or report["removed"]:
+                print(f"[{time.strftime('%H:%M:%S')}] {format_report(report)}", flush=True)
+
+        print(f"Watching {args.source} (Ctrl+C to stop)")
+        try:
+            watch(args.source, args.output, interval=args.interval, on_report=show, **common)
+        except KeyboardInterrupt:
+            pass
+    else:
+        report = build(args.source, args.output, **common)
+        print(format_report(report))
+        if report["errors"]:
+            sys.exit(1)
@@ -0,0 +1,278 @@
+import struct
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+DDS_MAGIC = b"DDS "
+DDS_HEADER_SIZE = 124
+DDS_DX10_HEADER_SIZE = 20
+
+DXGI_FORMAT_BC1_UNORM = 71
+DXGI_FORMAT_BC1_UNORM_SRGB = 72
+DXGI_FORMAT_BC4_UNORM = 80
+
+# One BC1 block: two RGB565 endpoints followed by 16 2-bit selectors.
+BC1_BLOCK_DTYPE = np.dtype([("c0", "<u2"), ("c1", "<u2"), ("indices", "<u4")])
+
+# One BC4 block: two 8-bit endpoints followed by 16 3-bit selectors (48 bits).
+BC4_BLOCK_DTYPE = np.dtype([("a0", "u1"), ("a1", "u1"), ("indices", "u1", (6,))])
+
+BLOCK_DTYPES = {"BC1": BC1_BLOCK_DTYPE, "BC4": BC4_BLOCK_DTYPE}
+
+FOURCC_FORMATS = {b"DXT1": "BC1", b"ATI1": "BC4", b"BC4U": "BC4"}
+DXGI_FORMATS = {
+    DXGI_FORMAT_BC1_UNORM: "BC1",
+    DXGI_FORMAT_BC1_UNORM_SRGB: "BC1",
+    DXGI_FORMAT_BC4_UNORM: "BC4",
+}
+
+DDSD_MIPMAPCOUNT = 0x20000
+DDSCAPS2_CUBEMAP = 0x200
+DDSCAPS2_CUBEMAP_FACES = (0x400, 0x800, 0x1000, 0x2000, 0x4000, 0x8000)
+DDSCAPS2_VOLUME = 0x200000
+DDS_RESOURCE_MISC_TEXTURECUBE = 0x4
+DDS_DIMENSION_TEXTURE3D = 4
+
+
+class DDSLevel(NamedTuple):
+    """Location of one mip level of one array slice (or cube face) in the file."""
+
+    array_index: int
+    mip: int
+    width: int
+    height: int
+    blocks_x: int
+    blocks_y: int
+    num_blocks: int
+    offset: int
+
+
+class BlockTexture:
+    """
+    Block accessors shared by the memory-mapped texture readers (DDSFile,
+    ktx.KTXFile). A reader's __init__ maps the file into _buf and fills in
+    path, width, height, format, block_dtype, mip_count, array_size, the
+    top-level blocks_x/blocks_y/num_blocks and levels, ordered by
+    array_index * mip_count + mip.
+    """
+
+    _buf: Optional[np.memmap]
+    levels: List[DDSLevel]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.num_blocks
+
+    def close(self) -> None:
+        # Views handed out earlier keep the mapping alive until they are released.
+        self._buf = None
+
+    def level(self, mip: int = 0, array_index: int = 0) -> DDSLevel:
+        if not (0 <= mip < self.mip_count and 0 <= array_index < self.array_size):
+            raise IndexError(
+                f"level (mip={mip}, array_index={array_index}) out of range "
+                f"({self.mip_count} mips x {self.array_size} slices)"
+            )
+        return self.levels[array_index * self.mip_count + mip]
+
+    def level_blocks(self, mip: int = 0, array_index: int = 0) -> np.ndarray:
+        """Blocks of one level as a flat (num_blocks,) structured view in row-major order."""
+        if self._buf is None:
+            raise ValueError(f"I/O operation on closed {type(self).__name__}.")
+        lvl = self.level(mip, array_index)
+        nbytes = lvl.num_blocks * self.block_dtype.itemsize
+        return self._buf[lvl.offset : lvl.offset + nbytes].view(self.block_dtype)
+
+    def level_bytes(self, mip: int = 0, array_index: int = 0) -> memoryview:
+        """Raw block data of one level as a zero-copy memoryview into the mapping."""
+        return memoryview(self.level_blocks(mip, array_index).view(np.uint8))
+
+    def level_grid(self, mip: int = 0, array_index: int = 0) -> np.ndarray:
+        """Blocks of one level as a (blocks_y, blocks_x) structured view."""
+        lvl = self.level(mip, array_index)
+        return self.level_blocks(mip, array_index).reshape(lvl.blocks_y, lvl.blocks_x)
+
+    @property
+    def blocks(self) -> np.ndarray:
+        """All top-level blocks as a flat (num_blocks,) structured view in row-major order."""
+        return self.level_blocks()
+
+    @property
+    def grid(self) -> np.ndarray:
+        """All top-level blocks as a (blocks_y, blocks_x) structured view."""
+        return self.level_grid()
+
+    def block(self, index: int, mip: int = 0, array_index: int = 0) -> np.ndarray:
+        """A single block by row-major index, as a 0-d structured view."""
+        lvl = self.level(mip, array_index)
+        if not (0 <= index < lvl.num_blocks):
+            raise IndexError(f"block index {index} out of range [0, {lvl.num_blocks})")
+        return self.level_blocks(mip, array_index)[index]
+
+    def block_bytes(self, index: int, mip: int = 0, array_index: int = 0) -> memoryview:
+        """Raw bytes of a single block."""
+        lvl = self.level(mip, array_index)
+        if not (0 <= index < lvl.num_blocks):
+            raise IndexError(f"block index {index} out of range [0, {lvl.num_blocks})")
+        size = self.block_dtype.itemsize
+        start = lvl.offset + index * size
+        return memoryview(self._buf[start : start + size])
+
+    def rows(self, start: int, stop: int, mip: int = 0, array_index: int = 0) -> np.ndarray:
+        """Block rows [start, stop) as a (rows, blocks_x) view."""
+        return self.level_grid(mip, array_index)[start:stop]
+
+    def tile(self, bx: int, by: int, width: int, height: int, mip: int = 0, array_index: int = 0) -> np.ndarray:
+        """
+        A rectangular tile of blocks starting at block (bx, by), as a strided
+        (height, width) view. The tile is clipped to the level bounds.
+        """
+        return self.level_grid(mip, array_index)[by : by + height, bx : bx + width]
+
+    def sample(self, indices, mip: int = 0, array_index: int = 0) -> np.ndarray:
+        """Gathers the given row-major block indices (a copy of just those blocks)."""
+        return self.level_blocks(mip, array_index)[np.asarray(indices, dtype=np.int64)]
+
+
+class DDSFile(BlockTexture):
+    """
+    Lazy, memory-mapped reader for BC1 and BC4 DDS files.
+
+    The header (including the DX10 extension) is parsed once on open into an
+    offset index of every mip level of every array slice; block data is never
+    read up front. `blocks`, `block`, `rows` and `tile` return zero-copy views
+    into the mapping, so only the pages actually touched are loaded from disk.
+    They default to the top level of the first slice; pass mip/array_index to
+    address the others.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        size = self.path.stat().st_size
+        if size < 4 + DDS_HEADER_SIZE:
+            raise ValueError("Not a valid DDS file (missing DDS magic).")
+
+        self._buf: Optional[np.memmap] = np.memmap(self.path, dtype=np.uint8, mode="r")
+        data = self._buf
+        if bytes(data[0:4]) != DDS_MAGIC:
+            raise ValueError("Not a valid DDS file (missing DDS magic).")
+
+        header = bytes(data[4 : 4 + DDS_HEADER_SIZE])
+        if struct.unpack_from("<I", header, 0)[0] != DDS_HEADER_SIZE:
+            raise ValueError("Unexpected DDS header size.")
+
+        flags = struct.unpack_from("<I", header, 4)[0]
+        self.height = struct.unpack_from("<I", header, 8)[0]
+        self.width = struct.unpack_from("<I", header, 12)[0]
+        depth = struct.unpack_from("<I", header, 20)[0]
+        mip_count = struct.unpack_from("<I", header, 24)[0]
+        caps2 = struct.unpack_from("<I", header, 108)[0]
+
+        # Some writers leave mipMapCount at 0 (or set it without the flag) for a single level
+        self.mip_count = max(1, mip_count) if (flags & DDSD_MIPMAPCOUNT or mip_count > 1) else 1
+
+        ddspf_off = 72
+        self.fourcc = header[ddspf_off + 8 : ddspf_off + 12]
+        self.dxgi_format: Optional[int] = None
+
+        offset = 4 + DDS_HEADER_SIZE
+        if self.fourcc in FOURCC_FORMATS:
+            self.format = FOURCC_FORMATS[self.fourcc]
+            if caps2 & DDSCAPS2_VOLUME and depth > 1:
+                raise ValueError("Volume DDS textures are not supported.")
+            if caps2 & DDSCAPS2_CUBEMAP:
+                self.array_size = sum(1 for face in DDSCAPS2_CUBEMAP_FACES if caps2 & face) or 6
+            else:
+                self.array_size = 1
+        elif self.fourcc == b"DX10":
+            dx10 = bytes(data[offset : offset + DDS_DX10_HEADER_SIZE])
+            self.dxgi_format, dimension, misc_flag, array_size = struct.unpack_from("<IIII", dx10, 0)
+            if self.dxgi_format not in DXGI_FORMATS:
+                raise ValueError(f"DDS DX10 format is not BC1 or BC4 (dxgiFormat={self.dxgi_format}).")
+            if dimension == DDS_DIMENSION_TEXTURE3D:
+                raise ValueError("Volume DDS textures are not supported.")
+            self.format = DXGI_FORMATS[self.dxgi_format]
+            self.array_size = max(1, array_size)
+            if misc_flag & DDS_RESOURCE_MISC_TEXTURECUBE:
+                self.array_size *= 6
+            offset += DDS_DX10_HEADER_SIZE
+        else:
+            raise ValueError(f"Unsupported DDS FourCC: {self.fourcc!r}")
+
+        self.block_dtype = BLOCK_DTYPES[self.format]
+        self.data_offset = offset
+        self.blocks_x = (self.width + 3) // 4
+        self.blocks_y = (self.height + 3) // 4
+        self.num_blocks = self.blocks_x * self.blocks_y
+
+        # Slices are stored one after another, each with its full mip chain
+        self.levels: List[DDSLevel] = []
+        block_size = self.block_dtype.itemsize
+        for a in range(self.array_size):
+            for m in range(self.mip_count):
+                w, h = max(1, self.width >> m), max(1, self.height >> m)
+                bx, by = (w + 3) // 4, (h + 3) // 4
+                self.levels.append(DDSLevel(a, m, w, h, bx, by, bx * by, offset))
+                offset += bx * by * block_size
+
+        if size < self.data_offset + self.num_blocks * block_size:
+            raise ValueError(f"DDS truncated: not enough {self.format} blocks.")
+        if size < offset:
+            raise ValueError(f"DDS truncated: mip chain needs {offset} bytes, file has {size}.")
+
+
+FORMAT_FOURCCS = {"BC1": b"DXT1", "BC4": b"ATI1"}
+
+DDSD_CAPS = 0x1
+DDSD_HEIGHT = 0x2
+DDSD_WIDTH = 0x4
+DDSD_PIXELFORMAT = 0x1000
+DDSD_LINEARSIZE = 0x80000
+DDPF_FOURCC = 0x4
+DDSCAPS_TEXTURE = 0x1000
+DDSCAPS_COMPLEX = 0x8
+DDSCAPS_MIPMAP = 0x400000
+
+
+def dds_header(width: int, height: int, fmt: str, mip_count: int = 1) -> bytes:
+    """Magic plus a legacy (FourCC) header for a BC1/BC4 texture."""
+    if fmt not in FORMAT_FOURCCS:
+        raise ValueError(f"Unsupported format for DDS writing: {fmt}")
+    num_blocks = ((width + 3) // 4) * ((height + 3) // 4)
+
+    header = bytearray(DDS_HEADER_SIZE)
+    flags = DDSD_CAPS | DDSD_HEIGHT | DDSD_WIDTH | DDSD_PIXELFORMAT | DDSD_LINEARSIZE
+    caps = DDSCAPS_TEXTURE
+    if mip_count > 1:
+        flags |= DDSD_MIPMAPCOUNT
+        caps |= DDSCAPS_COMPLEX | DDSCAPS_MIPMAP
+    struct.pack_into("<IIIII", header, 0, DDS_HEADER_SIZE, flags, height, width, num_blocks * 8)
+    struct.pack_into("<I", header, 24, mip_count if mip_count > 1 else 0)
+    struct.pack_into("<II", header, 72, 32, DDPF_FOURCC)
+    header[80:84] = FORMAT_FOURCCS[fmt]
+    struct.pack_into("<I", header, 104, caps)
+    return DDS_MAGIC + bytes(header)
+
+
+def write_dds(path, blocks, width: int, height: int, fmt: str) -> None:
+    """
+    Writes row-major BC1/BC4 blocks as a DDS file that DDSFile reads back.
+    blocks is one array for a single level, or a list of arrays (largest
+    first) for a mip chain.
+    """
+    levels = list(blocks) if isinstance(blocks, (list, tuple)) else [blocks]
+    with open(path, "wb") as f:
+        f.write(dds_header(width, height, fmt, len(levels)))
+        for m, lvl in enumerate(levels):
+            lvl = np.ascontiguousarray(lvl, dtype=BLOCK_DTYPES[fmt])
+            w, h = max(1, width >> m), max(1, height >> m)
+            expected = ((w + 3) // 4) * ((h + 3) // 4)
+            if len(lvl) != expected:
+                raise ValueError(f"Expected {expected} blocks for mip {m} ({w}x{h}), got {len(lvl)}.")
+            f.write(lvl.tobytes())
@@ -0,0 +1,139 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.ktx import open_texture
+from src.extract_endpoints import rgb565_to_rgb888_array
+
+_BC1_SHIFTS = 2 * np.arange(16, dtype=np.uint32)
+_BC4_SHIFTS = 3 * np.arange(16, dtype=np.uint64)
+
+
+def _blocks_to_image(texels: np.ndarray, blocks_x: int, blocks_y: int, width: int, height: int) -> np.ndarray:
+    """(N, 16) texels in row-major block order -> (height, width) image."""
+    img = texels.reshape(blocks_y, blocks_x, 4, 4).transpose(0, 2, 1, 3)
+    return img.reshape(blocks_y * 4, blocks_x * 4)[:height, :width]
+
+
+def _gather(pal: np.ndarray, sel: np.ndarray) -> np.ndarray:
+    """pal[n, sel[n, i]] for every block n, via one flat gather."""
+    base = np.arange(len(pal), dtype=np.intp)[:, None] * pal.shape[1]
+    return pal.ravel()[base + sel]
+
+
+def bc1_palettes(c0: np.ndarray, c1: np.ndarray) -> np.ndarray:
+    """
+    Builds the 4-entry RGBA palette of every block, (N, 4, 4) uint8.
+    c0 > c1 selects the 4-color mode, otherwise 3 colors plus transparent black.
+    """
+    e0 = rgb565_to_rgb888_array(c0).astype(np.uint16)
+    e1 = rgb565_to_rgb888_array(c1).astype(np.uint16)
+    four = (np.asarray(c0) > np.asarray(c1))[:, None]
+
+    pal = np.empty((len(e0), 4, 4), dtype=np.uint8)
+    pal[:, 0, :3] = e0
+    pal[:, 1, :3] = e1
+    pal[:, 2, :3] = np.where(four, (2 * e0 + e1 + 1) // 3, (e0 + e1 + 1) // 2)
+    pal[:, 3, :3] = np.where(four, (e0 + 2 * e1 + 1) // 3, 0)
+    pal[:, :, 3] = 255
+    pal[:, 3, 3] = np.where(four[:, 0], 255, 0)
+    return pal
+
+
+def bc1_selectors(indices: np.ndarray) -> np.ndarray:
+    """Unpacks the 2-bit selectors of every block, (N, 16) uint8 in texel order."""
+    return ((np.asarray(indices, dtype=np.uint32)[:, None] >> _BC1_SHIFTS) & 3).astype(np.uint8)
+
+
+def _decode_bc1_packed(blocks: np.ndarray) -> np.ndarray:
+    # RGBA texels packed into one uint32 each so the gather and the
+    # block-to-image transpose move 4 bytes per element instead of 1.
+    pal = bc1_palettes(blocks["c0"], blocks["c1"]).view(np.uint32)[:, :, 0]
+    return _gather(pal, bc1_selectors(blocks["indices"]))
+
+
+def decode_bc1_blocks(blocks: np.ndarray) -> np.ndarray:
+    """Decodes a (N,) BC1 block array into (N, 16, 4) RGBA texels."""
+    return _decode_bc1_packed(blocks).view(np.uint8).reshape(-1, 16, 4)
+
+
+def bc4_palettes(a0: np.ndarray, a1: np.ndarray) -> np.ndarray:
+    """
+    Builds the 8-entry palette of every block, (N, 8) uint8.
+    a0 > a1 interpolates 6 values, otherwise 4 values plus 0 and 255.
+    """
+    a0 = np.asarray(a0, dtype=np.uint16)[:, None]
+    a1 = np.asarray(a1, dtype=np.uint16)[:, None]
+    w = np.arange(1, 7, dtype=np.uint16)
+    eight = ((7 - w) * a0 + w * a1 + 3) // 7
+    w = np.arange(1, 5, dtype=np.uint16)
+    six = ((5 - w) * a0 + w * a1 + 2) // 5
+
+    pal = np.empty((len(a0), 8), dtype=np.uint8)
+    pal[:, 0] = a0[:, 0]
+    pal[:, 1] = a1[:, 0]
+    mode8 = a0 > a1
+    pal[:, 2:6] = np.where(mode8, eight[:, :4], six)
+    pal[:, 6] = np.where(mode8[:, 0], eight[:, 4], 0)
+    pal[:, 7] = np.where(mode8[:, 0], eight[:, 5], 255)
+    return pal
+
+
+def bc4_selectors(indices: np.ndarray) -> np.ndarray:
+    """Unpacks the 3-bit selectors from (N, 6) index bytes, (N, 16) uint8 in texel order."""
+    b = np.asarray(indices, dtype=np.uint64)
+    bits = np.zeros(len(b), dtype=np.uint64)
+    for i in range(6):
+        bits |= b[:, i] << np.uint64(8 * i)
+    return ((bits[:, None] >> _BC4_SHIFTS) & np.uint64(7)).astype(np.uint8)
+
+
+def decode_bc4_blocks(blocks: np.ndarray) -> np.ndarray:
+    """Decodes a (N,) BC4 block array into (N, 16, 1) single-channel texels."""
+    pal = bc4_palettes(blocks["a0"], blocks["a1"])
+    return _gather(pal, bc4_selectors(blocks["indices"]))[:, :, None]
+
+
+def decode_bc1(blocks: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Decodes row-major BC1 blocks into a (height, width, 4) RGBA uint8 image."""
+    bx, by = (width + 3) // 4, (height + 3) // 4
+    img = _blocks_to_image(_decode_bc1_packed(blocks), bx, by, width, height)
+    return img.view(np.uint8).reshape(height, width, 4)
+
+
+def decode_bc4(blocks: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Decodes row-major BC4 blocks into a (height, width) uint8 image."""
+    bx, by = (width + 3) // 4, (height + 3) // 4
+    pal = bc4_palettes(blocks["a0"], blocks["a1"])
+    return _blocks_to_image(_gather(pal, bc4_selectors(blocks["indices"])), bx, by, width, height)
+
+
+def decode_dds(dds_path, mip: int = 0, array_index: int = 0) -> np.ndarray:
+    """
+    Decodes one level of a BC1 or BC4 DDS file into a (height, width, 4) RGBA
+    uint8 image. BC4 is expanded to grey (R=G=B) with opaque alpha.
+    """
+    with open_texture(dds_path) as dds:
+        lvl = dds.level(mip, array_index)
+        blocks = dds.level_blocks(mip, array_index)
+        if dds.format == "BC1":
+            return decode_bc1(blocks, lvl.width, lvl.height)
+
+        r = decode_bc4(blocks, lvl.width, lvl.height)
+        rgba = np.empty(r.shape + (4,), dtype=np.uint8)
+        rgba[:, :, :3] = r[:, :, None]
+        rgba[:, :, 3] = 255
+        return rgba
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        from PIL import Image
+
+        Image.fromarray(decode_dds(sys.argv[1])).save(sys.argv[2])
+        print(f"Decoded to: {sys.argv[2]}")
+    else:
+        print("Usage: python decode.py <path_to_dds_file> <output_image>")
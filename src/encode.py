@@ -0,0 +1,243 @@
+import sys
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.dds import BC1_BLOCK_DTYPE, BC4_BLOCK_DTYPE, write_dds
+from src.decode import bc1_palettes, bc4_palettes
+
+# Blocks are encoded in chunks so per-texel temporaries stay a few hundred MB at most.
+CHUNK_BLOCKS = 1 << 16
+
+# Selector -> weight of the first endpoint in the BC1 4-color palette.
+_BC1_WEIGHTS = np.array([1.0, 0.0, 2.0 / 3.0, 1.0 / 3.0])
+# Selector -> weight of the first endpoint in the BC4 8-value palette.
+_BC4_WEIGHTS = np.array([1.0, 0.0, 6.0 / 7.0, 5.0 / 7.0, 4.0 / 7.0, 3.0 / 7.0, 2.0 / 7.0, 1.0 / 7.0])
+
+
+def quality_settings(quality: float) -> Tuple[str, int]:
+    """
+    Maps the converter's 0.05-1.0 quality knob to (fit method, refinement passes):
+    below 0.25 a bounding-box fit, above it a PCA fit plus up to 4
+    least-squares refinement passes.
+    """
+    if not (0.05 <= quality <= 1.0):
+        raise ValueError("quality must be between 0.05 and 1.0")
+    if quality < 0.25:
+        return "bbox", 0
+    return "pca", int(round((quality - 0.25) / 0.75 * 4))
+
+
+def load_image(path) -> np.ndarray:
+    """Loads an image file as (H, W, 4) RGBA uint8. Needs Pillow."""
+    from PIL import Image
+
+    with Image.open(path) as im:
+        return np.asarray(im.convert("RGBA"))
+
+
+def image_to_blocks(img: np.ndarray) -> np.ndarray:
+    """
+    (H, W, C) image -> (N, 16, C) texels in row-major block order. Partial
+    edge blocks are padded by repeating the last row/column.
+    """
+    if img.ndim == 2:
+        img = img[:, :, None]
+    h, w, c = img.shape
+    ph, pw = (-h) % 4, (-w) % 4
+    if ph or pw:
+        img = np.pad(img, ((0, ph), (0, pw), (0, 0)), mode="edge")
+    by, bx = img.shape[0] // 4, img.shape[1] // 4
+    return img.reshape(by, 4, bx, 4, c).transpose(0, 2, 1, 3, 4).reshape(by * bx, 16, c)
+
+
+def _quantize_565(rgb: np.ndarray) -> np.ndarray:
+    """(N, 3) float RGB in 0-255 -> (N,) uint16 RGB565."""
+    q = np.rint(np.clip(rgb, 0, 255) * (np.array([31.0, 63.0, 31.0]) / 255.0)).astype(np.uint16)
+    return (q[:, 0] << 11) | (q[:, 1] << 5) | q[:, 2]
+
+
+def _principal_axis(px: np.ndarray, mean: np.ndarray) -> np.ndarray:
+    d = px - mean[:, None, :]
+    cov = np.einsum("nki,nkj->nij", d, d)
+    # Power iteration seeded with the bounding-box diagonal
+    axis = px.max(axis=1) - px.min(axis=1)
+    axis[np.all(axis == 0, axis=1)] = 1.0
+    for _ in range(4):
+        axis = np.einsum("nij,nj->ni", cov, axis)
+        norm = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.where(norm > 0, axis / np.where(norm > 0, norm, 1), 1.0 / np.sqrt(3.0))
+    return axis
+
+
+def bc1_select(px: np.ndarray, c0: np.ndarray, c1: np.ndarray):
+    """
+    Nearest-palette selectors and per-block squared error for (N, 16, 3)
+    RGB texels and fixed RGB565 endpoints: (N, 16) uint8 and (N,) int.
+    3-color blocks (c0 <= c1) never pick the transparent entry.
+    """
+    pal = bc1_palettes(c0, c1)[:, :, :3].astype(np.int32)
+    diff = px.astype(np.int32)[:, :, None, :] - pal[:, None, :, :]
+    dist = np.einsum("nkpc,nkpc->nkp", diff, diff)
+    # Equal endpoints use the 3-color mode; keep clear of its transparent entry
+    dist[c0 <= c1, :, 3] = np.iinfo(np.int32).max
+    sel = dist.argmin(axis=2)
+    err = np.take_along_axis(dist, sel[:, :, None], axis=2)[:, :, 0].sum(axis=1)
+    return sel.astype(np.uint8), err
+
+
+def _order_bc1(c0: np.ndarray, c1: np.ndarray):
+    # c0 > c1 selects the opaque 4-color mode
+    return np.maximum(c0, c1), np.minimum(c0, c1)
+
+
+def pack_selectors(sel: np.ndarray, bits: int, dtype) -> np.ndarray:
+    """Packs (N, 16) selectors of bits bits each into one dtype integer per block, texel 0 lowest."""
+    shifts = (bits * np.arange(16)).astype(dtype)
+    return np.bitwise_or.reduce(sel.astype(dtype) << shifts, axis=1)
+
+
+def _least_squares_endpoints(px: np.ndarray, w: np.ndarray):
+    """
+    Solves min sum |w*a + (1-w)*b - x|^2 for both endpoints of every block.
+    Returns (a, b, ok) where ok is False for singular (single-selector) blocks.
+    """
+    v = 1.0 - w
+    ww, vv, wv = (w * w).sum(1), (v * v).sum(1), (w * v).sum(1)
+    wx = np.einsum("nk,nkc->nc", w, px)
+    vx = np.einsum("nk,nkc->nc", v, px)
+    det = ww * vv - wv * wv
+    ok = np.abs(det) > 1e-9
+    det = np.where(ok, det, 1.0)[:, None]
+    a = (vv[:, None] * wx - wv[:, None] * vx) / det
+    b = (ww[:, None] * vx - wv[:, None] * wx) / det
+    return a, b, ok
+
+
+def _encode_bc1_chunk(px: np.ndarray, method: str, iterations: int) -> np.ndarray:
+    pxf = px.astype(np.float64)
+    if method == "bbox":
+        lo, hi = pxf.min(axis=1), pxf.max(axis=1)
+        # Pick the diagonal of the bounding box that follows the block's color trend
+        mean = pxf.mean(axis=1)
+        d = pxf - mean[:, None, :]
+        cov = np.einsum("nki,nkj->nij", d, d)
+        for i, j in ((0, 1), (0, 2)):
+            flip = cov[:, i, j] < 0
+            lo[flip, j], hi[flip, j] = hi[flip, j].copy(), lo[flip, j].copy()
+        e0, e1 = hi, lo
+    else:
+        mean = pxf.mean(axis=1)
+        axis = _principal_axis(pxf, mean)
+        t = np.einsum("nkc,nc->nk", pxf - mean[:, None, :], axis)
+        e0 = mean + t.max(axis=1)[:, None] * axis
+        e1 = mean + t.min(axis=1)[:, None] * axis
+
+    c0, c1 = _order_bc1(_quantize_565(e0), _quantize_565(e1))
+    sel, err = bc1_select(px, c0, c1)
+
+    for _ in range(iterations):
+        a, b, ok = _least_squares_endpoints(pxf, _BC1_WEIGHTS[sel])
+        n0, n1 = _order_bc1(_quantize_565(a), _quantize_565(b))
+        nsel, nerr = bc1_select(px, n0, n1)
+        better = ok & (nerr < err)
+        if not better.any():
+            break
+        c0, c1 = np.where(better, n0, c0), np.where(better, n1, c1)
+        sel, err = np.where(better[:, None], nsel, sel), np.where(better, nerr, err)
+
+    out = np.empty(len(px), dtype=BC1_BLOCK_DTYPE)
+    out["c0"], out["c1"] = c0, c1
+    out["indices"] = pack_selectors(sel, 2, np.uint32)
+    return out
+
+
+def encode_bc1_blocks(texels: np.ndarray, quality: float = 0.75) -> np.ndarray:
+    """Encodes (N, 16, >=3) uint8 texels into an (N,) BC1 block array (alpha ignored)."""
+    method, iterations = quality_settings(quality)
+    texels = np.asarray(texels)[:, :, :3]
+    out = np.empty(len(texels), dtype=BC1_BLOCK_DTYPE)
+    for start in range(0, len(texels), CHUNK_BLOCKS):
+        stop = start + CHUNK_BLOCKS
+        out[start:stop] = _encode_bc1_chunk(texels[start:stop], method, iterations)
+    return out
+
+
+def _bc4_select(v: np.ndarray, a0: np.ndarray, a1: np.ndarray):
+    pal = bc4_palettes(a0, a1).astype(np.int32)
+    diff = v.astype(np.int32)[:, :, None] - pal[:, None, :]
+    dist = diff * diff
+    sel = dist.argmin(axis=2)
+    err = np.take_along_axis(dist, sel[:, :, None], axis=2)[:, :, 0].sum(axis=1)
+    return sel.astype(np.uint8), err
+
+
+def _encode_bc4_chunk(v: np.ndarray, iterations: int) -> np.ndarray:
+    # a0 > a1 selects the 8-value mode; flat blocks fall back to a0 == a1
+    a0, a1 = v.max(axis=1).astype(np.uint8), v.min(axis=1).astype(np.uint8)
+    sel, err = _bc4_select(v, a0, a1)
+
+    vf = v.astype(np.float64)[:, :, None]
+    for _ in range(iterations):
+        mode8 = a0 > a1
+        a, b, ok = _least_squares_endpoints(vf, _BC4_WEIGHTS[sel])
+        n0 = np.rint(np.clip(a[:, 0], 0, 255)).astype(np.uint8)
+        n1 = np.rint(np.clip(b[:, 0], 0, 255)).astype(np.uint8)
+        n0, n1 = np.maximum(n0, n1), np.minimum(n0, n1)
+        nsel, nerr = _bc4_select(v, n0, n1)
+        better = ok & mode8 & (nerr < err)
+        if not better.any():
+            break
+        a0, a1 = np.where(better, n0, a0), np.where(better, n1, a1)
+        sel, err = np.where(better[:, None], nsel, sel), np.where(better, nerr, err)
+
+    packed = pack_selectors(sel, 3, np.uint64)
+    out = np.empty(len(v), dtype=BC4_BLOCK_DTYPE)
+    out["a0"], out["a1"] = a0, a1
+    out["indices"] = ((packed[:, None] >> (8 * np.arange(6, dtype=np.uint64))) & np.uint64(0xFF)).astype(np.uint8)
+    return out
+
+
+def encode_bc4_blocks(texels: np.ndarray, quality: float = 0.75) -> np.ndarray:
+    """Encodes (N, 16) or (N, 16, C) uint8 texels (first channel) into an (N,) BC4 block array."""
+    _, iterations = quality_settings(quality)
+    texels = np.asarray(texels)
+    if texels.ndim == 3:
+        texels = texels[:, :, 0]
+    out = np.empty(len(texels), dtype=BC4_BLOCK_DTYPE)
+    for start in range(0, len(texels), CHUNK_BLOCKS):
+        stop = start + CHUNK_BLOCKS
+        out[start:stop] = _encode_bc4_chunk(texels[start:stop], iterations)
+    return out
+
+
+def encode_image(img: np.ndarray, format: str = "BC1", quality: float = 0.75) -> np.ndarray:
+    """Encodes an (H, W, C) uint8 image into row-major BC1 or BC4 blocks."""
+    texels = image_to_blocks(img)
+    if format == "BC1":
+        return encode_bc1_blocks(texels, quality)
+    if format == "BC4":
+        return encode_bc4_blocks(texels, quality)
+    raise ValueError(f"Unsupported format for the NumPy encoder: {format}")
+
+
+def encode_file(input_image, output_image, format: str = "BC1", quality: float = 0.75) -> None:
+    """Encodes an image file into a single-level DDS file."""
+    if Path(output_image).suffix.lower() != ".dds":
+        raise ValueError("The NumPy encoder only writes .dds files.")
+    img = load_image(input_image)
+    h, w = img.shape[:2]
+    write_dds(output_image, encode_image(img, format, quality), w, h, format)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        fmt = sys.argv[3] if len(sys.argv) > 3 else "BC1"
+        quality = float(sys.argv[4]) if len(sys.argv) > 4 else 0.75
+        encode_file(sys.argv[1], sys.argv[2], fmt, quality)
+        print(f"Encoded to: {sys.argv[2]}")
+    else:
+        print("Usage: python encode.py <input_image> <output.dds> [BC1|BC4] [quality]")
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+_CHUNK = 1 << 20
+
+# Executable identity is hashed once per (path, size, mtime) per process.
+_exe_digests: Dict[Tuple[str, int, int], str] = {}
+_exe_lock = threading.Lock()
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def executable_identity(path: Path) -> str:
+    """Content hash of the CLI binary, or its path if it can't be read."""
+    path = Path(path)
+    try:
+        st = path.stat()
+    except OSError:
+        return f"missing:{path}"
+    key = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    with _exe_lock:
+        if key not in _exe_digests:
+            _exe_digests[key] = file_digest(path)
+        return _exe_digests[key]
+
+
+class EncodeCache:
+    """
+    Content-addressed on-disk cache of encoded textures.
+
+    Entries are keyed by a hash of the input image bytes, the encode
+    parameters and the Compressonator executable, so any change to one of
+    them is a miss. Hits are materialized by hardlink (or copy when linking
+    isn't possible) and bump the entry's mtime; once the cache grows beyond
+    max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, root, max_bytes: int = 10 * 1024**3, link: bool = True):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.link = link
+        self._lock = threading.Lock()
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+
+    def key(self, input_image: Path, output_suffix: str, params: Dict[str, object], cli_path: Path) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(file_digest(input_image).encode())
+        h.update(executable_identity(cli_path).encode())
+        h.update(output_suffix.lower().encode())
+        for name in sorted(params):
+            h.update(f"\0{name}={params[name]!r}".encode())
+        return h.hexdigest()
+
+    def _entry_path(self, key: str, suffix: str) -> Path:
+        return self.root / "objects" / key[:2] / f"{key}{suffix.lower()}"
+
+    def get(self, key: str, suffix: str, dest: Path) -> bool:
+        """Materializes a cached entry at dest. Returns False on a miss."""
+        entry = self._entry_path(key, suffix)
+        if not entry.exists():
+            return False
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self._materialize(entry, tmp)
+            os.replace(tmp, dest)
+            os.utime(entry)
+        except FileNotFoundError:
+            # Evicted between the exists() check and the link/copy
+            tmp.unlink(missing_ok=True)
+            return False
+        return True
+
+    def put(self, key: str, suffix: str, src: Path) -> None:
+        """Stores an encoded output under key and evicts old entries if needed."""
+        entry = self._entry_path(key, suffix)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f".{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def unshare(self, dest: Path) -> None:
+        """
+        Unlinks dest if it is a hard link (a materialized entry), so an encode
+        that overwrites it in place can't rewrite the cached entry too.
+        """
+        try:
+            if os.stat(dest).st_nlink > 1:
+                os.unlink(dest)
+        except FileNotFoundError:
+            pass
+
+    def _materialize(self, entry: Path, dest: Path) -> None:
+        if self.link:
+            try:
+                os.link(entry, dest)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(entry, dest)
+
+    def size(self) -> int:
+        return sum(p.stat().st_size for p in (self.root / "objects").glob("*/*") if not p.name.startswith("."))
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for p in (self.root / "objects").glob("*/*"):
+                if p.name.startswith("."):
+                    continue
+                try:
+                    st = p.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+
+            total = sum(size for _, size, _ in entries)
+            entries.sort(key=lambda e: e[0])
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.root / "objects", ignore_errors=True)
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+
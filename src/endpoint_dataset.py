@@ -0,0 +1,184 @@
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.ktx import open_texture
+from src.extract_endpoints import dataset_columns, level_endpoints, rgb565_to_q01_array, rgb565_to_rgb888_array
+
+
+class EndpointDataset:
+    """
+    Endpoints of one texture level held as a single packed (N, 2) array:
+    uint16 RGB565 pairs for BC1, uint8 pairs for BC4 (4 or 2 bytes per block).
+
+    Everything else is derived on access: rgb888, q01, c0_gt_c1, and st/bxby,
+    which only depend on the block index and blocks_x. Filtering returns a
+    view that shares the endpoint array and keeps an index array of the
+    selected blocks, so no per-block data is copied.
+    """
+
+    __slots__ = ("endpoints", "index", "blocks_x", "blocks_y", "width", "height", "format", "source", "level")
+
+    def __init__(
+        self,
+        endpoints: np.ndarray,
+        blocks_x: int,
+        blocks_y: int,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        format: str = "BC1",
+        index: Optional[np.ndarray] = None,
+        source: Optional[str] = None,
+        level: Optional[Tuple[int, int]] = None,
+    ):
+        self.endpoints = np.asarray(endpoints, dtype=np.uint16 if format == "BC1" else np.uint8).reshape(-1, 2)
+        self.index = index
+        self.blocks_x = int(blocks_x)
+        self.blocks_y = int(blocks_y)
+        self.width = int(width) if width is not None else self.blocks_x * 4
+        self.height = int(height) if height is not None else self.blocks_y * 4
+        self.format = format
+        self.source = source
+        # (mip, array_index) for levels of multi-level files, None otherwise
+        self.level = level
+
+    @classmethod
+    def from_dds(cls, dds_path, mip: int = 0, array_index: int = 0) -> "EndpointDataset":
+        """Reads one level of a BC1 or BC4 DDS file (only the endpoint pairs are kept)."""
+        dds_path = Path(dds_path).resolve()
+        with open_texture(dds_path) as dds:
+            lvl = dds.level(mip, array_index)
+            eps = level_endpoints(dds, mip, array_index)
+            level = (lvl.mip, lvl.array_index) if len(dds.levels) > 1 else None
+            return cls(eps, lvl.blocks_x, lvl.blocks_y, lvl.width, lvl.height, dds.format,
+                       source=str(dds_path), level=level)
+
+    @classmethod
+    def from_columns(cls, cols: Dict[str, Any]) -> "EndpointDataset":
+        """
+        Rebuilds a dataset from load_endpoints output (single texture). Rows
+        missing from a filtered file become holes in the endpoint array that
+        the returned view's index skips.
+        """
+        meta = cols.get("meta") or {}
+        fmt = "BC4" if "ep_a8" in cols else "BC1"
+        ep = np.asarray(cols["ep_a8" if fmt == "BC4" else "ep_rgb565"])
+        bxby = np.asarray(cols["bxby"], dtype=np.int64).reshape(-1, 2)
+        blocks_x = meta.get("blocks_x", int(bxby[:, 0].max()) + 1 if len(bxby) else 0)
+        blocks_y = meta.get("blocks_y", int(bxby[:, 1].max()) + 1 if len(bxby) else 0)
+        rows = bxby[:, 1] * blocks_x + bxby[:, 0]
+        full = np.zeros((blocks_x * blocks_y, 2), dtype=ep.dtype)
+        full[rows] = ep
+        index = None if len(rows) == len(full) and np.array_equal(rows, np.arange(len(full))) else rows
+        level = (meta["mip"], meta["array_index"]) if "mip" in meta else None
+        return cls(full, blocks_x, blocks_y, meta.get("width"), meta.get("height"), fmt,
+                   cls._pack_index(index, len(full)), meta.get("source_image"), level)
+
+    @staticmethod
+    def _pack_index(index: Optional[np.ndarray], n: int) -> Optional[np.ndarray]:
+        if index is None:
+            return None
+        return np.asarray(index, dtype=np.int32 if n < 2**31 else np.int64)
+
+    def __len__(self) -> int:
+        return len(self.endpoints) if self.index is None else len(self.index)
+
+    def __repr__(self) -> str:
+        return (f"EndpointDataset({self.format}, {self.width}x{self.height}, "
+                f"{len(self)}/{self.num_blocks} blocks, {self.nbytes} bytes)")
+
+    @property
+    def num_blocks(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def nbytes(self) -> int:
+        return self.endpoints.nbytes + (0 if self.index is None else self.index.nbytes)
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Block indices (row-major) of the rows in this view."""
+        return np.arange(len(self.endpoints), dtype=np.int64) if self.index is None else self.index
+
+    @property
+    def ep(self) -> np.ndarray:
+        """(n, 2) endpoint pairs of this view (RGB565 for BC1, 8-bit for BC4)."""
+        return self.endpoints if self.index is None else self.endpoints[self.index]
+
+    @property
+    def rgb888(self) -> np.ndarray:
+        """(n, 2, 3) uint8 expanded endpoint colors (BC1 only)."""
+        if self.format != "BC1":
+            raise ValueError("rgb888 is only defined for BC1 datasets")
+        return rgb565_to_rgb888_array(self.ep)
+
+    @property
+    def q01(self) -> np.ndarray:
+        """Endpoints scaled to 0-1: (n, 6) per-channel for BC1, (n, 2) for BC4."""
+        if self.format == "BC1":
+            return rgb565_to_q01_array(self.ep).reshape(-1, 6)
+        return self.ep / 255.0
+
+    @property
+    def c0_gt_c1(self) -> np.ndarray:
+        ep = self.ep
+        return (ep[:, 0] > ep[:, 1]).astype(np.uint8)
+
+    @property
+    def bxby(self) -> np.ndarray:
+        rows = self.rows.astype(np.int64, copy=False)
+        return np.stack([rows % self.blocks_x, rows // self.blocks_x], axis=1)
+
+    @property
+    def st(self) -> np.ndarray:
+        rows = self.rows.astype(np.int64, copy=False)
+        bx, by = rows % self.blocks_x, rows // self.blocks_x
+        s = bx / (self.blocks_x - 1) if self.blocks_x > 1 else np.zeros(len(rows))
+        t = by / (self.blocks_y - 1) if self.blocks_y > 1 else np.zeros(len(rows))
+        return np.stack([s, t], axis=1)
+
+    def filter(self, selector) -> "EndpointDataset":
+        """
+        View of the rows picked by a boolean mask or integer positions (relative
+        to this view). Shares the endpoint array; only an index array is made.
+        """
+        rows = self.rows[selector if isinstance(selector, slice) else np.asarray(selector)]
+        return EndpointDataset(
+            self.endpoints, self.blocks_x, self.blocks_y, self.width, self.height, self.format,
+            self._pack_index(rows, len(self.endpoints)), self.source, self.level,
+        )
+
+    __getitem__ = filter
+
+    def only_c0_gt_c1(self) -> "EndpointDataset":
+        """View of the blocks with c0 > c1 (4-color BC1 / 8-value BC4 mode)."""
+        ep = self.ep
+        return self.filter(ep[:, 0] > ep[:, 1])
+
+    def columns(self, names: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """Materializes dataset columns, identical to endpoints_to_dataset_arrays for the same rows."""
+        ep_name = "ep_rgb565" if self.format == "BC1" else "ep_a8"
+        getters = {"st": "st", "bxby": "bxby", ep_name: "ep", "ep_q01": "q01", "c0_gt_c1": "c0_gt_c1"}
+        return {k: getattr(self, getters[k]) for k in (names or dataset_columns(self.format))}
+
+    def meta(self, filtered_c0_gt_c1: bool = False) -> Dict[str, Any]:
+        """Meta block in the layout extract_endpoints_to_json writes."""
+        meta = {
+            "width": self.width,
+            "height": self.height,
+            "blocks_x": self.blocks_x,
+            "blocks_y": self.blocks_y,
+            "block_order": "row_major",
+            "format": self.format,
+            "num_blocks_total": self.num_blocks,
+            "num_blocks_kept": len(self),
+            "filtered_c0_gt_c1": bool(filtered_c0_gt_c1),
+            "source_image": self.source,
+        }
+        if self.level is not None:
+            meta["mip"], meta["array_index"] = self.level
+        return meta
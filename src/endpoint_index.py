@@ -0,0 +1,452 @@
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.extract_endpoints import OUTPUT_FORMATS, dataset_columns, load_endpoints, write_endpoint_chunks
+from src.timing import stage
+
+INDEX_NAME = "endpoint_index.npz"
+
+# Rows hashed per np.unique call when indexing a dataset; bounds the sort's working set.
+INDEX_CHUNK_ROWS = 1 << 22
+
+# Textures whose histograms are buffered before they are merged into the global counts.
+MERGE_EVERY = 64
+
+WRITE_MODES = ("dedup", "weighted")
+
+
+def pair_keys(ep: np.ndarray, format: str = "BC1") -> np.ndarray:
+    """(N, 2) endpoint pairs -> (N,) uint32 keys: c0 << 16 | c1 for BC1, a0 << 8 | a1 for BC4."""
+    ep = np.asarray(ep)
+    shift = 16 if format == "BC1" else 8
+    return (ep[:, 0].astype(np.uint32) << shift) | ep[:, 1].astype(np.uint32)
+
+
+def keys_to_pairs(keys: np.ndarray, format: str = "BC1") -> np.ndarray:
+    """Inverse of pair_keys: (N, 2) uint16 RGB565 pairs for BC1, uint8 for BC4."""
+    keys = np.asarray(keys, dtype=np.uint32)
+    if format == "BC1":
+        return np.stack([keys >> 16, keys & 0xFFFF], axis=1).astype(np.uint16)
+    return np.stack([keys >> 8, keys & 0xFF], axis=1).astype(np.uint8)
+
+
+def merge_counts(keys: List[np.ndarray], counts: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums several (sorted unique keys, counts) histograms into one with a
+    single sort and np.add.reduceat. Keys whose counts cancel to 0 are dropped.
+    """
+    if not keys:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    k = np.concatenate(keys)
+    c = np.concatenate([np.asarray(x, dtype=np.int64) for x in counts])
+    if len(k) == 0:
+        return k, c
+    order = np.argsort(k, kind="stable")
+    k, c = k[order], c[order]
+    starts = np.flatnonzero(np.concatenate([[True], k[1:] != k[:-1]]))
+    k, c = k[starts], np.add.reduceat(c, starts)
+    keep = c != 0
+    return k[keep], c[keep]
+
+
+def find_datasets(source: str) -> List[Path]:
+    """Resolves a dataset file, a folder (recursive) or a glob to the *_endpoints.json/.npz files it holds."""
+    path = Path(source)
+    if path.is_file():
+        return [path]
+
+    def is_dataset(p: Path) -> bool:
+        return p.is_file() and p.suffix in (".json", ".npz") and p.stem.endswith("endpoints")
+
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if is_dataset(p))
+    anchor = Path(path.anchor) if path.is_absolute() else Path(".")
+    pattern = str(path.relative_to(path.anchor)) if path.is_absolute() else source
+    return sorted(p for p in anchor.glob(pattern) if is_dataset(p))
+
+
+def _dataset_stat(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _iter_texture_histograms(cols: Dict[str, Any], format: str) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Yields (local texture id, keys, counts) for every texture of a dataset,
+    hashing INDEX_CHUNK_ROWS rows at a time. Merged datasets are split by
+    their texture_id column; anything else is a single texture 0.
+    """
+    ep = cols["ep_rgb565" if format == "BC1" else "ep_a8"]
+    tids = cols.get("texture_id")
+    partial_keys: List[np.ndarray] = []
+    partial_counts: List[np.ndarray] = []
+    for start in range(0, len(ep), INDEX_CHUNK_ROWS):
+        keys = pair_keys(ep[start : start + INDEX_CHUNK_ROWS], format).astype(np.uint64)
+        if tids is not None:
+            # texture id in the high 32 bits, so one unique call histograms every texture of the chunk
+            keys |= np.asarray(tids[start : start + INDEX_CHUNK_ROWS], dtype=np.uint64) << np.uint64(32)
+        k, c = np.unique(keys, return_counts=True)
+        partial_keys.append(k)
+        partial_counts.append(c)
+    keys, counts = merge_counts(partial_keys, partial_counts)
+
+    tex = (keys >> np.uint64(32)).astype(np.int64)
+    bounds = np.flatnonzero(np.concatenate([[True], tex[1:] != tex[:-1], [True]])) if len(keys) else [0]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        yield int(tex[lo]), (keys[lo:hi] & np.uint64(0xFFFFFFFF)).astype(np.uint32), counts[lo:hi].astype(np.uint32)
+
+
+class EndpointIndex:
+    """
+    Counts of distinct endpoint pairs over many extracted datasets.
+
+    Every (c0, c1) pair is hashed to a uint32 key (see pair_keys). The index
+    keeps the sorted distinct keys with their total counts, plus one sparse
+    histogram (keys, counts) per texture. New textures are buffered and
+    merged into the totals MERGE_EVERY at a time with a single sort, and a
+    saved index can be updated with only the datasets that are new or changed.
+    """
+
+    def __init__(self, format: Optional[str] = None):
+        self.format = format
+        self.sources: List[Dict[str, Any]] = []
+        self.tex_keys: List[np.ndarray] = []
+        self.tex_counts: List[np.ndarray] = []
+        self._keys = np.empty(0, dtype=np.uint32)
+        self._counts = np.empty(0, dtype=np.int64)
+        self._pending: List[int] = []  # texture numbers not yet merged into the totals
+
+    def _merge_pending(self) -> None:
+        if not self._pending:
+            return
+        keys, counts = merge_counts(
+            [self._keys.astype(np.uint64)] + [self.tex_keys[t].astype(np.uint64) for t in self._pending],
+            [self._counts] + [self.tex_counts[t] for t in self._pending],
+        )
+        self._keys, self._counts = keys.astype(np.uint32), counts
+        self._pending = []
+
+    @property
+    def keys(self) -> np.ndarray:
+        """Sorted distinct pair keys."""
+        self._merge_pending()
+        return self._keys
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Occurrences of each key over every indexed texture (int64, aligned with keys)."""
+        self._merge_pending()
+        return self._counts
+
+    @property
+    def num_blocks(self) -> int:
+        return int(self.counts.sum())
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def pairs(self) -> np.ndarray:
+        """The distinct endpoint pairs, aligned with keys."""
+        return keys_to_pairs(self.keys, self.format or "BC1")
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Total count of each given key (0 for keys not in the index)."""
+        keys = np.asarray(keys, dtype=np.uint32)
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, self.counts[pos], 0)
+
+    def textures_per_key(self) -> np.ndarray:
+        """In how many textures each key occurs."""
+        if not self.tex_keys:
+            return np.zeros(len(self.keys), dtype=np.int64)
+        return np.bincount(np.searchsorted(self.keys, np.concatenate(self.tex_keys)), minlength=len(self.keys))
+
+    def _add_texture(self, source: Dict[str, Any], keys: np.ndarray, counts: np.ndarray) -> None:
+        self.sources.append(source)
+        self.tex_keys.append(keys)
+        self.tex_counts.append(counts)
+        self._pending.append(len(self.sources) - 1)
+        if len(self._pending) >= MERGE_EVERY:
+            self._merge_pending()
+
+    def add_pairs(self, ep: np.ndarray, source: Optional[Dict[str, Any]] = None, format: str = "BC1") -> None:
+        """Indexes the (N, 2) endpoint pairs of one texture."""
+        self._check_format(format)
+        keys, counts = np.unique(pair_keys(ep, format), return_counts=True)
+        self._add_texture(source or {}, keys, counts.astype(np.uint32))
+
+    def _check_format(self, format: str) -> None:
+        if self.format is None:
+            self.format = format
+        elif self.format != format:
+            raise ValueError(f"Cannot index {format} endpoints into a {self.format} index")
+
+    def datasets(self) -> Dict[str, List[int]]:
+        """Dataset path -> numbers of the textures indexed from it."""
+        out: Dict[str, List[int]] = {}
+        for t, s in enumerate(self.sources):
+            if "dataset" in s:
+                out.setdefault(s["dataset"], []).append(t)
+        return out
+
+    def add_dataset(self, path) -> int:
+        """
+        Indexes every texture of an extracted dataset (single or merged, json
+        or npz). A dataset indexed before is skipped if unchanged and
+        re-indexed if it changed. Returns the number of textures added.
+        """
+        path = Path(path).resolve()
+        stat = _dataset_stat(path)
+        previous = self.datasets().get(str(path))
+        if previous is not None:
+            if self.sources[previous[0]]["dataset_stat"] == stat:
+                return 0
+            self.remove(previous)
+
+        with stage("index", "hash", file=path.name) as info:
+            cols = load_endpoints(path, mmap=path.suffix == ".npz")
+            meta = cols.get("meta") or {}
+            format = "BC4" if "ep_a8" in cols else "BC1"
+            self._check_format(format)
+            texture_meta = meta.get("sources") if meta.get("merged") else [meta]
+            added = 0
+            for tid, keys, counts in _iter_texture_histograms(cols, format):
+                source = dict(texture_meta[tid]) if tid < len(texture_meta) else {}
+                source.update({"dataset": str(path), "dataset_stat": stat, "texture_id": tid})
+                self._add_texture(source, keys, counts)
+                added += 1
+            info["blocks"] = len(cols["c0_gt_c1"])
+        return added
+
+    def remove(self, textures: Iterable[int]) -> None:
+        """Drops textures (by number) and subtracts their histograms from the totals."""
+        drop = set(textures)
+        self._merge_pending()
+        keys, counts = merge_counts(
+            [self._keys.astype(np.uint64)] + [self.tex_keys[t].astype(np.uint64) for t in drop],
+            [self._counts] + [-self.tex_counts[t].astype(np.int64) for t in drop],
+        )
+        self._keys, self._counts = keys.astype(np.uint32), counts
+        keep = [t for t in range(len(self.sources)) if t not in drop]
+        self.sources = [self.sources[t] for t in keep]
+        self.tex_keys = [self.tex_keys[t] for t in keep]
+        self.tex_counts = [self.tex_counts[t] for t in keep]
+
+    def prune(self) -> List[str]:
+        """Removes the textures of datasets that no longer exist; returns those dataset paths."""
+        gone = [d for d in self.datasets() if not Path(d).exists()]
+        self.remove(t for d in gone for t in self.datasets()[d])
+        return gone
+
+    def update(self, other: "EndpointIndex") -> None:
+        """Merges another index (e.g. one built in a worker) into this one."""
+        if other.format is not None:
+            self._check_format(other.format)
+        for source, keys, counts in zip(other.sources, other.tex_keys, other.tex_counts):
+            self._add_texture(source, keys, counts)
+
+    def save(self, path) -> None:
+        """Writes the index as an uncompressed .npz (totals plus per-texture histograms in CSR layout)."""
+        lengths = np.array([len(k) for k in self.tex_keys], dtype=np.int64)
+        arrays = {
+            "keys": self.keys,
+            "counts": self.counts,
+            "tex_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            "tex_keys": np.concatenate(self.tex_keys) if self.tex_keys else np.empty(0, dtype=np.uint32),
+            "tex_counts": np.concatenate(self.tex_counts) if self.tex_counts else np.empty(0, dtype=np.uint32),
+            "meta": np.array(json.dumps({"format": self.format, "sources": self.sources})),
+        }
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path) -> "EndpointIndex":
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            index = cls(meta["format"])
+            index.sources = meta["sources"]
+            offsets = z["tex_offsets"]
+            tex_keys, tex_counts = z["tex_keys"], z["tex_counts"]
+            index.tex_keys = [tex_keys[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+            index.tex_counts = [tex_counts[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+            index._keys, index._counts = z["keys"], z["counts"]
+        return index
+
+    def texture_stats(self) -> List[Dict[str, Any]]:
+        """Per texture: blocks, distinct pairs and the share of its blocks taken by its most common pair."""
+        stats = []
+        for source, keys, counts in zip(self.sources, self.tex_keys, self.tex_counts):
+            blocks = int(counts.sum())
+            stats.append({
+                "source": source.get("source_image") or source.get("dataset"),
+                "blocks": blocks,
+                "unique": len(keys),
+                "top_share": float(counts.max()) / blocks if blocks else 0.0,
+            })
+        return stats
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """Totals, the top most frequent pairs and how many pairs occur in more than one texture."""
+        keys, counts = self.keys, self.counts
+        blocks = int(counts.sum())
+        per_key = self.textures_per_key()
+        order = np.argsort(counts, kind="stable")[::-1][:top]
+        pairs = keys_to_pairs(keys[order], self.format or "BC1")
+        return {
+            "format": self.format,
+            "num_textures": len(self.sources),
+            "num_blocks": blocks,
+            "num_unique": len(keys),
+            "duplicate_fraction": 1.0 - len(keys) / blocks if blocks else 0.0,
+            "shared_pairs": int(np.count_nonzero(per_key > 1)),
+            "blocks_in_shared_pairs": int(counts[per_key > 1].sum()),
+            "top": [
+                {"pair": pairs[i].tolist(), "count": int(counts[j]), "share": float(counts[j]) / blocks,
+                 "textures": int(per_key[j])}
+                for i, j in enumerate(order)
+            ],
+        }
+
+    def format_summary(self, top: int = 10) -> str:
+        s = self.summary(top)
+        lines = [
+            f"{s['num_textures']} textures, {s['num_blocks']} blocks, {s['num_unique']} distinct {s['format']} pairs "
+            f"({s['duplicate_fraction']:.1%} of blocks are duplicates)",
+            f"{s['shared_pairs']} pairs occur in more than one texture, covering {s['blocks_in_shared_pairs']} blocks",
+            f"{'pair':>16} {'count':>12} {'share':>8} {'textures':>9}",
+        ]
+        for row in s["top"]:
+            lines.append(f"{str(tuple(row['pair'])):>16} {row['count']:>12} {row['share']:>8.2%} {row['textures']:>9}")
+        return "\n".join(lines)
+
+    def write_dataset(self, out_path, mode: str = "dedup", output_format: str = "npz") -> int:
+        """
+        Re-reads the indexed datasets and writes them as one merged dataset:
+        "dedup" keeps the first row of every distinct pair (in index order)
+        and adds a count column with the pair's occurrences over the whole
+        index; "weighted" keeps every row and adds weight = 1 / occurrences,
+        so each distinct pair carries the same total weight. texture_id
+        indexes meta["sources"]. Returns the number of rows written.
+        """
+        if mode not in WRITE_MODES:
+            raise ValueError(f"mode must be one of {WRITE_MODES}, got {mode!r}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+        format = self.format or "BC1"
+        ep_name = "ep_rgb565" if format == "BC1" else "ep_a8"
+        datasets = self.datasets()
+        for d, textures in datasets.items():
+            if _dataset_stat(Path(d)) != self.sources[textures[0]]["dataset_stat"]:
+                raise ValueError(f"{d} changed since it was indexed; update the index first")
+
+        # Rows to keep from each dataset, chosen once and reused for every column
+        selections: List[Tuple[str, Optional[np.ndarray], np.ndarray]] = []
+        seen = np.zeros(len(self.keys), dtype=bool)
+        for d, textures in datasets.items():
+            # Dataset-local texture_id -> texture number in this index
+            local = [self.sources[t]["texture_id"] for t in textures]
+            lut = np.zeros(max(local) + 1, dtype=np.uint32)
+            lut[local] = textures
+            rows = None
+            if mode == "dedup":
+                cols = load_endpoints(d, mmap=d.endswith(".npz"))
+                pos = np.searchsorted(self.keys, pair_keys(cols[ep_name], format))
+                first_pos, first_row = np.unique(pos, return_index=True)
+                new = ~seen[first_pos]
+                seen[first_pos[new]] = True
+                rows = np.sort(first_row[new])
+            selections.append((d, rows, lut))
+
+        extra = "count" if mode == "dedup" else "weight"
+        names = list(dataset_columns(format)) + ["texture_id", extra]
+
+        def chunks(columns):
+            for d, rows, lut in selections:
+                cols = load_endpoints(d, mmap=d.endswith(".npz"))
+                n = len(cols["c0_gt_c1"])
+                take = (lambda a: a[rows]) if rows is not None else (lambda a: a)
+                out = {}
+                for k in columns:
+                    if k == "texture_id":
+                        tid = cols["texture_id"] if "texture_id" in cols else np.zeros(n, dtype=np.uint32)
+                        out[k] = lut[take(np.asarray(tid, dtype=np.int64))]
+                    elif k in ("count", "weight"):
+                        occurrences = self.lookup(pair_keys(take(cols[ep_name]), format))
+                        out[k] = occurrences if k == "count" else 1.0 / occurrences
+                    else:
+                        out[k] = take(cols[k])
+                yield out
+
+        if mode == "dedup":
+            num_rows = int(seen.sum())
+        else:
+            num_rows = sum(int(self.tex_counts[t].sum()) for textures in datasets.values() for t in textures)
+        sources = [{k: v for k, v in s.items() if k not in ("dataset_stat", "texture_id")} for s in self.sources]
+        meta = {
+            "merged": True,
+            "deduplicated": mode,
+            "num_textures": len(self.sources),
+            "num_blocks_indexed": self.num_blocks,
+            "num_blocks_kept": num_rows,
+            "sources": sources,
+        }
+        with stage("index", "write", blocks=num_rows, format=output_format):
+            write_endpoint_chunks(Path(out_path), names, chunks, num_rows, meta, format, output_format)
+        return num_rows
+
+
+def build_index(source: str, index_path, prune: bool = True) -> Tuple[EndpointIndex, Dict[str, Any]]:
+    """
+    Loads index_path if it exists and brings it up to date with the datasets
+    matched by source: new and changed datasets are (re)indexed, unchanged
+    ones skipped and, with prune, datasets that were deleted are dropped.
+    Saves the index and returns it with {"added", "skipped", "removed"}.
+    """
+    index_path = Path(index_path)
+    index = EndpointIndex.load(index_path) if index_path.exists() else EndpointIndex()
+    report: Dict[str, Any] = {"added": [], "skipped": 0, "removed": index.prune() if prune else []}
+    for path in find_datasets(source):
+        if path.resolve() == index_path.resolve():
+            continue
+        if index.add_dataset(path):
+            report["added"].append(str(path))
+        else:
+            report["skipped"] += 1
+    index.save(index_path)
+    return index, report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index endpoint pairs across extracted datasets (counts, duplicates).")
+    parser.add_argument("source", help="dataset file, folder of *_endpoints.json/.npz (recursive) or glob")
+    parser.add_argument("-i", "--index", help=f"index file to create or update (default: <source folder>/{INDEX_NAME})")
+    parser.add_argument("--top", type=int, default=10, help="most frequent pairs to list")
+    parser.add_argument("--dedup", metavar="OUT", help="write a deduplicated dataset (one row per distinct pair)")
+    parser.add_argument("--weighted", metavar="OUT", help="write every row with a 1/frequency weight column")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="npz", help="format of --dedup/--weighted output")
+    args = parser.parse_args()
+
+    src = Path(args.source)
+    index_path = Path(args.index) if args.index else (src if src.is_dir() else src.parent) / INDEX_NAME
+    index, report = build_index(args.source, index_path)
+    print(f"Index {index_path}: {len(report['added'])} datasets indexed, {report['skipped']} unchanged, "
+          f"{len(report['removed'])} removed")
+    print(index.format_summary(args.top))
+
+    for mode, out in (("dedup", args.dedup), ("weighted", args.weighted)):
+        if out:
+            rows = index.write_dataset(out, mode, args.format)
+            print(f"Wrote {rows} rows ({mode}) to: {out}")
@@ -1,10 +1,21 @@
 import json
+import os
 import struct
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-DXGI_FORMAT_BC1_UNORM = 71
-DXGI_FORMAT_BC1_UNORM_SRGB = 72
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.dds import BlockTexture, DDSLevel
+from src.ktx import TEXTURE_SUFFIXES, open_texture
+from src.timing import StageRecorder, file_size, get_recorder, recording, set_recorder, stage, timed_iter
 
 
 def rgb565_to_rgb888(c: int) -> Tuple[int, int, int]:
@@ -24,64 +35,577 @@ def rgb565_to_q01(c: int) -> List[float]:
     return [r5 / 31.0, g6 / 63.0, b5 / 31.0]
 
 
+def _rgb565_channels(c: np.ndarray) -> np.ndarray:
+    c = np.asarray(c, dtype=np.uint32)
+    return np.stack([(c >> 11) & 0x1F, (c >> 5) & 0x3F, c & 0x1F], axis=-1)
+
+
+# Lookup tables over all 65536 RGB565 values; indexing them is much cheaper
+# than redoing the shift/scale arithmetic per endpoint.
+_ALL_565 = np.arange(1 << 16, dtype=np.uint32)
+_RGB888_LUT = ((_rgb565_channels(_ALL_565) * 255 + [15, 31, 15]) // [31, 63, 31]).astype(np.uint8)
+_Q01_LUT = _rgb565_channels(_ALL_565) / np.array([31.0, 63.0, 31.0])
+
+
+def rgb565_to_rgb888_array(c: np.ndarray) -> np.ndarray:
+    """Vectorized rgb565_to_rgb888: (...) uint16 -> (..., 3) uint8."""
+    return _RGB888_LUT[np.asarray(c, dtype=np.uint16)]
+
+
+def rgb565_to_q01_array(c: np.ndarray) -> np.ndarray:
+    """Vectorized rgb565_to_q01: (...) uint16 -> (..., 3) float64."""
+    return _Q01_LUT[np.asarray(c, dtype=np.uint16)]
+
+
+def parse_dds_bc1_blocks(dds_path: Path) -> Dict[str, Any]:
+    """
+    Parses a BC1 DDS file into a structured block array (c0, c1, indices)
+    without any per-block Python work. Use DDSFile directly to work on a
+    region of the file without loading all of it.
+    """
+    name = Path(dds_path).name
+    with stage("parse", "header_parse", file=name):
+        dds = open_texture(dds_path)
+    with dds:
+        if dds.format != "BC1":
+            raise ValueError(f"DDS format is not BC1 ({dds.format}).")
+        with stage("parse", "read", file=name, blocks=dds.num_blocks, bytes_in=dds.num_blocks * 8):
+            blocks = np.array(dds.blocks)
+
+    return {
+        "width": int(dds.width),
+        "height": int(dds.height),
+        "blocks_x": int(dds.blocks_x),
+        "blocks_y": int(dds.blocks_y),
+        "block_order": "row_major",
+        "format": dds.format,
+        "blocks": blocks,
+    }
+
+
+def parse_dds_bc1_arrays(dds_path: Path) -> Dict[str, Any]:
+    """
+    Array form of parse_dds_bc1_endpoints: endpoints_rgb565 is (N, 2) uint16
+    and endpoints_rgb888 is (N, 2, 3) uint8.
+    """
+    d = parse_dds_bc1_blocks(dds_path)
+    blocks = d.pop("blocks")
+    with stage("parse", "decode", file=Path(dds_path).name, blocks=len(blocks)):
+        eps = np.empty((len(blocks), 2), dtype=np.uint16)
+        eps[:, 0] = blocks["c0"]
+        eps[:, 1] = blocks["c1"]
+        d["endpoints_rgb565"] = eps
+        d["endpoints_rgb888"] = rgb565_to_rgb888_array(eps)
+    return d
+
+
 def parse_dds_bc1_endpoints(dds_path: Path) -> Dict[str, Any]:
-    data = dds_path.read_bytes()
-    if len(data) < 128 or data[0:4] != b"DDS ":
-        raise ValueError("Not a valid DDS file (missing DDS magic).")
-
-    header = data[4 : 4 + 124]
-    if struct.unpack_from("<I", header, 0)[0] != 124:
-        raise ValueError("Unexpected DDS header size.")
-
-    height = struct.unpack_from("<I", header, 8)[0]
-    width = struct.unpack_from("<I", header, 12)[0]
-
-    ddspf_off = 72
-    fourcc = header[ddspf_off + 8 : ddspf_off + 12]
-
-    offset = 4 + 124
-    if fourcc == b"DXT1":
-        pass
-    elif fourcc == b"DX10":
-        dx10 = data[offset : offset + 20]
-        dxgi_format = struct.unpack_from("<I", dx10, 0)[0]
-        if dxgi_format not in (DXGI_FORMAT_BC1_UNORM, DXGI_FORMAT_BC1_UNORM_SRGB):
-            raise ValueError(f"DDS DX10 format is not BC1 (dxgiFormat={dxgi_format}).")
-        offset += 20
+    # Compatibility view of parse_dds_bc1_arrays with nested lists.
+    d = parse_dds_bc1_arrays(dds_path)
+    with stage("parse", "to_list", file=Path(dds_path).name, blocks=len(d["endpoints_rgb565"])):
+        d["endpoints_rgb565"] = d["endpoints_rgb565"].tolist()
+        d["endpoints_rgb888"] = d["endpoints_rgb888"].tolist()
+    return d
+
+
+def level_endpoints(dds: BlockTexture, mip: int = 0, array_index: int = 0) -> np.ndarray:
+    """(N, 2) endpoint pairs of one level: uint16 RGB565 for BC1, uint8 for BC4."""
+    blocks = dds.level_blocks(mip, array_index)
+    e0, e1 = ("c0", "c1") if dds.format == "BC1" else ("a0", "a1")
+    eps = np.empty((len(blocks), 2), dtype=blocks.dtype[e0])
+    eps[:, 0] = blocks[e0]
+    eps[:, 1] = blocks[e1]
+    return eps
+
+
+def parse_dds_endpoint_levels(dds_path: Path) -> List[Dict[str, Any]]:
+    """
+    Endpoints of every mip level of every array slice, in file order. BC1
+    levels carry (N, 2) uint16 RGB565 pairs, BC4 levels (N, 2) uint8 pairs.
+    """
+    with open_texture(dds_path) as dds:
+        return [
+            {
+                "array_index": lvl.array_index,
+                "mip": lvl.mip,
+                "width": lvl.width,
+                "height": lvl.height,
+                "blocks_x": lvl.blocks_x,
+                "blocks_y": lvl.blocks_y,
+                "block_order": "row_major",
+                "format": dds.format,
+                "endpoints": level_endpoints(dds, lvl.mip, lvl.array_index),
+            }
+            for lvl in dds.levels
+        ]
+
+
+def endpoints_to_dataset_arrays(
+    eps: np.ndarray,
+    blocks_x: int,
+    blocks_y: int,
+    keep_only_c0_gt_c1: bool = False,
+    format: str = "BC1",
+    start: int = 0,
+    columns: Optional[Iterable[str]] = None,
+    index: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Builds the dataset columns (st, bxby, ep_rgb565, ep_q01, c0_gt_c1) from a
+    (N, 2) uint16 endpoint array in row-major block order. For BC4 the
+    endpoints are (N, 2) uint8 and land in ep_a8, with ep_q01 = a / 255.
+    start is the block index of eps[0] when converting one chunk of a level;
+    columns limits the output to those columns. index gives the block index
+    of every row instead, for a sparse selection of blocks.
+    """
+    eps = np.asarray(eps, dtype=np.uint16 if format == "BC1" else np.uint8)
+    if index is None:
+        idx = np.arange(start, start + len(eps), dtype=np.int64)
     else:
-        raise ValueError(f"Unsupported DDS FourCC for BC1 extraction: {fourcc!r}")
-
-    blocks_x = (width + 3) // 4
-    blocks_y = (height + 3) // 4
-    num_blocks = blocks_x * blocks_y
-
-    needed = offset + num_blocks * 8
-    if len(data) < needed:
-        raise ValueError("DDS truncated: not enough BC1 blocks.")
-
-    endpoints_rgb565: List[List[int]] = []
-    endpoints_rgb888: List[List[List[int]]] = []
-
-    p = offset
-    for _ in range(num_blocks):
-        c0 = int.from_bytes(data[p : p + 2], "little")
-        c1 = int.from_bytes(data[p + 2 : p + 4], "little")
-        endpoints_rgb565.append([c0, c1])
-        endpoints_rgb888.append(
-            [list(rgb565_to_rgb888(c0)), list(rgb565_to_rgb888(c1))]
-        )
-        p += 8
+        idx = np.asarray(index, dtype=np.int64)
+    flag = (eps[:, 0] > eps[:, 1]).astype(np.uint8)
+    if keep_only_c0_gt_c1:
+        keep = np.flatnonzero(flag)
+        idx, eps, flag = idx[keep], eps[keep], flag[keep]
+    want = set(dataset_columns(format) if columns is None else columns)
+
+    cols = {}
+    bx = idx % blocks_x
+    by = idx // blocks_x
+    if "st" in want:
+        s = bx / (blocks_x - 1) if blocks_x > 1 else np.zeros(len(idx))
+        t = by / (blocks_y - 1) if blocks_y > 1 else np.zeros(len(idx))
+        cols["st"] = np.stack([s, t], axis=1)
+    if "bxby" in want:
+        cols["bxby"] = np.stack([bx, by], axis=1)
+    if format == "BC1":
+        if "ep_rgb565" in want:
+            cols["ep_rgb565"] = eps
+        if "ep_q01" in want:
+            cols["ep_q01"] = rgb565_to_q01_array(eps).reshape(-1, 6)
+    else:
+        if "ep_a8" in want:
+            cols["ep_a8"] = eps
+        if "ep_q01" in want:
+            cols["ep_q01"] = eps / 255.0
+    if "c0_gt_c1" in want:
+        cols["c0_gt_c1"] = flag
+    return cols
+
+
+# Column dtypes used by the binary (npz) dataset format (BC1 datasets).
+DATASET_DTYPES = {
+    "st": np.float32,
+    "bxby": np.uint16,
+    "ep_rgb565": np.uint16,
+    "ep_q01": np.float32,
+    "c0_gt_c1": np.uint8,
+}
+
+# Dtypes of every column any dataset may carry.
+COLUMN_DTYPES = {
+    **DATASET_DTYPES,
+    "ep_a8": np.uint8,
+    "texture_id": np.uint32,
+    # Written by the endpoint index (src/endpoint_index.py) for deduplicated / weighted datasets
+    "count": np.int64,
+    "weight": np.float32,
+}
+
+# Per-row shape of each column.
+DATASET_ROW_SHAPES = {
+    "st": (2,),
+    "bxby": (2,),
+    "ep_rgb565": (2,),
+    "ep_a8": (2,),
+    "ep_q01": (6,),
+    "c0_gt_c1": (),
+    "texture_id": (),
+    "count": (),
+    "weight": (),
+}
+
+# Which JSON group each column is written under.
+_JSON_GROUPS = {
+    "st": "inputs",
+    "bxby": "inputs",
+    "texture_id": "inputs",
+    "ep_rgb565": "targets",
+    "ep_a8": "targets",
+    "ep_q01": "targets",
+    "c0_gt_c1": "flags",
+    "count": "flags",
+    "weight": "flags",
+}
+
+OUTPUT_FORMATS = ("json", "npz")
+
+# Blocks converted per chunk by the streaming writers; bounds their working set
+# to a few MB regardless of texture size.
+STREAM_CHUNK_BLOCKS = 1 << 16
+
+
+def dataset_columns(format: str = "BC1") -> Tuple[str, ...]:
+    """Column names of a single-texture dataset, in output order."""
+    ep = "ep_rgb565" if format == "BC1" else "ep_a8"
+    return ("st", "bxby", ep, "ep_q01", "c0_gt_c1")
+
+
+def column_row_shape(name: str, format: str = "BC1") -> Tuple[int, ...]:
+    # BC4 ep_q01 holds one value per endpoint instead of three
+    return (2,) if name == "ep_q01" and format == "BC4" else DATASET_ROW_SHAPES[name]
+
+
+def write_endpoints_npz(out_path: Path, cols: Dict[str, np.ndarray], meta: Dict[str, Any] = None) -> None:
+    """
+    Writes dataset columns as typed arrays into an uncompressed .npz archive.
+    Metadata, if any, is stored as a JSON string under the "meta" key.
+    """
+    arrays = {k: np.ascontiguousarray(v, dtype=COLUMN_DTYPES[k]) for k, v in cols.items()}
+    if meta is not None:
+        arrays["meta"] = np.array(json.dumps(meta))
+    with open(out_path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def _mmap_npz(path: Path) -> Dict[str, Any]:
+    # Every column member is stored uncompressed, so its array data is a
+    # contiguous byte range of the archive that can be mapped in place.
+    out: Dict[str, Any] = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[: -len(".npy")]
+            if name == "meta":
+                with zf.open(info) as m:
+                    out["meta"] = json.loads(str(np.lib.format.read_array(m, allow_pickle=False)))
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed and cannot be memory-mapped")
+            # Local file header: 30 fixed bytes, then the name and extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if 0 in shape:
+                out[name] = np.empty(shape, dtype=dtype)  # mmap can't map zero bytes
+                continue
+            out[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                  order="F" if fortran else "C")
+    out.setdefault("meta", None)
+    return out
+
+
+def load_endpoints(path: str, mmap: bool = False) -> Dict[str, Any]:
+    """
+    Loads an endpoint dataset written by extract_endpoints_to_json in either
+    format. Returns the flat columns as NumPy arrays plus "meta" (or None).
+    With mmap=True the columns of an npz dataset are read-only memory maps
+    into the archive instead of in-memory copies.
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        if mmap:
+            return _mmap_npz(path)
+        with np.load(path, allow_pickle=False) as z:
+            out: Dict[str, Any] = {k: z[k] for k in z.files if k != "meta"}
+            out["meta"] = json.loads(str(z["meta"])) if "meta" in z.files else None
+        return out
+
+    d = json.loads(path.read_text())
+    flat = {**d["inputs"], **d["targets"], **d["flags"]}
+    fmt = "BC4" if "ep_a8" in flat else "BC1"
+    out = {}
+    for k, v in flat.items():
+        out[k] = np.asarray(v, dtype=COLUMN_DTYPES[k]).reshape((len(v),) + column_row_shape(k, fmt))
+    out["meta"] = d.get("meta")
+    return out
+
+
+def extract_endpoints_arrays(
+    dds_path: Path,
+    include_meta: bool = True,
+    keep_only_c0_gt_c1: bool = False,
+    mip: int = 0,
+    array_index: int = 0,
+    dds: Optional[BlockTexture] = None,
+) -> Tuple[Dict[str, np.ndarray], Optional[Dict[str, Any]]]:
+    """
+    Parses one level (top mip of the first slice by default) of a BC1 or BC4
+    DDS, KTX or KTX2 file into dataset columns and (optionally) its meta
+    block. Pass an open DDSFile/KTXFile to avoid re-reading the header for
+    every level.
+    """
+    dds_path = Path(dds_path).resolve()
 
-    return {
-        "width": int(width),
-        "height": int(height),
-        "blocks_x": int(blocks_x),
-        "blocks_y": int(blocks_y),
+    # 1. Parse DDS
+    own = dds is None
+    if own:
+        dds = open_texture(dds_path)
+    try:
+        lvl = dds.level(mip, array_index)
+        eps = level_endpoints(dds, mip, array_index)
+        fmt = dds.format
+        multi_level = len(dds.levels) > 1
+    finally:
+        if own:
+            dds.close()
+
+    # 2. Convert to Dataset Format (Logic from convert_reference_to_dataset)
+    cols = endpoints_to_dataset_arrays(eps, int(lvl.blocks_x), int(lvl.blocks_y), keep_only_c0_gt_c1, fmt)
+
+    meta = None
+    if include_meta:
+        meta = _level_meta(dds_path, fmt, lvl, len(cols["c0_gt_c1"]), keep_only_c0_gt_c1, multi_level)
+    return cols, meta
+
+
+def _level_meta(
+    dds_path: Path, fmt: str, lvl: DDSLevel, num_kept: int, keep_only_c0_gt_c1: bool, multi_level: bool
+) -> Dict[str, Any]:
+    meta = {
+        "width": int(lvl.width),
+        "height": int(lvl.height),
+        "blocks_x": int(lvl.blocks_x),
+        "blocks_y": int(lvl.blocks_y),
         "block_order": "row_major",
-        "format": "BC1",
-        "endpoints_rgb565": endpoints_rgb565,
-        "endpoints_rgb888": endpoints_rgb888,
+        "format": fmt,
+        "num_blocks_total": int(lvl.num_blocks),
+        "num_blocks_kept": int(num_kept),
+        "filtered_c0_gt_c1": bool(keep_only_c0_gt_c1),
+        "source_image": str(dds_path),
     }
+    if multi_level:
+        meta["mip"] = int(lvl.mip)
+        meta["array_index"] = int(lvl.array_index)
+    return meta
+
+
+def write_endpoints(
+    out_path: Path,
+    cols: Dict[str, np.ndarray],
+    meta: Optional[Dict[str, Any]] = None,
+    output_format: str = "json",
+) -> None:
+    """Writes dataset columns in the JSON layout or as an npz archive."""
+    if output_format == "npz":
+        write_endpoints_npz(out_path, cols, meta)
+        return
+
+    _write_json(out_path, list(cols), lambda columns: iter([{k: cols[k] for k in columns}]), meta)
+
+
+def _json_items(values: np.ndarray, indent: int) -> str:
+    """
+    The items of a 1-D or (N, k) column laid out exactly as json.dumps(...,
+    indent=2) nests them `indent` spaces deep, without the brackets. Goes
+    through the C encoder plus string splicing; the pure-Python indenting
+    encoder is an order of magnitude slower. Numbers never contain "[" or ", ".
+    """
+    text = json.dumps(values.tolist())[1:-1]
+    pad = "\n" + " " * indent
+    if values.ndim == 1:
+        return pad[1:] + text.replace(", ", "," + pad)
+    inner = pad + "  "
+    body = text[1:-1].replace("], [", "\0").replace(", ", "," + inner).replace("\0", pad + "]," + pad + "[" + inner)
+    return pad[1:] + "[" + inner + body + pad + "]"
+
+
+def _write_json(
+    out_path: Path,
+    names: List[str],
+    chunks: Callable[[Tuple[str, ...]], Iterator[Dict[str, np.ndarray]]],
+    meta: Optional[Dict[str, Any]] = None,
+) -> None:
+    # Same bytes as json.dumps(out, indent=2), written one column chunk at a time
+    with open(out_path, "w") as f:
+        f.write("{")
+        for g, group in enumerate(("inputs", "targets", "flags")):
+            f.write(("," if g else "") + f'\n  "{group}": ')
+            members = [k for k in names if _JSON_GROUPS[k] == group]
+            if not members:
+                f.write("{}")
+                continue
+            f.write("{")
+            for i, k in enumerate(members):
+                f.write(("," if i else "") + f'\n    "{k}": [')
+                wrote = False
+                for chunk in chunks((k,)):
+                    if len(chunk[k]):
+                        f.write((",\n" if wrote else "\n") + _json_items(chunk[k], 6))
+                        wrote = True
+                f.write("\n    ]" if wrote else "]")
+            f.write("\n  }")
+        if meta is not None:
+            f.write(',\n  "meta": ' + json.dumps(meta, indent=2).replace("\n", "\n  "))
+        f.write("\n}")
+
+
+def _write_npz_stream(
+    out_path: Path,
+    names: List[str],
+    chunks: Callable[[Tuple[str, ...]], Iterator[Dict[str, np.ndarray]]],
+    num_rows: int,
+    meta: Optional[Dict[str, Any]] = None,
+    format: str = "BC1",
+) -> None:
+    # Same archive layout as np.savez: one uncompressed .npy member per column
+    with zipfile.ZipFile(out_path, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for k in names:
+            dtype = np.dtype(COLUMN_DTYPES[k])
+            header = {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (num_rows,) + column_row_shape(k, format),
+            }
+            written = 0
+            with zf.open(f"{k}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array_header_1_0(f, header)
+                for chunk in chunks((k,)):
+                    f.write(np.ascontiguousarray(chunk[k], dtype=dtype).tobytes())
+                    written += len(chunk[k])
+            if written != num_rows:
+                raise ValueError(f"Column {k} has {written} rows, expected {num_rows}")
+        if meta is not None:
+            with zf.open("meta.npy", "w") as f:
+                np.lib.format.write_array(f, np.array(json.dumps(meta)))
+
+
+def write_endpoint_chunks(
+    out_path: Path,
+    names: List[str],
+    chunks: Callable[[Tuple[str, ...]], Iterator[Dict[str, np.ndarray]]],
+    num_rows: int,
+    meta: Optional[Dict[str, Any]] = None,
+    format: str = "BC1",
+    output_format: str = "json",
+) -> None:
+    """
+    Streams a dataset to out_path one column at a time. chunks(columns) is
+    called once per column and must yield that column's rows in order, as
+    dicts of arrays, num_rows in total.
+    """
+    if output_format == "npz":
+        _write_npz_stream(out_path, names, chunks, num_rows, meta, format)
+    else:
+        _write_json(out_path, names, chunks, meta)
+
+
+def iter_endpoint_chunks(
+    dds: BlockTexture,
+    mip: int = 0,
+    array_index: int = 0,
+    keep_only_c0_gt_c1: bool = False,
+    columns: Optional[Iterable[str]] = None,
+    chunk_blocks: int = STREAM_CHUNK_BLOCKS,
+    selection: Optional[np.ndarray] = None,
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Yields the dataset columns of one level chunk by chunk, straight from the
+    memory-mapped blocks, with the c0 > c1 filter applied per chunk. Only one
+    chunk is materialized at a time. selection (ascending row-major block
+    indices, e.g. from block_error.select_blocks) keeps only those blocks.
+    """
+    lvl = dds.level(mip, array_index)
+    blocks = dds.level_blocks(mip, array_index)
+    e0, e1 = ("c0", "c1") if dds.format == "BC1" else ("a0", "a1")
+    for start in range(0, lvl.num_blocks, chunk_blocks):
+        chunk = blocks[start : start + chunk_blocks]
+        index = None
+        if selection is not None:
+            index = selection[np.searchsorted(selection, start) : np.searchsorted(selection, start + len(chunk))]
+            chunk = chunk[index - start]
+        eps = np.stack([chunk[e0], chunk[e1]], axis=1)
+        yield endpoints_to_dataset_arrays(
+            eps, lvl.blocks_x, lvl.blocks_y, keep_only_c0_gt_c1, dds.format, start, columns, index
+        )
+
+
+def _count_rows(
+    dds: BlockTexture,
+    mip: int,
+    array_index: int,
+    keep_only_c0_gt_c1: bool,
+    chunk_blocks: int,
+    selection: Optional[np.ndarray] = None,
+) -> int:
+    lvl = dds.level(mip, array_index)
+    if not keep_only_c0_gt_c1:
+        return lvl.num_blocks if selection is None else len(selection)
+    blocks = dds.level_blocks(mip, array_index)
+    if selection is not None:
+        blocks = blocks[selection]
+    e0, e1 = ("c0", "c1") if dds.format == "BC1" else ("a0", "a1")
+    return sum(
+        int(np.count_nonzero(blocks[i : i + chunk_blocks][e0] > blocks[i : i + chunk_blocks][e1]))
+        for i in range(0, len(blocks), chunk_blocks)
+    )
+
+
+def stream_endpoints(
+    out_path: Path,
+    dds: BlockTexture,
+    mip: int = 0,
+    array_index: int = 0,
+    include_meta: bool = True,
+    keep_only_c0_gt_c1: bool = False,
+    output_format: str = "json",
+    chunk_blocks: int = STREAM_CHUNK_BLOCKS,
+    selection: Optional[np.ndarray] = None,
+    sampling: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Writes the dataset of one level of an open DDSFile/KTXFile to out_path column by
+    column, pulling chunks from iter_endpoint_chunks, so memory stays at one
+    chunk whatever the texture size. The file is identical to what
+    write_endpoints produces for the same level. selection restricts the rows
+    to those blocks; sampling describes how they were picked and is stored
+    in the meta block. Returns the number of rows.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+
+    # Time spent producing chunks is "convert"; the rest of the write is "serialize"
+    convert = {"seconds": 0.0}
+    start = time.perf_counter()
+    lvl = dds.level(mip, array_index)
+    num_rows = _count_rows(dds, mip, array_index, keep_only_c0_gt_c1, chunk_blocks, selection)
+    convert["seconds"] += time.perf_counter() - start
+
+    meta = None
+    if include_meta:
+        meta = _level_meta(
+            dds.path.resolve(), dds.format, lvl, num_rows, keep_only_c0_gt_c1, len(dds.levels) > 1
+        )
+        if sampling is not None:
+            meta["sampling"] = sampling
+
+    def chunks(columns):
+        return timed_iter(
+            iter_endpoint_chunks(dds, mip, array_index, keep_only_c0_gt_c1, columns, chunk_blocks, selection), convert
+        )
+
+    write_endpoint_chunks(out_path, list(dataset_columns(dds.format)), chunks, num_rows, meta, dds.format, output_format)
+
+    recorder = get_recorder()
+    if recorder is not None:
+        elapsed = time.perf_counter() - start
+        name = dds.path.name
+        block_bytes = np.dtype(dds.block_dtype).itemsize
+        recorder.add("extract", "convert", convert["seconds"], bytes_in=lvl.num_blocks * block_bytes,
+                     blocks=lvl.num_blocks, file=name)
+        recorder.add("extract", "serialize", elapsed - convert["seconds"], bytes_out=file_size(out_path),
+                     blocks=num_rows, file=name, format=output_format)
+    return num_rows
+
+
+def endpoints_output_path(dds_path: Path, output_folder: Optional[str], output_format: str) -> Path:
+    """Where extract_endpoints_to_json writes a file's dataset: [name]_endpoints.[format] in output_folder or beside it."""
+    dds_path = Path(dds_path).resolve()
+    out_root = Path(output_folder).resolve() if output_folder else dds_path.parent
+    return out_root / f"{dds_path.stem}_endpoints.{output_format}"
 
 
 def extract_endpoints_to_json(
@@ -89,88 +613,362 @@ def extract_endpoints_to_json(
     output_folder: str = None,
     include_meta: bool = True,
     keep_only_c0_gt_c1: bool = False,
+    output_format: str = "json",
+    error_source: Optional[str] = None,
+    sample_count: Optional[float] = None,
+    sample_mode: str = "top_k",
+    seed: Optional[int] = None,
 ) -> str:
     """
-    Takes a DDS filepath, extracts BC1 endpoints, converts them to the dataset format,
-    and writes a JSON file to the output directory (or same as input) with a _endpoints.json suffix.
-    Returns the path to the created JSON file.
+    Takes a BC1 or BC4 DDS, KTX or KTX2 filepath, extracts its block endpoints, converts them to the
+    dataset format and writes a JSON file to the output directory (or same as input) with a
+    _endpoints.json suffix. With output_format="npz" the columns are written as typed arrays to
+    _endpoints.npz instead; see endpoints_output_path.
+    The file is streamed chunk by chunk (see stream_endpoints), so memory use does not grow with the texture.
+    With sample_count set, only that many blocks (or that fraction, below 1) are kept, picked by
+    their compression error against the error_source image (see block_error.select_blocks).
+    Returns the path to the created file.
     """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+    if sample_count is not None and error_source is None:
+        raise ValueError("sample_count needs the error_source image the DDS was encoded from")
+
+    dds_path = Path(dds_filepath).resolve()
+    if not dds_path.exists():
+        raise FileNotFoundError(f"File not found: {dds_path}")
+
+    out_path = endpoints_output_path(dds_path, output_folder, output_format)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with stage("extract", "header_parse", file=dds_path.name):
+        dds = open_texture(dds_path)
+    with dds:
+        selection = sampling = None
+        if sample_count is not None:
+            selection, sampling = _error_selection(dds, error_source, sample_count, sample_mode, seed, keep_only_c0_gt_c1)
+        stream_endpoints(
+            out_path, dds, 0, 0, include_meta, keep_only_c0_gt_c1, output_format,
+            selection=selection, sampling=sampling,
+        )
+    print(f"Extracted endpoints to: {out_path}")
+    return str(out_path)
+
+
+def _error_selection(
+    dds: BlockTexture,
+    error_source: str,
+    count: float,
+    mode: str,
+    seed: Optional[int],
+    keep_only_c0_gt_c1: bool,
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Blocks of the top level picked by error against error_source, plus their meta description."""
+    from src.block_error import block_errors, select_blocks
+    from src.encode import load_image
+
+    lvl = dds.level()
+    blocks = dds.level_blocks()
+    with stage("extract", "block_error", file=dds.path.name, blocks=lvl.num_blocks):
+        errors = block_errors(load_image(error_source), blocks, dds.format, lvl.width, lvl.height)
+    candidates = None
+    if keep_only_c0_gt_c1:
+        e0, e1 = ("c0", "c1") if dds.format == "BC1" else ("a0", "a1")
+        candidates = blocks[e0] > blocks[e1]
+    selection = select_blocks(errors, count, mode, seed, candidates)
+    sampling = {
+        "mode": mode,
+        "count": count,
+        "seed": seed,
+        "error_source": str(Path(error_source).resolve()),
+        "mean_error": float(errors.mean()),
+        "mean_error_kept": float(errors.ravel()[selection].mean()) if len(selection) else 0.0,
+    }
+    return selection, sampling
+
+
+def extract_endpoints_levels(
+    dds_filepath: str,
+    output_folder: str = None,
+    include_meta: bool = True,
+    keep_only_c0_gt_c1: bool = False,
+    output_format: str = "json",
+) -> List[str]:
+    """
+    Writes one dataset per mip level (and array slice) of a DDS file in a
+    single pass over the file, named [name]_mip[m]_endpoints.* (with an
+    _a[i] slice prefix for texture arrays and cube maps). Returns the paths.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+
     dds_path = Path(dds_filepath).resolve()
     if not dds_path.exists():
         raise FileNotFoundError(f"File not found: {dds_path}")
 
-    # Determine output path
     if output_folder:
         out_root = Path(output_folder).resolve()
         out_root.mkdir(parents=True, exist_ok=True)
     else:
         out_root = dds_path.parent
 
-    # 1. Parse DDS
-    d = parse_dds_bc1_endpoints(dds_path)
+    out_paths = []
+    with stage("extract", "header_parse", file=dds_path.name):
+        dds = open_texture(dds_path)
+    with dds:
+        for lvl in dds.levels:
+            slice_part = f"_a{lvl.array_index}" if dds.array_size > 1 else ""
+            out_path = out_root / f"{dds_path.stem}{slice_part}_mip{lvl.mip}_endpoints.{output_format}"
+            stream_endpoints(
+                out_path, dds, lvl.mip, lvl.array_index, include_meta, keep_only_c0_gt_c1, output_format
+            )
+            out_paths.append(str(out_path))
+    print(f"Extracted {len(out_paths)} levels to: {out_root}")
+    return out_paths
+
+
+def find_dds_files(source: str) -> List[Path]:
+    """
+    Resolves a texture file, a folder (searched recursively for .dds, .ktx
+    and .ktx2 files) or a glob pattern to a sorted file list.
+    """
+    path = Path(source)
+    if path.is_file():
+        return [path]
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in TEXTURE_SUFFIXES)
+    anchor = Path(path.anchor) if path.is_absolute() else Path(".")
+    pattern = str(path.relative_to(path.anchor)) if path.is_absolute() else source
+    return sorted(p for p in anchor.glob(pattern) if p.is_file())
+
+
+def _extract_one(
+    dds_path: Path,
+    output_folder: Optional[str],
+    output_format: str,
+    keep_only_c0_gt_c1: bool,
+    merge: bool,
+    collect_metrics: bool = False,
+) -> Dict[str, Any]:
+    # Runs in a worker process; errors are reported, not raised. Stage
+    # records are sent back with the result for the parent's recorder.
+    if collect_metrics:
+        with recording() as recorder:
+            result = _extract_one(dds_path, output_folder, output_format, keep_only_c0_gt_c1, merge)
+        result["metrics"] = recorder.records
+        return result
+    try:
+        if merge:
+            # Only the packed endpoints travel back; columns are built at merge time
+            from src.endpoint_dataset import EndpointDataset
+
+            ds = EndpointDataset.from_dds(dds_path)
+            if keep_only_c0_gt_c1:
+                ds = ds.only_c0_gt_c1()
+            return {"file": str(dds_path), "dataset": ds, "meta": ds.meta(keep_only_c0_gt_c1), "error": None}
+        out = extract_endpoints_to_json(
+            str(dds_path), output_folder, keep_only_c0_gt_c1=keep_only_c0_gt_c1, output_format=output_format
+        )
+        return {"file": str(dds_path), "output": out, "error": None}
+    except Exception as e:
+        return {"file": str(dds_path), "error": f"{type(e).__name__}: {e}"}
 
-    # 2. Convert to Dataset Format (Logic from convert_reference_to_dataset)
-    W, H = int(d["width"]), int(d["height"])
-    Bx, By = int(d["blocks_x"]), int(d["blocks_y"])
-    eps = d["endpoints_rgb565"]
-    n = len(eps)
-
-    st: List[List[float]] = []
-    bxby: List[List[int]] = []
-    ep_q01: List[List[float]] = []
-    c0_gt_c1: List[int] = []
-    ep_rgb565: List[List[int]] = []
-
-    for i, pair in enumerate(eps):
-        c0, c1 = int(pair[0]), int(pair[1])
-        bx = i % Bx
-        by = i // Bx
-
-        s = bx / (Bx - 1) if Bx > 1 else 0.0
-        t = by / (By - 1) if By > 1 else 0.0
-
-        flag = 1 if (c0 > c1) else 0
-        if keep_only_c0_gt_c1 and flag == 0:
-            continue
-
-        bxby.append([bx, by])
-        st.append([float(s), float(t)])
-
-        ep_rgb565.append([c0, c1])
-        ep_q01.append(rgb565_to_q01(c0) + rgb565_to_q01(c1))
-        c0_gt_c1.append(flag)
-
-    out: Dict[str, Any] = {
-        "inputs": {"st": st, "bxby": bxby},
-        "targets": {"ep_rgb565": ep_rgb565, "ep_q01": ep_q01},
-        "flags": {"c0_gt_c1": c0_gt_c1},
-    }
 
-    if include_meta:
-        out["meta"] = {
-            "width": W,
-            "height": H,
-            "blocks_x": Bx,
-            "blocks_y": By,
-            "block_order": d.get("block_order", "row_major"),
-            "format": d.get("format", "BC1"),
-            "num_blocks_total": n,
-            "num_blocks_kept": len(ep_rgb565),
-            "filtered_c0_gt_c1": bool(keep_only_c0_gt_c1),
-            "source_image": str(dds_path),
+def iter_extract_endpoints_batch(
+    files: List[Path],
+    output_folder: Optional[str] = None,
+    output_format: str = "json",
+    keep_only_c0_gt_c1: bool = False,
+    merge: bool = False,
+    max_workers: Optional[int] = None,
+    cancel_event=None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Extracts many DDS files on a process pool and yields one result dict per
+    file as it finishes: file, error (or None), plus output (per-file mode) or
+    dataset/meta (merge mode, dataset being an EndpointDataset). Setting cancel_event skips files not yet started.
+    Stage timings from the workers are added to the active recorder, if any.
+    A crashed worker fails only the files left on the pool, not the whole batch.
+    In per-file mode, files whose output path is already taken by an earlier
+    file (e.g. foo.dds and foo.ktx2) are reported as errors and not extracted.
+    """
+    if not merge:
+        owners: Dict[Path, Path] = {}
+        accepted = []
+        for f in files:
+            out = endpoints_output_path(f, output_folder, output_format)
+            owner = owners.setdefault(out, Path(f))
+            if owner != Path(f):
+                yield {"file": str(f), "error": f"output {out.name} is also written from {owner}"}
+                continue
+            accepted.append(f)
+        files = accepted
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(files) or 1))
+
+    recorder = get_recorder()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_extract_one, f, output_folder, output_format, keep_only_c0_gt_c1, merge, recorder is not None): f
+            for f in files
         }
+        for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                for f in futures:
+                    f.cancel()
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed or out of memory); every file still on the pool fails with it
+                yield {"file": str(futures[future]), "error": f"{type(e).__name__}: {e}"}
+                continue
+            if recorder is not None:
+                recorder.extend(result.pop("metrics", []))
+            yield result
+
+
+def merge_endpoint_results(results: List[Dict[str, Any]]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Concatenates per-file columns into one dataset. Rows get a texture_id
+    column indexing into meta["sources"].
+    """
+    results = sorted((r for r in results if r["error"] is None), key=lambda r: r["file"])
+    formats = {r["meta"]["format"] for r in results}
+    if len(formats) > 1:
+        raise ValueError(f"Cannot merge datasets of different formats: {sorted(formats)}")
+
+    names = list(dataset_columns(results[0]["meta"]["format"])) if results else list(DATASET_DTYPES)
+    cols: Dict[str, np.ndarray] = {}
+    for k in names:
+        dt = COLUMN_DTYPES[k]
+        parts = [np.asarray(r["dataset"].columns([k])[k], dtype=dt) for r in results]
+        cols[k] = np.concatenate(parts) if parts else np.empty((0,) + DATASET_ROW_SHAPES[k], dtype=dt)
+    cols["texture_id"] = np.concatenate(
+        [np.full(len(r["dataset"]), i, dtype=np.uint32) for i, r in enumerate(results)]
+    ) if results else np.empty(0, dtype=np.uint32)
+    meta = {
+        "merged": True,
+        "num_textures": len(results),
+        "num_blocks_kept": int(len(cols["c0_gt_c1"])),
+        "sources": [r["meta"] for r in results],
+    }
+    return cols, meta
+
+
+def extract_endpoints_batch(
+    source: str,
+    output_folder: Optional[str] = None,
+    output_format: str = "json",
+    keep_only_c0_gt_c1: bool = False,
+    merge: bool = False,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Extracts every DDS file matched by source (file, folder or glob) across a
+    process pool. Writes one output per file, or a merged_endpoints dataset
+    when merge is set; a mix of BC1 and BC4 textures gets one merged dataset
+    per format (merged_endpoints_BC1, merged_endpoints_BC4). Failures are
+    collected instead of aborting.
+    Returns {"outputs": [...], "errors": [{"file", "error"}], "merged": [paths]}.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+
+    files = find_dds_files(source)
+    results = list(iter_extract_endpoints_batch(
+        files, output_folder, output_format, keep_only_c0_gt_c1, merge, max_workers
+    ))
+    report: Dict[str, Any] = {
+        "outputs": sorted(r["output"] for r in results if r["error"] is None and "output" in r),
+        "errors": sorted(({"file": r["file"], "error": r["error"]} for r in results if r["error"]),
+                         key=lambda e: e["file"]),
+        "merged": [],
+    }
 
-    # Naming convention: [name]_endpoints.json
-    out_json_path = out_root / f"{dds_path.stem}_endpoints.json"
-    out_json_path.write_text(json.dumps(out, indent=2))
-    print(f"Extracted endpoints to: {out_json_path}")
-    return str(out_json_path)
+    if merge:
+        out_root = Path(output_folder).resolve() if output_folder else Path(".").resolve()
+        out_root.mkdir(parents=True, exist_ok=True)
+        by_format: Dict[str, List[Dict[str, Any]]] = {}
+        for r in results:
+            if r["error"] is None:
+                by_format.setdefault(r["meta"]["format"], []).append(r)
+        for fmt, group in sorted(by_format.items()) or [("", [])]:
+            name = "merged_endpoints" if len(by_format) <= 1 else f"merged_endpoints_{fmt}"
+            cols, meta = merge_endpoint_results(group)
+            out_path = out_root / f"{name}.{output_format}"
+            with stage("extract", "merge_write", blocks=meta["num_blocks_kept"], format=output_format) as info:
+                write_endpoints(out_path, cols, meta, output_format)
+                info["bytes_out"] = file_size(out_path)
+            report["merged"].append(str(out_path))
+            print(f"Merged {meta['num_textures']} textures into: {out_path}")
+
+    return report
 
 
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) > 1:
-        extract_endpoints_to_json(sys.argv[1])
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract BC1/BC4 endpoints from DDS, KTX and KTX2 files to JSON or npz datasets.")
+    parser.add_argument("source", help="DDS/KTX/KTX2 file, folder of them, or glob pattern")
+    parser.add_argument("-o", "--output", help="output folder (default: next to each input)")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="json", help="output format")
+    parser.add_argument("--merge", action="store_true", help="write one merged dataset instead of one file per texture")
+    parser.add_argument("--c0-gt-c1", action="store_true", help="keep only blocks with c0 > c1")
+    parser.add_argument("--error-source", metavar="IMAGE",
+                        help="image the DDS was encoded from; blocks are sampled by their error against it")
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument("--top-k", type=float, metavar="N",
+                          help="keep the N blocks (or fraction, below 1) with the largest error")
+    sampling.add_argument("--sample", type=float, metavar="N",
+                          help="sample N blocks (or fraction, below 1) with probability proportional to error")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for --sample")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--all-levels", action="store_true", help="write one dataset per mip level / array slice of a single file")
+    parser.add_argument("--metrics", nargs="?", const="", metavar="JSONL",
+                        help="print per-stage timings at the end (and append the records to JSONL)")
+    args = parser.parse_args()
+
+    recorder = None
+    if args.metrics is not None:
+        recorder = StageRecorder(args.metrics or None)
+        set_recorder(recorder)
+
+    sample_count = args.top_k if args.top_k is not None else args.sample
+    if sample_count is not None and (
+        args.error_source is None or args.all_levels or args.merge or not Path(args.source).is_file()
+    ):
+        parser.error("--top-k/--sample need --error-source and a single DDS file (no --merge/--all-levels)")
+
+    failed = False
+    if args.all_levels:
+        extract_endpoints_levels(
+            args.source, args.output, keep_only_c0_gt_c1=args.c0_gt_c1, output_format=args.format
+        )
+    elif Path(args.source).is_file() and not args.merge:
+        extract_endpoints_to_json(
+            args.source, args.output, keep_only_c0_gt_c1=args.c0_gt_c1, output_format=args.format,
+            error_source=args.error_source, sample_count=sample_count,
+            sample_mode="top_k" if args.top_k is not None else "proportional", seed=args.seed,
+        )
     else:
-        print("Usage: python extractendpoints.py <path_to_dds_file>")
+        report = extract_endpoints_batch(
+            args.source, args.output, args.format, args.c0_gt_c1, args.merge, args.workers
+        )
+        num_outputs = len(report["merged"]) if args.merge else len(report["outputs"])
+        print(f"Done: {num_outputs} outputs, {len(report['errors'])} errors.")
+        for err in report["errors"]:
+            print(f"  {err['file']}: {err['error']}")
+        if report["errors"] and args.output:
+            report_path = Path(args.output) / "extraction_errors.json"
+            report_path.write_text(json.dumps(report["errors"], indent=2))
+            print(f"Error report written to: {report_path}")
+        failed = bool(report["errors"])
+
+    if recorder is not None:
+        recorder.close()
+        print(recorder.format_summary())
+    if failed:
+        sys.exit(1)
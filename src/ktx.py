@@ -0,0 +1,166 @@
+import struct
+import sys
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.dds import BLOCK_DTYPES, BlockTexture, DDSFile, DDSLevel
+
+KTX1_IDENTIFIER = b"\xabKTX 11\xbb\r\n\x1a\n"
+KTX2_IDENTIFIER = b"\xabKTX 20\xbb\r\n\x1a\n"
+KTX1_HEADER_SIZE = 64
+KTX2_HEADER_SIZE = 80
+KTX1_ENDIANNESS = 0x04030201
+
+# glInternalFormat values of KTX1 files
+GL_FORMATS = {
+    0x83F0: "BC1",  # GL_COMPRESSED_RGB_S3TC_DXT1_EXT
+    0x83F1: "BC1",  # GL_COMPRESSED_RGBA_S3TC_DXT1_EXT
+    0x8C4C: "BC1",  # GL_COMPRESSED_SRGB_S3TC_DXT1_EXT
+    0x8C4D: "BC1",  # GL_COMPRESSED_SRGB_ALPHA_S3TC_DXT1_EXT
+    0x8DBB: "BC4",  # GL_COMPRESSED_RED_RGTC1
+    0x8C70: "BC4",  # GL_COMPRESSED_LUMINANCE_LATC1_EXT
+}
+
+# vkFormat values of KTX2 files
+VK_FORMATS = {
+    131: "BC1",  # VK_FORMAT_BC1_RGB_UNORM_BLOCK
+    132: "BC1",  # VK_FORMAT_BC1_RGB_SRGB_BLOCK
+    133: "BC1",  # VK_FORMAT_BC1_RGBA_UNORM_BLOCK
+    134: "BC1",  # VK_FORMAT_BC1_RGBA_SRGB_BLOCK
+    139: "BC4",  # VK_FORMAT_BC4_UNORM_BLOCK
+}
+
+TEXTURE_SUFFIXES = (".dds", ".ktx", ".ktx2")
+
+
+class KTXFile(BlockTexture):
+    """
+    Lazy, memory-mapped reader for BC1 and BC4 KTX (1.1) and KTX2 files,
+    with the same accessors as DDSFile. The header and level index are
+    parsed on open into one DDSLevel per mip of every array layer / cube
+    face; block data stays in the mapping and is only handed out as views.
+    Supercompressed KTX2 files (zstd, BasisLZ) are rejected since their
+    blocks can't be viewed in place.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        size = self.path.stat().st_size
+        self._buf: Optional[np.memmap] = np.memmap(self.path, dtype=np.uint8, mode="r") if size else None
+        data = self._buf
+        ident = bytes(data[:12]) if data is not None else b""
+        if ident == KTX1_IDENTIFIER:
+            self.version = 1
+            layout = self._parse_ktx1(data, size)
+        elif ident == KTX2_IDENTIFIER:
+            self.version = 2
+            layout = self._parse_ktx2(data, size)
+        else:
+            raise ValueError("Not a valid KTX file (missing KTX identifier).")
+
+        self.block_dtype = BLOCK_DTYPES[self.format]
+        self.blocks_x = (self.width + 3) // 4
+        self.blocks_y = (self.height + 3) // 4
+        self.num_blocks = self.blocks_x * self.blocks_y
+
+        # layout[m] = (offset of the level's first image, bytes between images)
+        block_size = self.block_dtype.itemsize
+        self.levels: List[DDSLevel] = []
+        for a in range(self.array_size):
+            for m in range(self.mip_count):
+                w, h = max(1, self.width >> m), max(1, self.height >> m)
+                bx, by = (w + 3) // 4, (h + 3) // 4
+                offset = layout[m][0] + a * layout[m][1]
+                if size < offset + bx * by * block_size:
+                    raise ValueError(
+                        f"KTX truncated: mip {m} of layer {a} needs {offset + bx * by * block_size} bytes, file has {size}."
+                    )
+                self.levels.append(DDSLevel(a, m, w, h, bx, by, bx * by, offset))
+
+    def _image_size(self, mip: int) -> int:
+        w, h = max(1, self.width >> mip), max(1, self.height >> mip)
+        return ((w + 3) // 4) * ((h + 3) // 4) * BLOCK_DTYPES[self.format].itemsize
+
+    def _parse_ktx1(self, data: np.memmap, size: int) -> list:
+        if size < KTX1_HEADER_SIZE:
+            raise ValueError("KTX truncated: incomplete header.")
+        header = bytes(data[12:KTX1_HEADER_SIZE])
+        endian = "<" if struct.unpack_from("<I", header, 0)[0] == KTX1_ENDIANNESS else ">"
+        if struct.unpack_from(endian + "I", header, 0)[0] != KTX1_ENDIANNESS:
+            raise ValueError("KTX header has an invalid endianness field.")
+        (_, gl_type, _, gl_format, self.gl_internal_format, _, self.width, self.height, depth,
+         array_elements, faces, mip_count, kv_bytes) = struct.unpack_from(endian + "13I", header, 0)
+        if gl_type != 0 or gl_format != 0 or self.gl_internal_format not in GL_FORMATS:
+            raise ValueError(f"KTX format is not BC1 or BC4 (glInternalFormat=0x{self.gl_internal_format:04X}).")
+        if depth > 1:
+            raise ValueError("Volume KTX textures are not supported.")
+        self.format = GL_FORMATS[self.gl_internal_format]
+        self.mip_count = max(1, mip_count)
+        self.array_size = max(1, array_elements) * max(1, faces)
+        self.height = max(1, self.height)
+
+        # Each level is its imageSize field followed by every layer/face image, 4-byte aligned.
+        # Compressed blocks are byte streams, so big-endian files need no swapping.
+        layout = []
+        offset = KTX1_HEADER_SIZE + kv_bytes
+        for m in range(self.mip_count):
+            if size < offset + 4:
+                raise ValueError(f"KTX truncated: missing imageSize of mip {m}.")
+            image_size = self._image_size(m)
+            stride = image_size + (-image_size % 4)
+            layout.append((offset + 4, stride))
+            offset += 4 + stride * self.array_size
+            offset += -offset % 4
+        return layout
+
+    def _parse_ktx2(self, data: np.memmap, size: int) -> list:
+        if size < KTX2_HEADER_SIZE:
+            raise ValueError("KTX2 truncated: incomplete header.")
+        header = bytes(data[12:KTX2_HEADER_SIZE])
+        (self.vk_format, _, self.width, self.height, depth, layers, faces, mip_count,
+         supercompression) = struct.unpack_from("<9I", header, 0)
+        if self.vk_format not in VK_FORMATS:
+            raise ValueError(f"KTX2 format is not BC1 or BC4 (vkFormat={self.vk_format}).")
+        if supercompression != 0:
+            raise ValueError(f"Supercompressed KTX2 files are not supported (scheme {supercompression}).")
+        if depth > 1:
+            raise ValueError("Volume KTX2 textures are not supported.")
+        self.format = VK_FORMATS[self.vk_format]
+        self.mip_count = max(1, mip_count)
+        self.array_size = max(1, layers) * max(1, faces)
+        self.height = max(1, self.height)
+
+        index_size = self.mip_count * 24
+        if size < KTX2_HEADER_SIZE + index_size:
+            raise ValueError("KTX2 truncated: incomplete level index.")
+        index = np.frombuffer(bytes(data[KTX2_HEADER_SIZE : KTX2_HEADER_SIZE + index_size]), dtype="<u8").reshape(-1, 3)
+        layout = []
+        for m, (offset, length, _) in enumerate(index.tolist()):
+            image_size = self._image_size(m)
+            if length < image_size * self.array_size:
+                raise ValueError(f"KTX2 level {m} holds {length} bytes, expected {image_size * self.array_size}.")
+            layout.append((offset, image_size))
+        return layout
+
+
+def open_texture(path) -> Union[DDSFile, KTXFile]:
+    """Opens a KTX or KTX2 file (recognized by its identifier) with KTXFile and anything else with DDSFile."""
+    with open(path, "rb") as f:
+        magic = f.read(12)
+    if magic in (KTX1_IDENTIFIER, KTX2_IDENTIFIER):
+        return KTXFile(path)
+    return DDSFile(path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open_texture(sys.argv[1]) as tex:
+            print(f"{type(tex).__name__}: {tex.format} {tex.width}x{tex.height}, {tex.mip_count} mips x {tex.array_size} slices")
+            for lvl in tex.levels:
+                print(f"  a{lvl.array_index} mip{lvl.mip}: {lvl.width}x{lvl.height}, {lvl.num_blocks} blocks @ {lvl.offset}")
+    else:
+        print("Usage: python ktx.py <texture.dds|.ktx|.ktx2>")
@@ -0,0 +1,69 @@
+from typing import Dict
+
+import numpy as np
+
+# SSIM constants for 8-bit data (Wang et al. 2004)
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+def _as_float(img: np.ndarray) -> np.ndarray:
+    img = np.asarray(img, dtype=np.float64)
+    return img[:, :, None] if img.ndim == 2 else img
+
+
+def mse(ref: np.ndarray, test: np.ndarray) -> float:
+    return float(np.mean((_as_float(ref) - _as_float(test)) ** 2))
+
+
+def psnr(ref: np.ndarray, test: np.ndarray) -> float:
+    """Peak signal-to-noise ratio in dB for 8-bit images (inf when identical)."""
+    err = mse(ref, test)
+    return float("inf") if err == 0 else float(10.0 * np.log10(255.0**2 / err))
+
+
+def max_error(ref: np.ndarray, test: np.ndarray) -> int:
+    return int(np.abs(_as_float(ref) - _as_float(test)).max())
+
+
+def _gaussian_kernel(size: int = 11, sigma: float = 1.5) -> np.ndarray:
+    x = np.arange(size) - (size - 1) / 2.0
+    k = np.exp(-(x**2) / (2 * sigma**2))
+    return k / k.sum()
+
+
+def _filter(img: np.ndarray, k: np.ndarray) -> np.ndarray:
+    """Separable 'valid' filter over the first two axes, one shifted slice per tap."""
+    n = len(k)
+    h, w = img.shape[0] - n + 1, img.shape[1] - n + 1
+    rows = sum(k[i] * img[i : i + h] for i in range(n))
+    return sum(k[i] * rows[:, i : i + w] for i in range(n))
+
+
+def ssim(ref: np.ndarray, test: np.ndarray) -> float:
+    """
+    Mean structural similarity with an 11x11 Gaussian window (sigma 1.5),
+    averaged over channels. Images smaller than the window fall back to a
+    single global window.
+    """
+    x, y = _as_float(ref), _as_float(test)
+    k = _gaussian_kernel()
+    if min(x.shape[0], x.shape[1]) < len(k):
+        k = np.full(min(x.shape[0], x.shape[1]), 1.0 / min(x.shape[0], x.shape[1]))
+
+    mu_x, mu_y = _filter(x, k), _filter(y, k)
+    xx = _filter(x * x, k) - mu_x * mu_x
+    yy = _filter(y * y, k) - mu_y * mu_y
+    xy = _filter(x * y, k) - mu_x * mu_y
+    s = ((2 * mu_x * mu_y + _C1) * (2 * xy + _C2)) / ((mu_x**2 + mu_y**2 + _C1) * (xx + yy + _C2))
+    return float(s.mean())
+
+
+def compare(ref: np.ndarray, test: np.ndarray) -> Dict[str, float]:
+    """PSNR, SSIM, max absolute error and MSE of test against ref."""
+    return {
+        "psnr": psnr(ref, test),
+        "ssim": ssim(ref, test),
+        "max_error": max_error(ref, test),
+        "mse": mse(ref, test),
+    }
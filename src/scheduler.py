@@ -0,0 +1,247 @@
+import copy
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.bcn import GROUP_MAX_PIXELS, bcn, image_size, plan_units, run_unit
+from src.timing import file_size
+
+DEFAULT_GPU_SLOTS = 1
+
+# Starting guesses (seconds of overhead per process, megapixels per second)
+# until real encodes have been observed: the GPU pays for device init but is
+# much faster per pixel, a CPU encode starts quickly but runs on one core.
+GPU_PRIOR = (0.5, 100.0)
+CPU_PRIOR = (0.05, 2.0)
+
+
+class DeviceModel:
+    """
+    Online estimate of how long one encode takes on a device,
+    seconds = overhead + megapixels / rate, refitted by least squares after
+    every observed encode. Older observations decay so the fit follows the
+    current load; the prior counts as two fixed observations so a run of
+    same-sized images still gives a usable line.
+    """
+
+    DECAY = 0.9
+    PRIOR_MP = (0.0, 4.0)
+    PRIOR_WEIGHT = 0.5
+
+    def __init__(self, overhead: float, rate: float):
+        self._prior = [(x, overhead + x / rate) for x in self.PRIOR_MP]
+        self.n = self.sx = self.sy = self.sxx = self.sxy = 0.0
+        self.observed = 0
+        self._fit()
+
+    def observe(self, pixels: int, seconds: float) -> None:
+        x = pixels / 1e6
+        d = self.DECAY
+        self.n, self.sx, self.sy = d * self.n + 1, d * self.sx + x, d * self.sy + seconds
+        self.sxx, self.sxy = d * self.sxx + x * x, d * self.sxy + x * seconds
+        self.observed += 1
+        self._fit()
+
+    def _fit(self) -> None:
+        w = self.PRIOR_WEIGHT
+        n = self.n + w * len(self._prior)
+        sx = self.sx + w * sum(x for x, _ in self._prior)
+        sy = self.sy + w * sum(y for _, y in self._prior)
+        sxx = self.sxx + w * sum(x * x for x, _ in self._prior)
+        sxy = self.sxy + w * sum(x * y for x, y in self._prior)
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        self.seconds_per_mp = max(slope, 1e-6)
+        self.overhead = max((sy - self.seconds_per_mp * sx) / n, 0.0)
+
+    def estimate(self, pixels: int) -> float:
+        return self.overhead + pixels / 1e6 * self.seconds_per_mp
+
+    def __repr__(self) -> str:
+        return f"DeviceModel({self.overhead:.3f} s + {1 / self.seconds_per_mp:.1f} MP/s, {self.observed} observed)"
+
+
+def default_models() -> Dict[str, DeviceModel]:
+    return {"gpu": DeviceModel(*GPU_PRIOR), "cpu": DeviceModel(*CPU_PRIOR)}
+
+
+def job_pixels(job: bcn) -> int:
+    """Input pixel count from the image header; the file size stands in when the header can't be read."""
+    size = image_size(job.input_image)
+    return size[0] * size[1] if size is not None else file_size(job.input_image)
+
+
+def _routed(job: bcn, device: str, reserved: int) -> bcn:
+    """
+    Copy of job that encodes on device, leaving the caller's job (and its
+    use_gpu) untouched. A tiled encode runs one tile worker per reserved slot;
+    with a single slot it is encoded whole, since tiles would only run one
+    after another.
+    """
+    routed = copy.copy(job)
+    routed.use_gpu = device == "gpu"
+    routed.cache_hit = False
+    routed.tile_workers = reserved
+    if reserved == 1:
+        routed.tile_size = None
+    return routed
+
+
+class _Slots:
+    """Running units of one device, used to estimate when its next slot frees up."""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.running: Dict[Any, Tuple[float, float, int]] = {}  # future -> (start, estimated seconds, slots held)
+
+    @property
+    def free(self) -> int:
+        return self.count - sum(held for _, _, held in self.running.values())
+
+    def wait(self, now: float) -> float:
+        if self.count <= 0:
+            return float("inf")
+        if self.free > 0:
+            return 0.0
+        return max(0.0, min(start + est - now for start, est, _ in self.running.values()))
+
+
+def iter_bcn_scheduled(
+    jobs: Iterable[bcn],
+    gpu_slots: int = DEFAULT_GPU_SLOTS,
+    cpu_workers: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+    files_per_process: int = 1,
+    max_pixels: Optional[int] = GROUP_MAX_PIXELS,
+    models: Optional[Dict[str, DeviceModel]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Runs bcn jobs on gpu_slots concurrent GPU encodes plus cpu_workers CPU
+    encodes, yielding iter_bcn_batch's result dicts with two more keys:
+    device ("gpu" or "cpu") and retried (True when a failed GPU encode was
+    redone on the CPU; gpu_error then holds the GPU failure).
+
+    Work units (see plan_units) are kept sorted by size. A free GPU slot takes
+    the largest unit and a free CPU worker the smallest, each only if the
+    device's DeviceModel says it finishes the unit sooner than the other
+    device would, counting the wait for that device's next free slot. The
+    models are refitted from every finished encode, so routing follows the
+    measured throughput of both backends. Jobs created with use_gpu=False and
+    numpy-backend jobs only run on the CPU; those start largest first, as do
+    GPU encodes retried on the CPU. A tiled job (see bcn.tile_count) takes as
+    many free slots of its device as it has tiles and encodes that many tiles
+    at once.
+    """
+    jobs = list(jobs)
+    if cpu_workers is None:
+        cpu_workers = os.cpu_count() or 1
+    models = models or default_models()
+    slots = {"gpu": _Slots(max(0, gpu_slots)), "cpu": _Slots(max(1, cpu_workers))}
+    gpu_ok = [job.backend == "compressonator" and job.use_gpu for job in jobs]
+
+    units = plan_units(jobs, files_per_process, slots["gpu"].count + slots["cpu"].count, max_pixels)
+    pixels = [job_pixels(job) for job in jobs]
+    tiles = {u[0]: jobs[u[0]].tile_count() for u in units if len(u) == 1}
+    # (pixels, unit), smallest first; GPU-eligible units and CPU-only units are kept apart
+    pending = {
+        "gpu": deque(sorted(((sum(pixels[i] for i in u), u) for u in units if gpu_ok[u[0]]), key=lambda p: p[0])),
+        "cpu": deque(sorted(((sum(pixels[i] for i in u), u) for u in units if not gpu_ok[u[0]]), key=lambda p: p[0])),
+    }
+    gpu_errors: Dict[int, str] = {}
+    reported = 0
+    running: Dict[Any, Tuple[str, int, float, List[int], int]] = {}  # future -> (device, pixels, start, unit, slots held)
+
+    def submit(pool, device, unit_pixels, unit):
+        held = max(1, min(tiles.get(unit[0], 1) if len(unit) == 1 else 1, slots[device].free))
+        routed = {i: _routed(jobs[i], device, held) for i in unit}
+        # The model is per slot: a unit spread over several slots counts as its share of the pixels
+        est = models[device].estimate(unit_pixels // held)
+        future = pool.submit(run_unit, unit, routed, cancel_event)
+        now = time.perf_counter()
+        slots[device].running[future] = (now, est, held)
+        running[future] = (device, unit_pixels, now, unit, held)
+
+    def dispatch(pool):
+        while True:
+            now = time.perf_counter()
+            gpu_wait, cpu_wait = slots["gpu"].wait(now), slots["cpu"].wait(now)
+            if slots["gpu"].free > 0 and pending["gpu"]:
+                px, unit = pending["gpu"][-1]
+                if models["gpu"].estimate(px) <= cpu_wait + models["cpu"].estimate(px):
+                    pending["gpu"].pop()
+                    submit(pool, "gpu", px, unit)
+                    continue
+            if slots["cpu"].free > 0:
+                if pending["cpu"]:
+                    submit(pool, "cpu", *pending["cpu"].pop())
+                    continue
+                if pending["gpu"]:
+                    px, unit = pending["gpu"][0]
+                    if models["cpu"].estimate(px) <= gpu_wait + models["gpu"].estimate(px):
+                        pending["gpu"].popleft()
+                        submit(pool, "cpu", px, unit)
+                        continue
+            if not running and pending["gpu"]:
+                # Each device defers to the other, but nothing is running to free a slot:
+                # start the largest unit on whichever idle device estimates it faster
+                px, unit = pending["gpu"].pop()
+                gpu_faster = slots["gpu"].free > 0 and models["gpu"].estimate(px) <= models["cpu"].estimate(px)
+                submit(pool, "gpu" if gpu_faster else "cpu", px, unit)
+                continue
+            return
+
+    with ThreadPoolExecutor(max_workers=slots["gpu"].count + slots["cpu"].count) as pool:
+        dispatch(pool)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            finished: List[Dict[str, Any]] = []
+            for future in done:
+                device, unit_pixels, start, unit, held = running.pop(future)
+                del slots[device].running[future]
+                try:
+                    items = future.result()
+                except Exception as e:
+                    # e.g. folder mode failing to stage its inputs; the unit's jobs fail, the batch goes on
+                    items = []
+                    for i in unit:
+                        jobs[i].cache_hit = False
+                        items.append({"index": i, "job": jobs[i], "result": None, "returncode": None, "error": str(e),
+                                      "cancelled": False, "seconds": time.perf_counter() - start})
+                for item in items:
+                    # Report the caller's job; only the per-run cache_hit flag is carried over
+                    jobs[item["index"]].cache_hit = item["job"].cache_hit
+                    item["job"] = jobs[item["index"]]
+                encoded = [it for it in items if it["returncode"] == 0 and not it["job"].cache_hit]
+                if encoded and len(encoded) == len(items):
+                    models[device].observe(unit_pixels // held, time.perf_counter() - start)
+
+                retry = []
+                for item in items:
+                    failed = not item["cancelled"] and (item["error"] is not None or item["returncode"] != 0)
+                    if failed and device == "gpu":
+                        gpu_errors[item["index"]] = item["error"] or item["result"].stderr.strip()
+                        retry.append(item["index"])
+                        continue
+                    item["device"] = device
+                    item["retried"] = item["index"] in gpu_errors
+                    if item["retried"]:
+                        item["gpu_error"] = gpu_errors[item["index"]]
+                    finished.append(item)
+                for i in retry:
+                    pending["cpu"].append((pixels[i], [i]))
+
+            dispatch(pool)
+            reported += len(finished)
+            yield from finished
+
+    if reported != len(jobs):
+        raise RuntimeError(f"scheduler finished with {len(jobs) - reported} of {len(jobs)} jobs unreported")
+
+
+def bcn_scheduled(jobs: Iterable[bcn], **kwargs) -> List[Dict[str, Any]]:
+    """Runs all jobs via iter_bcn_scheduled and returns their results in input order."""
+    results = list(iter_bcn_scheduled(jobs, **kwargs))
+    results.sort(key=lambda r: r["index"])
+    return results
@@ -0,0 +1,171 @@
+import csv
+import hashlib
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.bcn import BACKENDS, bcn, iter_bcn_batch
+from src.decode import decode_dds
+from src.encode import load_image
+from src.encode_cache import executable_identity, file_digest
+from src.metrics import compare
+from src.timing import recording, stage
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tga"}
+
+DEFAULT_QUALITIES = (0.05, 0.25, 0.5, 0.75, 1.0)
+
+# Bumped when rows cached under older keys can't be trusted (v2: outputs of
+# a.png/a.bmp or of nearby qualities used to overwrite each other)
+RESULT_KEY_VERSION = 2
+
+TABLE_COLUMNS = ("image", "format", "quality", "backend", "psnr", "ssim", "max_error", "encode_seconds", "output_bytes")
+
+
+def find_images(source: str) -> List[Path]:
+    path = Path(source)
+    if path.is_file():
+        return [path]
+    return sorted(p for p in path.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def _result_key(job: bcn) -> str:
+    # Same ingredients as the encode cache: input bytes, parameters, encoder identity
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"v{RESULT_KEY_VERSION}|".encode())
+    h.update(file_digest(job.input_image).encode())
+    h.update(executable_identity(job.encoder_path()).encode())
+    h.update(f"{job.format}|{float(job.quality)!r}|{job.backend}|{bool(job.use_gpu)}".encode())
+    return h.hexdigest()
+
+
+def evaluate(source_rgba, dds_path: Path, format: str) -> Dict[str, float]:
+    """Decodes dds_path and compares it with the source image (RGB for BC1, R for BC4)."""
+    decoded = decode_dds(dds_path)
+    if format == "BC1":
+        return compare(source_rgba[:, :, :3], decoded[:, :, :3])
+    return compare(source_rgba[:, :, 0], decoded[:, :, 0])
+
+
+def quality_sweep(
+    images: Iterable[Path],
+    output_folder: str,
+    formats: Iterable[str] = ("BC1",),
+    qualities: Iterable[float] = DEFAULT_QUALITIES,
+    backend: str = "compressonator",
+    use_gpu: bool = True,
+    max_workers: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Compresses every image at every (format, quality) point in parallel,
+    decodes the results and measures them against the source. Rows are cached
+    in output_folder/sweep_cache.json by (image content, parameters, encoder),
+    so re-running with an extra quality point only encodes that point.
+    Returns one row per point with TABLE_COLUMNS plus "error".
+    """
+    out_root = Path(output_folder)
+    out_root.mkdir(parents=True, exist_ok=True)
+    cache_path = out_root / "sweep_cache.json"
+    cached: Dict[str, Dict[str, Any]] = json.loads(cache_path.read_text()) if cache_path.exists() else {}
+
+    rows: List[Dict[str, Any]] = []
+    jobs: List[bcn] = []
+    keys: List[str] = []
+    for image in images:
+        image = Path(image)
+        for fmt in formats:
+            for q in dict.fromkeys(float(q) for q in qualities):
+                # Full file name and exact quality, so a.png/a.bmp or 0.051/0.054 never share an output
+                job = bcn(image, out_root / f"{image.name}-{fmt}-{q!r}.dds", format=fmt, quality=q,
+                          use_gpu=use_gpu, backend=backend)
+                key = _result_key(job)
+                if key in cached:
+                    rows.append(cached[key])
+                else:
+                    jobs.append(job)
+                    keys.append(key)
+
+    sources: Dict[Path, Any] = {}
+    for item in iter_bcn_batch(jobs, max_workers=max_workers):
+        job = item["job"]
+        row: Dict[str, Any] = {
+            "image": job.input_image.name,
+            "format": job.format,
+            "quality": float(job.quality),
+            "backend": job.backend,
+            "encode_seconds": round(item["seconds"], 4),
+            "error": None,
+        }
+        if item["error"] is not None or item["returncode"] != 0:
+            row["error"] = item["error"] or item["result"].stderr.strip() or f"exit code {item['returncode']}"
+            rows.append(row)
+            continue
+
+        if job.input_image not in sources:
+            sources[job.input_image] = load_image(job.input_image)
+        try:
+            with stage("sweep", "evaluate", file=job.output_image.name, bytes_in=job.output_image.stat().st_size):
+                row.update(evaluate(sources[job.input_image], job.output_image, job.format))
+        except Exception as e:
+            row["error"] = f"decode failed: {e}"
+            rows.append(row)
+            continue
+        row["output_bytes"] = job.output_image.stat().st_size
+        rows.append(row)
+        cached[keys[item["index"]]] = row
+
+    cache_path.write_text(json.dumps(cached, indent=2))
+    rows.sort(key=lambda r: (r["image"], r["format"], r["quality"]))
+    return rows
+
+
+def write_table(rows: List[Dict[str, Any]], csv_path: Path) -> None:
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(TABLE_COLUMNS) + ["error"], extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'image':<28} {'fmt':<4} {'quality':>7} {'psnr':>7} {'ssim':>7} {'maxerr':>6} {'enc s':>7}"]
+    for r in rows:
+        if r.get("error"):
+            lines.append(f"{r['image']:<28} {r['format']:<4} {r['quality']:>7g} error: {r['error']}")
+            continue
+        lines.append(
+            f"{r['image']:<28} {r['format']:<4} {r['quality']:>7g} {r['psnr']:>7.2f} "
+            f"{r['ssim']:>7.4f} {r['max_error']:>6d} {r['encode_seconds']:>7.3f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    from contextlib import nullcontext
+
+    parser = argparse.ArgumentParser(description="Sweep formats/qualities and measure compression error.")
+    parser.add_argument("source", help="image file or folder of images")
+    parser.add_argument("-o", "--output", default="sweep_output", help="folder for encoded files and results")
+    parser.add_argument("-f", "--formats", nargs="+", default=["BC1"], choices=["BC1", "BC4"])
+    parser.add_argument("-q", "--qualities", nargs="+", type=float, default=list(DEFAULT_QUALITIES))
+    parser.add_argument("--backend", choices=BACKENDS, default="compressonator")
+    parser.add_argument("--cpu", action="store_true", help="encode with the CPU instead of the GPU")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="parallel encodes (default: CPU count)")
+    parser.add_argument("--metrics", nargs="?", const="", metavar="JSONL",
+                        help="print per-stage timings at the end (and append the records to JSONL)")
+    args = parser.parse_args()
+
+    with recording(args.metrics or None) if args.metrics is not None else nullcontext() as recorder:
+        rows = quality_sweep(
+            find_images(args.source), args.output, args.formats, args.qualities,
+            backend=args.backend, use_gpu=not args.cpu, max_workers=args.workers,
+        )
+    csv_path = Path(args.output) / "sweep_results.csv"
+    write_table(rows, csv_path)
+    print(format_table(rows))
+    print(f"Results written to: {csv_path}")
+    if recorder is not None:
+        print(recorder.format_summary())
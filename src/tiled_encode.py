@@ -0,0 +1,243 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+# Ensure parent directory is in path to import src modules when run as a script
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from src.dds import BLOCK_DTYPES, DDSFile, dds_header
+from src.encode import encode_image, load_image
+from src.timing import stage
+
+# Tile edge in pixels. Must be a multiple of 4 so tiles split on block boundaries.
+DEFAULT_TILE_SIZE = 2048
+
+
+class Tile(NamedTuple):
+    """A rectangle of the source image; x/y/width/height in pixels, bx/by in blocks."""
+
+    index: int
+    x: int
+    y: int
+    width: int
+    height: int
+
+    @property
+    def bx(self) -> int:
+        return self.x // 4
+
+    @property
+    def by(self) -> int:
+        return self.y // 4
+
+    @property
+    def blocks_x(self) -> int:
+        return (self.width + 3) // 4
+
+    @property
+    def blocks_y(self) -> int:
+        return (self.height + 3) // 4
+
+
+def tile_grid(width: int, height: int, tile_size: int = DEFAULT_TILE_SIZE) -> List[Tile]:
+    """
+    Row-major tiles covering a width x height image. Every tile edge except
+    the right and bottom image borders falls on a multiple of 4 pixels, so
+    each tile encodes to a whole rectangle of the full image's blocks.
+    """
+    if tile_size <= 0 or tile_size % 4:
+        raise ValueError(f"tile_size must be a positive multiple of 4, got {tile_size}")
+    tiles = []
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            tiles.append(Tile(len(tiles), x, y, min(tile_size, width - x), min(tile_size, height - y)))
+    return tiles
+
+
+def needs_tiling(width: int, height: int, tile_size: Optional[int]) -> bool:
+    return bool(tile_size) and (width > tile_size or height > tile_size)
+
+
+class StitchedDDS:
+    """
+    Output DDS written tile by tile: the file is preallocated under a
+    temporary name, tiles are copied into a memory-mapped (blocks_y, blocks_x)
+    grid in any order, and commit() renames it into place.
+    """
+
+    def __init__(self, path, width: int, height: int, fmt: str):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        header = dds_header(width, height, fmt)
+        dtype = BLOCK_DTYPES[fmt]
+        blocks_x, blocks_y = (width + 3) // 4, (height + 3) // 4
+        with open(self.tmp, "wb") as f:
+            f.write(header)
+            f.truncate(len(header) + blocks_x * blocks_y * dtype.itemsize)
+        self.grid = np.memmap(self.tmp, dtype=dtype, mode="r+", offset=len(header), shape=(blocks_y, blocks_x))
+
+    def put(self, tile: Tile, blocks: np.ndarray) -> None:
+        """Copies one tile's row-major blocks to its place in the grid."""
+        self.grid[tile.by : tile.by + tile.blocks_y, tile.bx : tile.bx + tile.blocks_x] = np.asarray(blocks).reshape(
+            tile.blocks_y, tile.blocks_x
+        )
+
+    def commit(self) -> None:
+        self.grid.flush()
+        self.grid = None
+        os.replace(self.tmp, self.path)
+
+    def discard(self) -> None:
+        self.grid = None
+        self.tmp.unlink(missing_ok=True)
+
+
+def _encode_tile(pixels: np.ndarray, format: str, quality: float) -> np.ndarray:
+    return encode_image(pixels, format, quality)
+
+
+def _iter_numpy_tiles(
+    img: np.ndarray,
+    tiles: List[Tile],
+    format: str,
+    quality: float,
+    max_workers: int,
+    cancel_event: Optional[threading.Event],
+) -> Iterator:
+    """Yields (tile, blocks) as worker processes finish; at most 2 tiles per worker are in flight."""
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        queued = iter(tiles)
+        running = {}
+        while True:
+            while len(running) < 2 * max_workers and not (cancel_event is not None and cancel_event.is_set()):
+                tile = next(queued, None)
+                if tile is None:
+                    break
+                pixels = img[tile.y : tile.y + tile.height, tile.x : tile.x + tile.width]
+                running[pool.submit(_encode_tile, pixels, format, quality)] = tile
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future.result()
+
+
+def _iter_cli_tiles(
+    img: np.ndarray,
+    tiles: List[Tile],
+    job,
+    max_workers: int,
+    cancel_event: Optional[threading.Event],
+) -> Iterator:
+    """Saves every tile as a PNG, encodes them with parallel compressonatorcli runs and yields (tile, blocks)."""
+    from PIL import Image
+
+    from src.bcn import EncodeCancelled, bcn, iter_bcn_batch
+
+    staging = Path(tempfile.mkdtemp(prefix=".ntbc_tiles_", dir=job.output_image.parent))
+    try:
+        jobs = []
+        for tile in tiles:
+            src = staging / f"tile_{tile.index}.png"
+            pixels = img[tile.y : tile.y + tile.height, tile.x : tile.x + tile.width]
+            if pixels.shape[2] == 1:
+                pixels = pixels[:, :, 0]
+            Image.fromarray(np.ascontiguousarray(pixels)).save(src, compress_level=1)
+            tile_job = bcn(src, staging / f"tile_{tile.index}.dds", format=job.format, quality=job.quality,
+                           use_gpu=job.use_gpu)
+            tile_job.cli_path = job.cli_path
+            jobs.append(tile_job)
+
+        for item in iter_bcn_batch(jobs, max_workers=max_workers, cancel_event=cancel_event):
+            tile = tiles[item["index"]]
+            if item["cancelled"]:
+                raise EncodeCancelled(str(job.input_image))
+            if item["error"] is not None:
+                raise RuntimeError(f"tile {tile.index}: {item['error']}")
+            if item["returncode"] != 0:
+                raise RuntimeError(f"tile {tile.index}: {item['result'].stderr.strip() or item['returncode']}")
+            with DDSFile(item["job"].output_image) as dds:
+                lvl = dds.level()
+                if (lvl.blocks_x, lvl.blocks_y) != (tile.blocks_x, tile.blocks_y) or dds.format != job.format:
+                    raise RuntimeError(
+                        f"tile {tile.index}: encoder wrote {dds.format} {lvl.width}x{lvl.height}, "
+                        f"expected {job.format} {tile.width}x{tile.height}"
+                    )
+                yield tile, np.array(dds.level_blocks())
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def encode_tiled(
+    job,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    max_workers: Optional[int] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> None:
+    """
+    Encodes a bcn job's input into its .dds output one tile at a time: tiles
+    are encoded in parallel (worker processes for the numpy backend, one
+    compressonatorcli process each otherwise) and stitched into a single-level,
+    row-major DDS, the same layout a whole-image encode writes. Raises
+    EncodeCancelled when cancel_event is set, leaving no partial output.
+    """
+    from src.bcn import EncodeCancelled
+
+    if job.output_image.suffix.lower() != ".dds":
+        raise ValueError("Tiled encoding only writes .dds files.")
+    with stage("tiled", "load", file=job.input_image.name):
+        img = load_image(job.input_image)
+    if job.format == "BC4":
+        img = img[:, :, :1]
+    h, w = img.shape[:2]
+    tiles = tile_grid(w, h, tile_size)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(tiles)))
+
+    if job.backend == "numpy":
+        results = _iter_numpy_tiles(img, tiles, job.format, job.quality, max_workers, cancel_event)
+    else:
+        results = _iter_cli_tiles(img, tiles, job, max_workers, cancel_event)
+
+    out = StitchedDDS(job.output_image, w, h, job.format)
+    try:
+        with stage("tiled", "encode", file=job.input_image.name, blocks=out.grid.size, tiles=len(tiles)):
+            for tile, blocks in results:
+                out.put(tile, blocks)
+        if cancel_event is not None and cancel_event.is_set():
+            raise EncodeCancelled(str(job.input_image))
+        out.commit()
+    except BaseException:
+        out.discard()
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from src.bcn import BACKENDS, bcn
+
+    parser = argparse.ArgumentParser(description="Encode a large image into a BC1/BC4 DDS tile by tile, in parallel.")
+    parser.add_argument("input", help="source image")
+    parser.add_argument("output", help="output .dds file")
+    parser.add_argument("-f", "--format", default="BC1", choices=["BC1", "BC4"])
+    parser.add_argument("-q", "--quality", type=float, default=0.75)
+    parser.add_argument("--tile", type=int, default=DEFAULT_TILE_SIZE, help="tile edge in pixels (multiple of 4)")
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy")
+    parser.add_argument("--cpu", action="store_true", help="encode with the CPU instead of the GPU (compressonator)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="tiles encoded in parallel (default: CPU count)")
+    args = parser.parse_args()
+
+    job = bcn(args.input, args.output, format=args.format, quality=args.quality, use_gpu=not args.cpu,
+              backend=args.backend)
+    t0 = time.perf_counter()
+    encode_tiled(job, args.tile, args.workers)
+    print(f"Encoded to: {args.output} ({time.perf_counter() - t0:.2f} s)")
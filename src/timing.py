@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class StageRecorder:
+    """
+    Collects per-stage timing records from bcn.run and the extractor:
+    {"op", "stage", "seconds", "bytes_in", "bytes_out", "blocks", ...}.
+
+    Thread-safe. With a sink path, every record is also appended to that file
+    as one JSON line as soon as it is made.
+    """
+
+    def __init__(self, sink_path=None):
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._sink = open(sink_path, "a") if sink_path else None
+
+    def add(self, op: str, stage: str, seconds: float, bytes_in: int = 0, bytes_out: int = 0, blocks: int = 0, **extra):
+        rec = {
+            "op": op,
+            "stage": stage,
+            "seconds": seconds,
+            "bytes_in": int(bytes_in),
+            "bytes_out": int(bytes_out),
+            "blocks": int(blocks),
+            **extra,
+        }
+        self.extend([rec])
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> None:
+        records = list(records)
+        with self._lock:
+            self.records.extend(records)
+            if self._sink is not None:
+                for rec in records:
+                    self._sink.write(json.dumps(rec) + "\n")
+                self._sink.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sink is not None:
+                self._sink.close()
+                self._sink = None
+
+    def summary(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """Per (op, stage): count, total/p50/p95 seconds and summed bytes and blocks."""
+        with self._lock:
+            records = list(self.records)
+
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for rec in records:
+            groups.setdefault((rec["op"], rec["stage"]), []).append(rec)
+
+        out = {}
+        for key, recs in groups.items():
+            secs = np.array([r["seconds"] for r in recs])
+            out[key] = {
+                "count": len(recs),
+                "total": float(secs.sum()),
+                "p50": float(np.percentile(secs, 50)),
+                "p95": float(np.percentile(secs, 95)),
+                "bytes_in": sum(r["bytes_in"] for r in recs),
+                "bytes_out": sum(r["bytes_out"] for r in recs),
+                "blocks": sum(r["blocks"] for r in recs),
+            }
+        return out
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        if not summary:
+            return "No stages recorded."
+        lines = [f"{'op':<10} {'stage':<14} {'count':>6} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'MB in':>9} {'MB out':>9} {'blocks':>10}"]
+        for (op, stage), s in sorted(summary.items()):
+            lines.append(
+                f"{op:<10} {stage:<14} {s['count']:>6} {s['total']:>9.3f} {s['p50'] * 1000:>9.1f} "
+                f"{s['p95'] * 1000:>9.1f} {s['bytes_in'] / 2**20:>9.1f} {s['bytes_out'] / 2**20:>9.1f} {s['blocks']:>10}"
+            )
+        return "\n".join(lines)
+
+
+# Recorder the instrumented functions report to; None keeps instrumentation a no-op.
+_recorder: Optional[StageRecorder] = None
+
+
+def get_recorder() -> Optional[StageRecorder]:
+    return _recorder
+
+
+def set_recorder(recorder: Optional[StageRecorder]) -> Optional[StageRecorder]:
+    """Installs recorder process-wide (all threads) and returns the previous one."""
+    global _recorder
+    previous, _recorder = _recorder, recorder
+    return previous
+
+
+@contextmanager
+def recording(sink_path=None) -> Iterator[StageRecorder]:
+    """Installs a fresh StageRecorder for the duration of the block."""
+    recorder = StageRecorder(sink_path)
+    previous = set_recorder(recorder)
+    try:
+        yield recorder
+    finally:
+        set_recorder(previous)
+        recorder.close()
+
+
+@contextmanager
+def stage(op: str, name: str, **counts) -> Iterator[Dict[str, Any]]:
+    """
+    Times the block as one stage of op. Yields a dict the block can fill in
+    with bytes_in / bytes_out / blocks / file once it knows them.
+    """
+    recorder = _recorder
+    if recorder is None:
+        yield counts
+        return
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        recorder.add(op, name, time.perf_counter() - start, **counts)
+
+
+def timed_iter(iterable: Iterable, totals: Dict[str, float]) -> Iterator:
+    """Yields from iterable, adding the time spent producing items to totals["seconds"]."""
+    it = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            totals["seconds"] = totals.get("seconds", 0.0) + time.perf_counter() - start
+            return
+        totals["seconds"] = totals.get("seconds", 0.0) + time.perf_counter() - start
+        yield item
+
+
+def file_size(path) -> int:
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return 0
@@ -5,7 +5,10 @@ import sys
 
 # Ensure parent directory is in path to import bcn
 sys.path.append(str(Path(__file__).parent.parent))
-from src.bcn import bcn, get_compressonator_path
+from src.bcn import BACKENDS, DEFAULT_FILES_PER_PROCESS, bcn, get_compressonator_path, get_encode_cache
+from src.scheduler import default_models, iter_bcn_scheduled
+from src.tiled_encode import DEFAULT_TILE_SIZE
+from ui.progress import ProgressPanel
 
 class ConverterFrame(tk.Frame):
     def __init__(self, parent, controller):
@@ -18,7 +21,10 @@ class ConverterFrame(tk.Frame):
         self.format_var = tk.StringVar(value="BC1")
         self.file_type_var = tk.StringVar(value="dds")
         self.quality_var = tk.StringVar(value="0.05")
+        self.backend_var = tk.StringVar(value="compressonator")
         self.compressonator_path = tk.StringVar(value=str(get_compressonator_path()))
+        # GPU/CPU throughput estimates, kept across conversions so routing starts from what was measured
+        self.encode_models = default_models()
         
         # UI Layout
         self.create_widgets()
@@ -77,6 +83,10 @@ class ConverterFrame(tk.Frame):
         # Quality
         tk.Label(param_frame, text="Quality (0.05 - 1.0):").grid(row=2, column=0, sticky="w", padx=5)
         tk.Entry(param_frame, textvariable=self.quality_var).grid(row=2, column=1, sticky="w", padx=5)
+        
+        # Encoder backend
+        tk.Label(param_frame, text="Encoder:").grid(row=3, column=0, sticky="w", padx=5)
+        tk.OptionMenu(param_frame, self.backend_var, *BACKENDS).grid(row=3, column=1, sticky="w", padx=5)
 
         # Compressonator Path
         sys_frame = tk.LabelFrame(row2, text="System Configuration", padx=10, pady=10)
@@ -86,7 +96,12 @@ class ConverterFrame(tk.Frame):
         tk.Label(sys_frame, textvariable=self.compressonator_path, wraplength=250, justify="left").pack(fill="x", pady=5)
         
         # Convert Button
-        tk.Button(self, text="CONVERT", command=self.convert, font=("Arial", 12, "bold"), bg="#4CAF50", fg="white").pack(pady=20)
+        self.convert_btn = tk.Button(self, text="CONVERT", command=self.convert, font=("Arial", 12, "bold"), bg="#4CAF50", fg="white")
+        self.convert_btn.pack(pady=10)
+        
+        # Progress
+        self.progress = ProgressPanel(self)
+        self.progress.pack(fill="x", padx=10, pady=5)
 
     def select_source_file(self):
         filename = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp *.tga")])
@@ -136,6 +151,9 @@ class ConverterFrame(tk.Frame):
             messagebox.showerror("Error", f"Failed to save configuration: {e}")
 
     def convert(self):
+        if self.progress.running:
+            return
+        
         # Validation
         source = self.source_path.get()
         dest = self.dest_folder.get()
@@ -170,39 +188,70 @@ class ConverterFrame(tk.Frame):
         if not files_to_process:
             messagebox.showerror("Error", "No image files found to process.")
             return
+        
+        if self.backend_var.get() == "numpy" and self.file_type_var.get() != "dds":
+            messagebox.showerror("Error", "The numpy encoder only writes dds files.")
+            return
 
-        print(f"Found {len(files_to_process)} files to process.") # Debug print
-
+        cache = get_encode_cache()
+        jobs = []
+        for src_file in files_to_process:
+            # Construct output filename
+            quality_str = f"{quality:.2f}"
+            new_filename = f"{src_file.stem}-{self.format_var.get()}-{quality_str}.{self.file_type_var.get()}"
+            out_file_path = output_path / new_filename
             
-        error_messages = []
-        success_count = 0
+            jobs.append(bcn(
+                input_image=str(src_file),
+                output_image=str(out_file_path),
+                format=self.format_var.get(),
+                quality=quality,
+                use_gpu=True,  # allowed, not forced: the scheduler picks GPU or CPU per image
+                cache=cache,
+                backend=self.backend_var.get(),
+                tile_size=DEFAULT_TILE_SIZE
+            ))
         
-        for src_file in files_to_process:
-            try:
-                # Construct output filename
-                quality_str = f"{quality:.2f}"
-                new_filename = f"{src_file.stem}-{self.format_var.get()}-{quality_str}.{self.file_type_var.get()}"
-                out_file_path = output_path / new_filename
-                
-                converter = bcn(
-                    input_image=str(src_file),
-                    output_image=str(out_file_path),
-                    format=self.format_var.get(),
-                    quality=quality,
-                    use_gpu=True
-                )
-                
-                result = converter.run()
-                
-                if result.returncode == 0:
+        sizes = [f.stat().st_size for f in files_to_process]
+        self.convert_btn.configure(state="disabled")
+        self.progress.start(self.run_jobs(jobs, sizes), len(jobs), sum(sizes), self.on_convert_done)
+
+    def run_jobs(self, jobs, sizes):
+        # Runs on the progress panel's worker thread; must not touch Tk
+        def work(report, cancel_event):
+            error_messages = []
+            success_count = 0
+            cancelled_count = 0
+            
+            # GPU and CPU encodes run side by side (failed GPU encodes are redone on the CPU);
+            # small images share one compressonatorcli process to save its startup per file
+            for item in iter_bcn_scheduled(jobs, cancel_event=cancel_event, files_per_process=DEFAULT_FILES_PER_PROCESS,
+                                           models=self.encode_models):
+                name = item["job"].input_image.name
+                if item["cancelled"]:
+                    cancelled_count += 1
+                elif item["error"] is not None:
+                    error_messages.append(f"{name}: {item['error']}")
+                elif item["returncode"] == 0:
                     success_count += 1
                 else:
-                    error_messages.append(f"{src_file.name}: {result.stderr}")
-                    
-            except Exception as e:
-                error_messages.append(f"{src_file.name}: {str(e)}")
+                    error_messages.append(f"{name}: {item['result'].stderr}")
+                report(0 if item["cancelled"] else sizes[item["index"]])
+            
+            return success_count, error_messages, cancelled_count
+        
+        return work
+
+    def on_convert_done(self, result, exc):
+        self.convert_btn.configure(state="normal")
+        if exc is not None:
+            messagebox.showerror("Error", f"Conversion failed:\n{exc}")
+            return
         
-        if not error_messages:
+        success_count, error_messages, cancelled_count = result
+        if cancelled_count:
+            messagebox.showwarning("Cancelled", f"Conversion cancelled.\nSuccess: {success_count}\nFailures: {len(error_messages)}\nCancelled: {cancelled_count}")
+        elif not error_messages:
             messagebox.showinfo("Success", f"Converted {success_count} files successfully!")
         else:
             msg = f"Completed with errors.\nSuccess: {success_count}\nFailures: {len(error_messages)}\n\nErrors:\n" + "\n".join(error_messages[:5])
@@ -5,7 +5,8 @@ import sys
 
 # Ensure parent directory is in path to import src modules
 sys.path.append(str(Path(__file__).parent.parent))
-from src.extract_endpoints import extract_endpoints_to_json
+from src.extract_endpoints import OUTPUT_FORMATS, extract_endpoints_to_json, find_dds_files, iter_extract_endpoints_batch
+from ui.progress import ProgressPanel
 
 class ExtractEndpointsFrame(tk.Frame):
     def __init__(self, parent, controller):
@@ -15,6 +16,7 @@ class ExtractEndpointsFrame(tk.Frame):
         # Variables
         self.source_path = tk.StringVar()
         self.dest_folder = tk.StringVar()
+        self.output_format_var = tk.StringVar(value="json")
         
         # UI Layout
         self.create_widgets()
@@ -32,10 +34,14 @@ class ExtractEndpointsFrame(tk.Frame):
         row1.pack(fill="x", padx=5, pady=5)
 
         # Source Selection
-        source_frame = tk.LabelFrame(row1, text="Source File", padx=10, pady=10)
+        source_frame = tk.LabelFrame(row1, text="Source", padx=10, pady=10)
         source_frame.pack(side="left", fill="both", expand=True, padx=5)
         
-        tk.Button(source_frame, text="Select File", command=self.select_source_file).pack(anchor="w")
+        btn_frame = tk.Frame(source_frame)
+        btn_frame.pack(fill="x")
+        
+        tk.Button(btn_frame, text="Select File", command=self.select_source_file).pack(side="left", padx=5)
+        tk.Button(btn_frame, text="Select Folder", command=self.select_source_folder).pack(side="left", padx=5)
         tk.Label(source_frame, textvariable=self.source_path).pack(fill="x", pady=5)
         
         # Destination Selection
@@ -45,34 +51,98 @@ class ExtractEndpointsFrame(tk.Frame):
         tk.Button(dest_frame, text="Select Output Folder", command=self.select_dest_folder).pack(anchor="w")
         tk.Label(dest_frame, textvariable=self.dest_folder).pack(fill="x", pady=5)
         
+        # Output Format (Radio buttons)
+        format_frame = tk.Frame(self)
+        format_frame.pack(pady=5)
+        tk.Label(format_frame, text="Output Format:").pack(side="left", padx=5)
+        for fmt in OUTPUT_FORMATS:
+            tk.Radiobutton(format_frame, text=fmt, variable=self.output_format_var, value=fmt).pack(side="left")
+        
         # Extract Button
-        tk.Button(self, text="Extract", command=self.extract, font=("Arial", 12, "bold"), bg="#4CAF50", fg="white").pack(pady=20)
+        self.extract_btn = tk.Button(self, text="Extract", command=self.extract, font=("Arial", 12, "bold"), bg="#4CAF50", fg="white")
+        self.extract_btn.pack(pady=10)
+        
+        # Progress
+        self.progress = ProgressPanel(self)
+        self.progress.pack(fill="x", padx=10, pady=5)
 
     def select_source_file(self):
-        filename = filedialog.askopenfilename(filetypes=[("DDS files", "*.dds")])
+        filename = filedialog.askopenfilename(filetypes=[("Texture files", "*.dds *.ktx *.ktx2")])
         if filename:
             self.source_path.set(filename)
 
+    def select_source_folder(self):
+        folder = filedialog.askdirectory()
+        if folder:
+            self.source_path.set(folder)
+
     def select_dest_folder(self):
         folder = filedialog.askdirectory()
         if folder:
             self.dest_folder.set(folder)
 
     def extract(self):
+        if self.progress.running:
+            return
+        
         # Validation
         source = self.source_path.get()
         dest = self.dest_folder.get()
         
         if not source:
-            messagebox.showerror("Error", "Please select a source .dds file.")
+            messagebox.showerror("Error", "Please select a source .dds, .ktx or .ktx2 file or folder.")
             return
             
         if not dest:
             messagebox.showerror("Error", "Please select an output folder.")
             return
             
-        try:
-            output_file = extract_endpoints_to_json(source, output_folder=dest)
-            messagebox.showinfo("Success", f"Endpoints extracted to:\n{output_file}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to extract endpoints:\n{str(e)}")
+        if not Path(source).exists():
+            messagebox.showerror("Error", f"File not found:\n{source}")
+            return
+            
+        files = find_dds_files(source)
+        if not files:
+            messagebox.showerror("Error", "No .dds, .ktx or .ktx2 files found to process.")
+            return
+            
+        output_format = self.output_format_var.get()
+        sizes = {str(f): f.stat().st_size for f in files}
+        
+        # Runs on the progress panel's worker thread; must not touch Tk
+        def work(report, cancel_event):
+            outputs, errors = [], []
+            if len(files) == 1:
+                outputs.append(extract_endpoints_to_json(str(files[0]), output_folder=dest, output_format=output_format))
+                report(sizes[str(files[0])])
+                return outputs, errors
+            
+            for item in iter_extract_endpoints_batch(files, dest, output_format, cancel_event=cancel_event):
+                if item["error"] is None:
+                    outputs.append(item["output"])
+                else:
+                    errors.append(f"{Path(item['file']).name}: {item['error']}")
+                report(sizes[item["file"]])
+            return outputs, errors
+        
+        self.extract_btn.configure(state="disabled")
+        self.progress.start(work, len(files), sum(sizes.values()), self.on_extract_done)
+
+    def on_extract_done(self, result, exc):
+        self.extract_btn.configure(state="normal")
+        if exc is not None:
+            messagebox.showerror("Error", f"Failed to extract endpoints:\n{str(exc)}")
+            return
+        
+        outputs, errors = result
+        if self.progress.cancel_event.is_set():
+            messagebox.showwarning("Cancelled", f"Extraction cancelled.\nSuccess: {len(outputs)}\nFailures: {len(errors)}")
+        elif errors:
+            msg = f"Completed with errors.\nSuccess: {len(outputs)}\nFailures: {len(errors)}\n\nErrors:\n" + "\n".join(errors[:5])
+            if len(errors) > 5:
+                msg += "\n..."
+            messagebox.showerror("Extraction Issues", msg)
+        elif len(outputs) == 1:
+            messagebox.showinfo("Success", f"Endpoints extracted to:\n{outputs[0]}")
+        else:
+            messagebox.showinfo("Success", f"Extracted endpoints from {len(outputs)} files successfully!")
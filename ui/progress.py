@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from src.bcn import get_metrics_log
+from src.timing import StageRecorder, set_recorder
+
+
+def format_eta(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{(seconds // 60) % 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressPanel(tk.Frame):
+    """
+    Progress bar, status line and Cancel button for work running on a background thread.
+
+    The worker never touches Tk: it reports through a thread-safe queue that the
+    panel drains with after(), so the window stays responsive during a batch.
+    Stage timings of each batch are collected and shown by the Timings button.
+    """
+
+    POLL_MS = 100
+
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        self.status_var = tk.StringVar(value="")
+        self.cancel_event = threading.Event()
+        self._queue = queue.Queue()
+        self._running = False
+        self.recorder = None
+
+        bar_row = tk.Frame(self)
+        bar_row.pack(fill="x")
+        self.bar = ttk.Progressbar(bar_row, mode="determinate")
+        self.bar.pack(side="left", fill="x", expand=True, padx=5)
+        self.cancel_btn = tk.Button(bar_row, text="Cancel", state="disabled", command=self.cancel)
+        self.cancel_btn.pack(side="left", padx=5)
+        self.timings_btn = tk.Button(bar_row, text="Timings", state="disabled", command=self.show_timings)
+        self.timings_btn.pack(side="left", padx=5)
+        tk.Label(self, textvariable=self.status_var, anchor="w").pack(fill="x", padx=5)
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self, work, total_files, total_bytes, on_done):
+        """
+        Runs work(report, cancel_event) on a daemon thread.
+
+        work calls report(nbytes) once per finished file and returns a value that
+        is passed to on_done(result, exception) on the Tk thread.
+        """
+        self._running = True
+        self.cancel_event.clear()
+        self._total_files = total_files
+        self._total_bytes = total_bytes
+        self._done_files = 0
+        self._done_bytes = 0
+        self._t0 = time.perf_counter()
+        self._on_done = on_done
+
+        self.bar.configure(maximum=max(total_files, 1), value=0)
+        self.cancel_btn.configure(state="normal")
+        self.timings_btn.configure(state="disabled")
+        self.recorder = recorder = StageRecorder(get_metrics_log())
+        self.status_var.set(f"0/{total_files} files")
+
+        def report(nbytes=0):
+            self._queue.put(("progress", nbytes))
+
+        def target():
+            previous = set_recorder(recorder)
+            try:
+                result = work(report, self.cancel_event)
+                self._queue.put(("done", result, None))
+            except Exception as e:
+                self._queue.put(("done", None, e))
+            finally:
+                set_recorder(previous)
+                recorder.close()
+
+        threading.Thread(target=target, daemon=True).start()
+        self.after(self.POLL_MS, self._poll)
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.cancel_btn.configure(state="disabled")
+        self.status_var.set("Cancelling...")
+
+    def _poll(self):
+        finished = None
+        try:
+            while True:
+                msg = self._queue.get_nowait()
+                if msg[0] == "progress":
+                    self._done_files += 1
+                    self._done_bytes += msg[1]
+                else:
+                    finished = msg
+        except queue.Empty:
+            pass
+
+        self._update_status()
+        if finished is None:
+            self.after(self.POLL_MS, self._poll)
+            return
+
+        self._running = False
+        self.cancel_btn.configure(state="disabled")
+        self.timings_btn.configure(state="normal")
+        self._on_done(finished[1], finished[2])
+
+    def show_timings(self):
+        """Opens a window with the p50/p95 stage summary of the last batch."""
+        if self.recorder is None:
+            return
+        win = tk.Toplevel(self)
+        win.title("Stage Timings")
+        text = tk.Text(win, font=("Courier", 9), wrap="none", width=110, height=16)
+        text.insert("1.0", self.recorder.format_summary())
+        text.configure(state="disabled")
+        text.pack(fill="both", expand=True, padx=5, pady=5)
+
+    def _update_status(self):
+        self.bar.configure(value=self._done_files)
+        elapsed = max(time.perf_counter() - self._t0, 1e-6)
+        files_per_s = self._done_files / elapsed
+        mb_per_s = self._done_bytes / elapsed / (1024 * 1024)
+        status = f"{self._done_files}/{self._total_files} files | {files_per_s:.1f} files/s | {mb_per_s:.1f} MB/s"
+        if 0 < self._done_files < self._total_files:
+            remaining = (self._total_files - self._done_files) / files_per_s
+            status += f" | ETA {format_eta(remaining)}"
+        if self.cancel_event.is_set():
+            status += " | cancelling"
+        self.status_var.set(status)